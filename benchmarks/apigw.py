@@ -0,0 +1,928 @@
+"""
+    Local emulation of the API Gateway REST API in front of the Lambda handlers
+
+    Loads the OpenAPI definition from api/apiSkeleton.yaml with every $ref
+    inlined (what swagger-cli bundle --dereference writes to api/api.yaml) and
+    serves a request the way API Gateway does for the "aws" Lambda integrations:
+        1. match the path template, check the required parameters (request validator)
+        2. render the integration request template into the Lambda event
+        3. call the handler; a raised exception becomes the Lambda error
+           {errorMessage, errorType}, which selects the integration response
+           by its selection pattern, anything else takes the default response
+        4. map responseParameters from integration.response.body and render the
+           response template chosen by the Accept header, which may set
+           $context.responseOverride.header.<name> and .status
+
+    The Velocity subset is the one the templates in api/paths use: #set, #if /
+    #elseif / #else, #foreach with $foreach.hasNext, references with properties,
+    index and method calls, String.substring, $input.path / json / params / body,
+    $util.escapeJavaScript / parseJson, $context and $method.request, with
+    querystring holding the last value of a repeated parameter and
+    multivaluequerystring all of them.  Undefined
+    references render as empty strings, like API Gateway.  Request bodies are not
+    validated against the schemas.
+"""
+from base64 import b64decode, b64encode
+from decimal import Decimal
+from os.path import dirname, join, normpath
+from time import monotonic, perf_counter
+from typing import Any, Callable
+from urllib.parse import quote, unquote
+from uuid import uuid4
+import json
+import re
+
+import yaml
+
+
+class _CfnLoader(yaml.SafeLoader):  # pylint: disable=too-many-ancestors
+    """
+    YAML loader keeping CloudFormation short-form tags (!Include, !Ref, ...)
+    as {tag: value}
+    """
+
+
+_CfnLoader.add_multi_constructor(
+    "!", lambda loader, suffix, node: {suffix: loader.construct_scalar(node)
+                                       if isinstance(node, yaml.ScalarNode) else
+                                       loader.construct_sequence(node, deep=True)
+                                       if isinstance(node, yaml.SequenceNode) else
+                                       loader.construct_mapping(node, deep=True)})
+
+
+def load_yaml(file_name: str) -> Any:
+    """
+    :param file_name: YAML file
+    :return: document, CloudFormation tags as {tag: value}
+    """
+    with open(file_name, encoding="utf-8") as yaml_file:
+        return yaml.load(yaml_file, Loader=_CfnLoader)  # nosec - safe loader subclass
+
+
+def dereference(node: Any, base: str) -> Any:
+    """
+    Inline every external $ref, relative to the file that holds it
+    :param node: document node
+    :param base: directory of the file holding the node
+    :return: node without external references
+    """
+    if isinstance(node, dict):
+        ref = node.get("$ref", None)
+        if isinstance(ref, str) and not ref.startswith("#"):
+            file_name = normpath(join(base, ref))
+            resolved = dereference(load_yaml(file_name), dirname(file_name))
+            # Keys next to $ref (e.g. "in" of a parameter) extend the target
+            siblings = {key: dereference(value, base) for key, value in node.items()
+                        if key != "$ref"}
+            return dict(resolved, **siblings) if isinstance(resolved, dict) else resolved
+        return {key: dereference(value, base) for key, value in node.items()}
+    if isinstance(node, list):
+        return [dereference(value, base) for value in node]
+    return node
+
+
+def load_api(skeleton: str = "api/apiSkeleton.yaml") -> dict:
+    """
+    :param skeleton: OpenAPI entry point
+    :return: OpenAPI definition with the references inlined
+    """
+    return dereference(load_yaml(skeleton), dirname(skeleton))
+
+
+def lambda_handlers(template: str = "cloudformation/templateSkeleton.yaml") -> dict:
+    """
+    Handler of each function resource of the SAM template
+    :param template: template skeleton with !Include resources
+    :return: {logical id: (module, function name)}, e.g.
+             {"ReportsColorLambda": ("pylambda.reports.color.app", "lambda_handler")}
+    """
+    skeleton = load_yaml(template)
+    default_handler = skeleton.get("Globals", {}).get("Function", {}).get("Handler", "")
+    handlers = {}
+    for logical_id, resource in skeleton.get("Resources", {}).items():
+        if isinstance(resource, dict) and "Include" in resource:
+            resource = load_yaml(normpath(join(dirname(template), resource["Include"])))
+        if resource.get("Type", "") != "AWS::Serverless::Function":
+            continue
+        properties = resource.get("Properties", {})
+        module, _, function = properties.get("Handler", default_handler).rpartition(".")
+        code = properties["CodeUri"].strip("/").replace("/", ".")
+        handlers[logical_id] = ("%s.%s" % (code, module), function)
+    return handlers
+
+
+def global_environment(template: str = "cloudformation/templateSkeleton.yaml") -> dict:
+    """
+    :param template: template skeleton
+    :return: literal Globals environment variables, references left out
+    """
+    variables = load_yaml(template).get("Globals", {}).get("Function", {}) \
+        .get("Environment", {}).get("Variables", {})
+    return {name: str(value).lower() if isinstance(value, bool) else str(value)
+            for name, value in variables.items() if not isinstance(value, dict)}
+
+
+# Velocity templates
+
+
+class VtlError(Exception):
+    """
+    Template the emulator cannot parse or evaluate
+    """
+
+
+def escape_javascript(text: Any) -> str:
+    """
+    $util.escapeJavaScript: Commons Lang escapeJavaScript, which also escapes
+    single quotes - invalid JSON when the value holds one, as in API Gateway
+    :param text: value
+    :return: escaped string
+    """
+    escapes = {"'": "\\'", '"': '\\"', "\\": "\\\\", "/": "\\/", "\b": "\\b",
+               "\f": "\\f", "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+    output = []
+    for char in render_value(text):
+        if char in escapes:
+            output.append(escapes[char])
+        elif 0x20 <= ord(char) < 0x7f:
+            output.append(char)
+        else:
+            # Java strings are UTF-16, characters beyond the BMP are two escapes
+            units = char.encode("utf-16-be")
+            output.extend("\\u%02X%02X" % (units[idx], units[idx + 1])
+                          for idx in range(0, len(units), 2))
+    return "".join(output)
+
+
+def render_value(value: Any) -> str:
+    """
+    Text of a value rendered into a template, Java style
+    :param value: evaluated reference
+    :return: text, "" for undefined
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, dict):
+        return "{%s}" % ", ".join("%s=%s" % (key, render_value(item))
+                                  for key, item in value.items())
+    if isinstance(value, list):
+        return "[%s]" % ", ".join(render_value(item) for item in value)
+    return str(value)
+
+
+def json_path(document: Any, expression: str) -> Any:
+    """
+    JSONPath subset: $, $.a.b, $.a[0], $['a']
+    :param document: parsed JSON
+    :param expression: path
+    :return: value, None when absent
+    """
+    value = document
+    for name, index in re.findall(r"\.(\w+)|\[['\"]?([^\]'\"]+)['\"]?\]",
+                                  expression.strip()[1:]):
+        key = name or index
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict):
+            value = value.get(key, None)
+        else:
+            return None
+    return value
+
+
+class InputVariable:
+    """
+    $input of a request or response template
+    """
+
+    def __init__(self, body: str, parameters: dict = None):
+        """
+        Init
+        :param body: raw payload
+        :param parameters: {"path", "querystring", "header"} of the method request
+        """
+        self.body = body
+        self._parameters = parameters or {"path": {}, "querystring": {}, "header": {}}
+        try:
+            self._document = json.loads(body) if len(body.strip()) > 0 else {}
+        except ValueError:
+            self._document = {}
+
+    def path(self, expression: str) -> Any:
+        """
+        :param expression: JSONPath
+        :return: payload value
+        """
+        return json_path(self._document, expression)
+
+    def json(self, expression: str) -> str:
+        """
+        :param expression: JSONPath
+        :return: payload value as JSON text
+        """
+        return json.dumps(self.path(expression))
+
+    def params(self, name: str = None) -> Any:
+        """
+        :param name: parameter, searched in path, query string and headers
+        :return: value ("" when absent), or every parameter without a name
+        """
+        if name is None:
+            return {location: self._parameters.get(location, {})
+                    for location in ("path", "querystring", "header")}
+        for location in ("path", "querystring"):
+            if name in self._parameters[location]:
+                return self._parameters[location][name]
+        for header, value in self._parameters["header"].items():
+            if header.lower() == name.lower():
+                return value
+        return ""
+
+
+class UtilVariable:
+    """
+    $util
+    """
+
+    @staticmethod
+    def escapeJavaScript(text: Any) -> str:  # pylint: disable=invalid-name
+        """
+        :param text: value
+        :return: escaped
+        """
+        return escape_javascript(text)
+
+    @staticmethod
+    def parseJson(text: str) -> Any:  # pylint: disable=invalid-name
+        """
+        :param text: JSON text
+        :return: value
+        """
+        return json.loads(text)
+
+    @staticmethod
+    def urlEncode(text: str) -> str:  # pylint: disable=invalid-name
+        """
+        :param text: value
+        :return: URL encoded
+        """
+        return quote(text, safe="")
+
+    @staticmethod
+    def urlDecode(text: str) -> str:  # pylint: disable=invalid-name
+        """
+        :param text: URL encoded
+        :return: value
+        """
+        return unquote(text)
+
+    @staticmethod
+    def base64Encode(text: str) -> str:  # pylint: disable=invalid-name
+        """
+        :param text: value
+        :return: base64
+        """
+        return b64encode(text.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def base64Decode(text: str) -> str:  # pylint: disable=invalid-name
+        """
+        :param text: base64
+        :return: value
+        """
+        return b64decode(text).decode("utf-8")
+
+
+# Java collection methods templates call on parsed JSON
+_COLLECTION_METHODS = {
+    "size": len,
+    "isEmpty": lambda value: len(value) == 0,
+    "length": len,
+    "toString": render_value,
+}
+
+
+def _member(value: Any, name: str, arguments: list = None) -> Any:
+    """
+    Property or method of a value
+    :param value: evaluated object
+    :param name: property or method name
+    :param arguments: method arguments, None for a property
+    :return: result, None when undefined
+    """
+    if value is None:
+        return None
+    if isinstance(value, dict) and arguments is None:
+        return value.get(name, None)
+    if isinstance(value, dict) and name in ("get", "containsKey"):
+        return value.get(arguments[0], None) if name == "get" else arguments[0] in value
+    if isinstance(value, list) and name == "get":
+        return value[int(arguments[0])]
+    if isinstance(value, str) and name == "substring":
+        return value[int(arguments[0]):int(arguments[1])] if len(arguments) > 1 \
+            else value[int(arguments[0]):]
+    if arguments is not None and name in _COLLECTION_METHODS:
+        return _COLLECTION_METHODS[name](value)
+    if isinstance(value, (InputVariable, UtilVariable)):
+        attribute = getattr(value, name, None)
+        if callable(attribute):
+            return attribute(*(arguments or []))
+        return attribute
+    return None
+
+
+class _Parser:  # pylint: disable=too-few-public-methods
+    """
+    Template text to nodes:
+        ("text", str), ("ref", expr), ("set", name, [property], expr),
+        ("if", [(expr, nodes)], else nodes), ("foreach", name, expr, nodes)
+    Expressions:
+        ("ref", name, [("prop", name) | ("call", name, [expr]) | ("index", expr)]),
+        ("lit", value), ("not", expr), ("op", operator, expr, expr)
+    """
+
+    DIRECTIVE = re.compile(r"#\{?(set|if|elseif|foreach|else|end)\}?")
+    IDENTIFIER = re.compile(r"[A-Za-z_][\w-]*")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def parse(self) -> list:
+        nodes, terminator = self._block()
+        if terminator is not None:
+            raise VtlError("unexpected #%s at %d" % (terminator, self.pos))
+        return nodes
+
+    def _block(self) -> tuple:
+        """
+        Nodes up to #elseif, #else, #end or the end of the text
+        :return: (nodes, terminating directive or None)
+        """
+        nodes = []
+        literal = []
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if self.text.startswith("##", self.pos):
+                end = self.text.find("\n", self.pos)
+                self.pos = len(self.text) if end < 0 else end
+                continue
+            if char == "#":
+                match = self.DIRECTIVE.match(self.text, self.pos)
+                if match is not None:
+                    if literal:
+                        nodes.append(("text", "".join(literal)))
+                        literal = []
+                    self.pos = match.end()
+                    directive = match.group(1)
+                    if directive in ("elseif", "else", "end"):
+                        return nodes, directive
+                    nodes.append(self._directive(directive))
+                    continue
+            if char == "$":
+                start = self.pos
+                reference = self._reference(text_mode=True)
+                if reference is not None:
+                    if literal:
+                        nodes.append(("text", "".join(literal)))
+                        literal = []
+                    nodes.append(("ref", reference))
+                    continue
+                self.pos = start
+            literal.append(char)
+            self.pos += 1
+        if literal:
+            nodes.append(("text", "".join(literal)))
+        return nodes, None
+
+    def _directive(self, directive: str) -> tuple:
+        """
+        Parse a #set, #if or #foreach after its name
+        :param directive: name
+        :return: node
+        """
+        self._expect("(")
+        if directive == "set":
+            self._skip_spaces()
+            target = self._reference(text_mode=False)
+            if target is None or any(step[0] != "prop" for step in target[2]):
+                raise VtlError("unsupported #set target at %d" % self.pos)
+            self._expect("=")
+            value = self._expression()
+            self._expect(")")
+            return ("set", target[1], [step[1] for step in target[2]], value)
+
+        if directive == "foreach":
+            self._skip_spaces()
+            variable = self._reference(text_mode=False)
+            self._skip_spaces()
+            if variable is None or not self.text.startswith("in", self.pos):
+                raise VtlError("malformed #foreach at %d" % self.pos)
+            self.pos += 2
+            iterable = self._expression()
+            self._expect(")")
+            body, terminator = self._block()
+            if terminator != "end":
+                raise VtlError("#foreach without #end")
+            return ("foreach", variable[1], iterable, body)
+
+        branches = []
+        condition = self._expression()
+        self._expect(")")
+        otherwise = []
+        while True:
+            body, terminator = self._block()
+            branches.append((condition, body))
+            if terminator == "elseif":
+                self._expect("(")
+                condition = self._expression()
+                self._expect(")")
+                continue
+            if terminator == "else":
+                otherwise, terminator = self._block()
+            if terminator != "end":
+                raise VtlError("#if without #end")
+            return ("if", branches, otherwise)
+
+    def _skip_spaces(self):
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+
+    def _expect(self, token: str):
+        self._skip_spaces()
+        if not self.text.startswith(token, self.pos):
+            raise VtlError("expected %r at %d" % (token, self.pos))
+        self.pos += len(token)
+
+    def _reference(self, text_mode: bool) -> Any:
+        """
+        $name, $!name, ${name} with .property, .method(args) and [index] steps
+        :param text_mode: in template text a trailing "." or "(" is plain text
+        :return: ("ref", name, steps), None if no reference starts here
+        """
+        pos = self.pos + 1
+        if self.text.startswith("!", pos):
+            pos += 1
+        braced = self.text.startswith("{", pos)
+        if braced:
+            pos += 1
+        match = self.IDENTIFIER.match(self.text, pos)
+        if match is None:
+            return None
+        name = match.group(0)
+        self.pos = match.end()
+        steps = []
+        while self.pos < len(self.text):
+            if self.text[self.pos] == ".":
+                member = self.IDENTIFIER.match(self.text, self.pos + 1)
+                if member is None:
+                    break
+                self.pos = member.end()
+                if self.text.startswith("(", self.pos):
+                    self.pos += 1
+                    steps.append(("call", member.group(0), self._arguments()))
+                else:
+                    steps.append(("prop", member.group(0)))
+            elif self.text[self.pos] == "[" and not text_mode:
+                self.pos += 1
+                steps.append(("index", self._expression()))
+                self._expect("]")
+            else:
+                break
+        if braced:
+            self._expect("}")
+        return ("ref", name, steps)
+
+    def _arguments(self) -> list:
+        arguments = []
+        self._skip_spaces()
+        if self.text.startswith(")", self.pos):
+            self.pos += 1
+            return arguments
+        while True:
+            arguments.append(self._expression())
+            self._skip_spaces()
+            if self.text.startswith(",", self.pos):
+                self.pos += 1
+                continue
+            self._expect(")")
+            return arguments
+
+    def _expression(self) -> tuple:
+        left = self._and()
+        while self._operator("||"):
+            left = ("op", "||", left, self._and())
+        return left
+
+    def _and(self) -> tuple:
+        left = self._not()
+        while self._operator("&&"):
+            left = ("op", "&&", left, self._not())
+        return left
+
+    def _not(self) -> tuple:
+        if self._operator("!") and not self.text.startswith("=", self.pos):
+            return ("not", self._not())
+        left = self._primary()
+        for operator in ("==", "!="):
+            if self._operator(operator):
+                return ("op", operator, left, self._primary())
+        return left
+
+    def _operator(self, operator: str) -> bool:
+        self._skip_spaces()
+        if self.text.startswith(operator, self.pos):
+            self.pos += len(operator)
+            return True
+        return False
+
+    def _primary(self) -> tuple:
+        self._skip_spaces()
+        char = self.text[self.pos:self.pos + 1]
+        if char == "$":
+            reference = self._reference(text_mode=False)
+            if reference is None:
+                raise VtlError("bad reference at %d" % self.pos)
+            return reference
+        if char in ("'", '"'):
+            end = self.text.find(char, self.pos + 1)
+            if end < 0:
+                raise VtlError("unterminated string at %d" % self.pos)
+            value = self.text[self.pos + 1:end]
+            self.pos = end + 1
+            return ("lit", value)
+        if char == "(":
+            self.pos += 1
+            value = self._expression()
+            self._expect(")")
+            return value
+        match = re.compile(r"-?\d+(\.\d+)?|true|false|null").match(self.text, self.pos)
+        if match is None:
+            raise VtlError("unexpected %r at %d" % (char, self.pos))
+        self.pos = match.end()
+        literal = match.group(0)
+        if literal in ("true", "false", "null"):
+            return ("lit", {"true": True, "false": False, "null": None}[literal])
+        return ("lit", Decimal(literal) if "." in literal else int(literal))
+
+
+class VtlTemplate:
+    """
+    A parsed mapping template
+    """
+
+    def __init__(self, text: str):
+        """
+        Init
+        :param text: template
+        """
+        self.nodes = _Parser(text).parse()
+
+    def render(self, variables: dict) -> str:
+        """
+        :param variables: $input, $util, $context, $method ...
+        :return: rendered text
+        """
+        output = []
+        self._render(self.nodes, dict(variables), output)
+        return "".join(output)
+
+    def _render(self, nodes: list, scope: dict, output: list):
+        for node in nodes:
+            kind = node[0]
+            if kind == "text":
+                output.append(node[1])
+            elif kind == "ref":
+                output.append(render_value(self._evaluate(node[1], scope)))
+            elif kind == "set":
+                # $context.responseOverride.header.ETag: missing maps are created
+                owner, name = scope, node[1]
+                for step in node[2]:
+                    owner = owner.setdefault(name, {})
+                    name = step
+                owner[name] = self._evaluate(node[3], scope)
+            elif kind == "if":
+                for condition, body in node[1]:
+                    if self._truthy(self._evaluate(condition, scope)):
+                        self._render(body, scope, output)
+                        break
+                else:
+                    self._render(node[2], scope, output)
+            else:
+                items = self._evaluate(node[2], scope) or []
+                if isinstance(items, dict):
+                    items = list(items.values())
+                outer = scope.get("foreach", None)
+                for index, item in enumerate(items):
+                    scope[node[1]] = item
+                    scope["foreach"] = {"index": index, "count": index + 1,
+                                        "hasNext": index + 1 < len(items),
+                                        "first": index == 0, "last": index + 1 == len(items)}
+                    self._render(node[3], scope, output)
+                scope["foreach"] = outer
+
+    @staticmethod
+    def _truthy(value: Any) -> bool:
+        return value is not None and value is not False
+
+    def _evaluate(self, expression: tuple, scope: dict) -> Any:
+        kind = expression[0]
+        if kind == "lit":
+            return expression[1]
+        if kind == "not":
+            return not self._truthy(self._evaluate(expression[1], scope))
+        if kind == "op":
+            left = self._evaluate(expression[2], scope)
+            if expression[1] == "&&":
+                return self._truthy(left) and self._truthy(self._evaluate(expression[3], scope))
+            if expression[1] == "||":
+                return self._truthy(left) or self._truthy(self._evaluate(expression[3], scope))
+            right = self._evaluate(expression[3], scope)
+            return (left == right) == (expression[1] == "==")
+
+        value = scope.get(expression[1], None)
+        for step in expression[2]:
+            if step[0] == "prop":
+                value = _member(value, step[1])
+            elif step[0] == "call":
+                value = _member(value, step[1],
+                                [self._evaluate(argument, scope) for argument in step[2]])
+            else:
+                index = self._evaluate(step[1], scope)
+                value = _member(value, "get", [index]) if value is not None else None
+        return value
+
+
+# Gateway
+
+
+class LambdaContext:  # pylint: disable=too-few-public-methods
+    """
+    Minimal Lambda context: the remaining time of the invocation
+    """
+
+    def __init__(self, timeout_s: float, clock: Callable):
+        """
+        Init
+        :param timeout_s: function timeout
+        :param clock: monotonic clock in seconds
+        """
+        self._clock = clock
+        self._deadline = clock() + timeout_s
+        self.aws_request_id = str(uuid4())
+
+    def get_remaining_time_in_millis(self) -> int:
+        """
+        :return: milliseconds left
+        """
+        return max(0, int((self._deadline - self._clock()) * 1000))
+
+
+class ApiGateway:
+    """
+    The REST API of an OpenAPI definition, integrations served by local handlers
+    """
+
+    def __init__(self, definition: dict, handlers: dict, stage: str = "prod",
+                 timeout_s: float = 30.0, clock: Callable = None):
+        """
+        Init
+        :param definition: OpenAPI definition, see load_api
+        :param handlers: {function logical id: callable(event, context)}
+        :param stage: stage name, part of $context.path
+        :param timeout_s: Lambda timeout for the context
+        :param clock: monotonic clock, default time.monotonic
+        """
+        self.stage = stage
+        self.timeout_s = timeout_s
+        self.clock = clock or monotonic
+        # Request template time of the current request, one request at a time
+        self._template_s = 0.0
+        self.routes = []
+        for path_template, methods in definition.get("paths", {}).items():
+            pattern = re.compile("^" + re.sub(r"\\\{(\w+)\\\}", r"(?P<\1>[^/]+)",
+                                              re.escape(path_template)) + "$")
+            for method, operation in methods.items():
+                integration = operation.get("x-amazon-apigateway-integration", {})
+                function = re.search(r"\$\{(\w+)\.Arn\}",
+                                     json.dumps(integration.get("uri", "")))
+                self.routes.append({
+                    "method": method.upper(),
+                    "path": path_template,
+                    "pattern": pattern,
+                    "operation": operation,
+                    "integration": integration,
+                    "handler": handlers.get(function.group(1)) if function else None,
+                    "templates": {}
+                })
+
+    def _template(self, route: dict, key: tuple, text: str) -> VtlTemplate:
+        """
+        Parse a template once per route
+        """
+        template = route["templates"].get(key, None)
+        if template is None:
+            template = route["templates"][key] = VtlTemplate(text)
+        return template
+
+    def route(self, method: str, path: str) -> tuple:
+        """
+        :param method: HTTP method
+        :param path: request path without the stage
+        :return: (route, path parameters), (None, None) when nothing matches
+        """
+        for route in self.routes:
+            match = route["pattern"].match(path)
+            if match is not None and route["method"] == method.upper():
+                return route, {name: unquote(value) for name, value in match.groupdict().items()}
+        return None, None
+
+    def request(self, method: str, path: str, query: dict = None, headers: dict = None,
+                body: Any = None) -> dict:
+        """
+        Serve one request
+        :param method: HTTP method
+        :param path: request path, e.g. /reports/color/blue
+        :param query: query string parameters, a list for a repeated parameter
+        :param headers: request headers
+        :param body: request payload, JSON encoded unless it is a string
+        :return: {status, headers, body, route, error (Lambda errorMessage or None),
+                  pattern (selection pattern used, "default"), valid_json,
+                  template_ms (request and response template rendering)}
+        """
+        query = query or {}
+        headers = headers or {}
+        route, path_parameters = self.route(method, path)
+        if route is None:
+            return self._gateway_error(404, "Missing Authentication Token", None)
+
+        # Request validator: required parameters
+        if route["operation"].get("x-amazon-apigateway-request-validator", None):
+            present = {"path": path_parameters, "query": query,
+                       "header": {name.lower(): value for name, value in headers.items()}}
+            for parameter in route["operation"].get("parameters", []):
+                location = parameter.get("in", "")
+                name = parameter.get("name", "")
+                if location == "header":
+                    name = name.lower()
+                if parameter.get("required", False) and name not in present.get(location, {}):
+                    return self._gateway_error(400, "Missing required request parameters: [%s]"
+                                               % parameter["name"], route)
+
+        body_text = body if isinstance(body, str) else ("" if body is None else json.dumps(body))
+        parameters = {"path": path_parameters,
+                      "querystring": {name: value[-1] if isinstance(value, list) else value
+                                      for name, value in query.items()},
+                      "multivaluequerystring": {name: value if isinstance(value, list)
+                                                else [value] for name, value in query.items()},
+                      "header": headers}
+        integration = route["integration"]
+        variables = {
+            "input": InputVariable(body_text, parameters),
+            "util": UtilVariable(),
+            "context": {"path": "/%s%s" % (self.stage, path), "stage": self.stage,
+                        "httpMethod": method.upper(), "resourcePath": route["path"],
+                        "requestId": str(uuid4()), "identity": {"userArn": "", "sourceIp":
+                                                                "127.0.0.1"}},
+            "method": {"request": parameters},
+            "stageVariables": {}
+        }
+        content_type = self._header(headers, "Content-Type") or "application/json"
+        request_templates = integration.get("requestTemplates", {})
+        request_template = request_templates.get(content_type.split(";")[0].strip(), None)
+        if request_template is None:
+            if integration.get("passthroughBehavior", "") == "never":
+                return self._gateway_error(415, "Unsupported Media Type", route)
+            event_text = body_text
+        else:
+            start = perf_counter()
+            event_text = self._template(route, ("request", content_type),
+                                        request_template).render(variables)
+            self._template_s = perf_counter() - start
+
+        try:
+            event = json.loads(event_text) if len(event_text.strip()) > 0 else {}
+        except ValueError as value_error:
+            # API Gateway passes the text on, the Lambda runtime fails to parse it
+            return self._integration_response(
+                route, headers, {"errorMessage": "Could not parse request body into json: %s"
+                                 % value_error, "errorType": "Runtime.UserCodeSyntaxError"})
+
+        if route["handler"] is None:
+            return self._gateway_error(502, "Internal server error", route)
+        try:
+            result = route["handler"](event, LambdaContext(self.timeout_s, self.clock))
+        except Exception as error:  # pylint: disable=broad-except
+            # Whatever the handler raises becomes the Lambda error document
+            return self._integration_response(
+                route, headers, {"errorMessage": str(error), "errorType": type(error).__name__})
+        try:
+            payload = json.dumps(result)
+        except TypeError as type_error:
+            # The runtime serializes the result with json.dumps, Decimal fails
+            return self._integration_response(
+                route, headers, {"errorMessage": "Unable to marshal response: %s" % type_error,
+                                 "errorType": "Runtime.MarshalError"})
+        return self._integration_response(route, headers, payload)
+
+    @staticmethod
+    def _header(headers: dict, name: str) -> str:
+        for header, value in headers.items():
+            if header.lower() == name.lower():
+                return value
+        return ""
+
+    def _integration_response(self, route: dict, headers: dict, result: Any) -> dict:
+        """
+        Select and render the integration response
+        :param route: matched route
+        :param headers: request headers
+        :param result: Lambda payload text, or the error document {errorMessage, errorType}
+        :return: response, see request
+        """
+        error = result.get("errorMessage", "") if isinstance(result, dict) else None
+        payload = json.dumps(result) if isinstance(result, dict) else result
+        responses = route["integration"].get("responses", {})
+
+        pattern = "default"
+        if error is not None:
+            # Lambda errors are matched on errorMessage, the whole message must match
+            for selection, response in responses.items():
+                if selection != "default" and re.fullmatch(selection, error) is not None:
+                    pattern = selection
+                    break
+        response = responses.get(pattern, {})
+
+        body_document = json.loads(payload) if len(payload) > 0 else {}
+        response_headers = {}
+        for header, source in response.get("responseParameters", {}).items():
+            name = header.rpartition(".")[2]
+            if source.startswith("integration.response.body."):
+                value = json_path(body_document, "$." + source[len("integration.response.body."):])
+                if value is not None:
+                    response_headers[name] = render_value(value)
+            elif source.startswith("'") and source.endswith("'"):
+                response_headers[name] = source[1:-1]
+
+        templates = response.get("responseTemplates", {})
+        content_type = self._response_type(templates, self._header(headers, "Accept"))
+        response_body = payload
+        template_s = self._template_s
+        self._template_s = 0.0
+        status = int(response.get("statusCode", 200))
+        if content_type is not None and len(templates[content_type] or "") > 0:
+            context = {"stage": self.stage}
+            variables = {"input": InputVariable(payload), "util": UtilVariable(),
+                         "context": context}
+            start = perf_counter()
+            response_body = self._template(route, ("response", pattern, content_type),
+                                           templates[content_type]).render(variables)
+            template_s += perf_counter() - start
+            override = context.get("responseOverride", {})
+            response_headers.update({name: render_value(value) for name, value
+                                     in override.get("header", {}).items()})
+            if override.get("status", None) is not None:
+                status = int(override["status"])
+        response_headers["Content-Type"] = content_type or "application/json"
+
+        valid_json = True
+        if "json" in response_headers["Content-Type"] and len(response_body.strip()) > 0:
+            try:
+                json.loads(response_body)
+            except ValueError:
+                valid_json = False
+        return {"status": status, "headers": response_headers,
+                "body": response_body, "route": "%s %s" % (route["method"], route["path"]),
+                "error": error, "pattern": pattern, "valid_json": valid_json,
+                "template_ms": template_s * 1000}
+
+    @staticmethod
+    def _response_type(templates: dict, accept: str) -> Any:
+        """
+        Response template chosen by the Accept header, application/json otherwise
+        :param templates: responseTemplates of the integration response
+        :param accept: request Accept header
+        :return: content type key, None without templates
+        """
+        if len(templates) == 0:
+            return None
+        for media_range in accept.split(","):
+            wanted = media_range.split(";")[0].strip().lower()
+            for content_type in templates:
+                candidate = content_type.lower()
+                if candidate == wanted or (candidate.endswith("/*") and
+                                           wanted.startswith(candidate[:-1])):
+                    return content_type
+        return "application/json" if "application/json" in templates else next(iter(templates))
+
+    @staticmethod
+    def _gateway_error(status: int, message: str, route: Any) -> dict:
+        """
+        Response API Gateway sends without calling the integration
+        """
+        return {"status": status, "headers": {"Content-Type": "application/json"},
+                "body": json.dumps({"message": message}),
+                "route": "%s %s" % (route["method"], route["path"]) if route else "-",
+                "error": message, "pattern": "gateway", "valid_json": True, "template_ms": 0.0}
@@ -0,0 +1,133 @@
+"""
+    Cold start benchmark for the Lambda handlers
+
+    Every run is a fresh interpreter: the handler module is imported (which
+    builds GLOBAL_ENV) and invoked once against a moto DynamoDB table.  Each
+    handler is measured twice:
+        lazy    - default, boto3 objects are created on first use
+        prewarm - EnvPrewarm=true, everything is built at import like the
+                  original eager EnvParams, for a before/after comparison
+    boto3 itself is already imported by moto, so the numbers cover building
+    the boto3 session/resource/client and the handler code, not loading boto3.
+
+    Usage:
+        python -m benchmarks.cold_start [--runs 5] [--output coldstart.json]
+"""
+from argparse import ArgumentParser, SUPPRESS
+from importlib import import_module
+from os import environ
+from statistics import median
+from sys import executable, path
+from time import perf_counter
+import json
+import subprocess  # nosec
+
+HANDLERS = {
+    "widget_get": ("pylambda.widget.get.app", {"widgetName": "BENCH001"}),
+    "widget_put": ("pylambda.widget.put.app", {"widgetName": "BENCH001", "color": "blue"}),
+    "reports_color": ("pylambda.reports.color.app", {"color": "blue"}),
+    "reports_filterpage": ("pylambda.reports.filterPage.app",
+                           {"limit": "10", "lastKey": "", "filter": ""}),
+}
+
+MODES = {
+    "lazy": "false",
+    "prewarm": "true",
+}
+
+
+def run_child(handler: str) -> dict:
+    """
+    Measure one cold start in this (fresh) process
+    :param handler: key of HANDLERS
+    :return: {import_ms, first_call_ms}
+    """
+    # Heavy test dependencies are loaded before the clock starts
+    from moto import mock_dynamodb
+    import boto3
+    from tests.env_setup_for_tests import env_setup_for_tests
+    from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+    env_setup_for_tests()
+    environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+    module_name, event = HANDLERS[handler]
+
+    with mock_dynamodb():
+        table = create_mock_widget_ddb_table(boto3.resource("dynamodb"))
+        table.put_item(Item={environ["DynamoPartitionKey"]: "BENCH001", "color": "blue"})
+
+        start = perf_counter()
+        module = import_module(module_name)
+        imported = perf_counter()
+        module.lambda_handler(dict(event), None)
+        invoked = perf_counter()
+
+    return {
+        "import_ms": (imported - start) * 1000,
+        "first_call_ms": (invoked - imported) * 1000
+    }
+
+
+def measure(handler: str, mode: str, runs: int) -> dict:
+    """
+    Median cold start of a handler over fresh interpreter processes
+    :param handler: key of HANDLERS
+    :param mode: key of MODES
+    :param runs: number of processes
+    :return: median timings
+    """
+    samples = []
+    child_env = dict(environ, EnvPrewarm=MODES[mode])
+    for _ in range(runs):
+        output = subprocess.run([executable, "-m", "benchmarks.cold_start", "--child", handler],
+                                env=child_env, check=True, capture_output=True, text=True)  # nosec
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    import_ms = median(sample["import_ms"] for sample in samples)
+    first_call_ms = median(sample["first_call_ms"] for sample in samples)
+    return {
+        "handler": handler,
+        "mode": mode,
+        "runs": runs,
+        "import_ms": round(import_ms, 2),
+        "first_call_ms": round(first_call_ms, 2),
+        "total_ms": round(import_ms + first_call_ms, 2)
+    }
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    parser = ArgumentParser(description="Cold start benchmark for the Lambda handlers")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--handler", choices=sorted(HANDLERS), action="append",
+                        help="handler to measure, default all")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--child", choices=sorted(HANDLERS), help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child)))
+        return
+
+    results = []
+    print("%-20s %-8s %10s %14s %10s" % ("handler", "mode", "import_ms", "first_call_ms",
+                                         "total_ms"))
+    for handler in args.handler or sorted(HANDLERS):
+        for mode in MODES:
+            result = measure(handler, mode, args.runs)
+            results.append(result)
+            print("%-20s %-8s %10.2f %14.2f %10.2f" % (handler, mode, result["import_ms"],
+                                                       result["first_call_ms"],
+                                                       result["total_ms"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+    Latency and read-cost benchmark for the four widget handlers
+
+    Seeds a widget table created by tests.env_setup_for_tests.create_mock_widget_ddb_table,
+    in moto by default or in DynamoDB Local with --endpoint, then calls each
+    handler function repeatedly with the table attached to a fresh EnvParams:
+        reports_color      - reports/color get_ddb_data, most common color
+        reports_filterpage - reports/filterPage widget_get, substring filter
+        widget_put         - widget/put widget_put, existing and new names
+        widget_get         - widget/get widget_get, random existing name
+
+    Per handler it reports latency percentiles, CPU time, DynamoDB pages read,
+    items scanned, peak Python allocation (one extra traced call) and the process
+    peak RSS.  Results are written as JSON keyed by the git commit, --compare
+    prints the change against an earlier result file.
+
+    Usage:
+        python -m benchmarks.handlers [--widgets 1000] [--colors 8]
+            [--color-distribution uniform|zipf] [--name-distribution sequential|random|prefixed]
+            [--iterations 50] [--endpoint http://localhost:8000] [--fast-path]
+            [--prefetch-depth 2] [--read-latency-ms 0] [--replay]
+            [--output benchmarks/results/<commit>.json] [--compare baseline.json]
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from os import environ, makedirs
+from os.path import dirname
+from random import Random
+from sys import path
+from time import perf_counter, process_time, sleep
+import json
+import resource
+import subprocess  # nosec
+import tracemalloc
+
+HANDLERS = ["reports_color", "reports_filterpage", "widget_put", "widget_get"]
+
+# DynamoDB calls that read pages, counted per handler call
+READ_OPERATIONS = {"query", "scan", "get_item", "batch_get_item"}
+
+
+class ReadCounter:
+    """
+    Proxy for a Table resource or low-level client that counts the pages read
+    and the items scanned by the calls going through it.  latency_s adds a fixed
+    delay to every read, moto answers in microseconds where DynamoDB takes
+    milliseconds and overlapping reads (prefetch) only shows against real latency.
+    replay answers a read seen before from memory: in-process moto spends the
+    server's CPU time under the GIL of the handler, DynamoDB does not.
+    """
+
+    def __init__(self, target, latency_s: float = 0.0, replay: bool = False):
+        self.target = target
+        self.latency_s = latency_s
+        self.replies = {} if replay else None
+        self.pages = 0
+        self.scanned = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if name not in READ_OPERATIONS:
+            return attribute
+
+        def counted(*args, **kwargs):
+            if self.latency_s > 0:
+                sleep(self.latency_s)
+            if self.replies is None:
+                response = attribute(*args, **kwargs)
+            else:
+                request = (name, json.dumps([args, kwargs], sort_keys=True, default=str))
+                if request not in self.replies:
+                    self.replies[request] = attribute(*args, **kwargs)
+                response = self.replies[request]
+            self.pages += 1
+            if "ScannedCount" in response:
+                self.scanned += response["ScannedCount"]
+            elif "Item" in response:
+                self.scanned += 1
+            else:
+                self.scanned += len(response.get("Items", []))
+            return response
+
+        return counted
+
+    def reset(self):
+        """
+        Start counting a new call
+        :return: Nothing
+        """
+        self.pages = 0
+        self.scanned = 0
+
+
+def widget_names(count: int, distribution: str, rng: Random) -> list:
+    """
+    Widget names for the seed
+    :param count: number of widgets
+    :param distribution: sequential (W0000001...), random (hex) or prefixed
+                         (a few shared prefixes, so substring filters are selective)
+    :param rng: seeded random generator
+    :return: distinct names
+    """
+    if distribution == "sequential":
+        return ["W%07d" % idx for idx in range(count)]
+    if distribution == "random":
+        names = set()
+        while len(names) < count:
+            names.add("%016x" % rng.getrandbits(64))
+        return sorted(names)
+    prefixes = ["ALPHA", "BRAVO", "CHARLIE", "DELTA", "ECHO", "FOXTROT", "GOLF", "HOTEL"]
+    return ["%s-%07d" % (prefixes[idx % len(prefixes)], idx) for idx in range(count)]
+
+
+def widget_colors(count: int, colors: int, distribution: str, rng: Random) -> list:
+    """
+    Widget colors for the seed
+    :param count: number of widgets
+    :param colors: number of distinct colors
+    :param distribution: uniform, or zipf (color k has weight 1/k, one hot color)
+    :param rng: seeded random generator
+    :return: one color per widget
+    """
+    palette = ["color%02d" % idx for idx in range(colors)]
+    weights = None
+    if distribution == "zipf":
+        weights = [1 / (rank + 1) for rank in range(colors)]
+    return rng.choices(palette, weights=weights, k=count)
+
+
+def seed_table(table, names: list, colors: list, pk_name: str):
+    """
+    Write the widgets with BatchWriteItem
+    :param table: widget table resource
+    :param names: widget names
+    :param colors: widget colors
+    :param pk_name: partition key attribute
+    :return: Nothing
+    """
+    with table.batch_writer() as batch:
+        for name, color in zip(names, colors):
+            batch.put_item(Item={pk_name: name, "color": color})
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """
+    Nearest-rank percentile
+    :param samples: measurements
+    :param fraction: 0.5 for p50 ...
+    :return: the sample at that rank
+    """
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def handler_calls(names: list, colors: list, rng: Random) -> dict:
+    """
+    The function under test and an event generator for each handler
+    :param names: seeded widget names
+    :param colors: seeded widget colors
+    :param rng: seeded random generator
+    :return: {handler: (function, event factory)}
+    """
+    from pylambda.reports.color.app import get_ddb_data
+    from pylambda.reports.filterPage.app import widget_get as filter_page
+    from pylambda.widget.put.app import widget_put
+    from pylambda.widget.get.app import widget_get
+
+    hot_color = max(set(colors), key=colors.count)
+    # A substring present in a minority of names, so the filter is selective
+    needle = names[len(names) // 2][-3:]
+    new_names = iter("NEW%07d" % idx for idx in range(10 ** 7))
+    palette = sorted(set(colors))
+
+    return {
+        "reports_color": (get_ddb_data, lambda: {"color": hot_color}),
+        "reports_filterpage": (filter_page,
+                               lambda: {"limit": "100", "lastKey": "", "filter": needle}),
+        "widget_put": (widget_put,
+                       lambda: {"widgetName": rng.choice(names) if rng.random() < 0.5
+                                else next(new_names), "color": rng.choice(palette)}),
+        "widget_get": (widget_get, lambda: {"widgetName": rng.choice(names)}),
+    }
+
+
+def measure(function, make_event, env, counters: list, iterations: int) -> dict:
+    """
+    Call one handler function repeatedly
+    :param function: handler function (event, env)
+    :param make_event: event factory
+    :param env: EnvParams with counted table/client
+    :param counters: ReadCounter proxies attached to env
+    :param iterations: timed calls
+    :return: measurements
+    """
+    latencies = []
+    cpu = []
+    pages = []
+    scanned = []
+    for _ in range(iterations):
+        event = make_event()
+        for counter in counters:
+            counter.reset()
+        cpu_start = process_time()
+        start = perf_counter()
+        function(event, env)
+        latencies.append((perf_counter() - start) * 1000)
+        cpu.append((process_time() - cpu_start) * 1000)
+        pages.append(sum(counter.pages for counter in counters))
+        scanned.append(sum(counter.scanned for counter in counters))
+
+    # Peak allocation from one separate call, tracing slows every allocation
+    tracemalloc.start()
+    function(make_event(), env)
+    _, peak_alloc = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p90_ms": round(percentile(latencies, 0.90), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(max(latencies), 3),
+        "cpu_ms_mean": round(sum(cpu) / iterations, 3),
+        "pages_mean": round(sum(pages) / iterations, 2),
+        "scanned_mean": round(sum(scanned) / iterations, 2),
+        "peak_alloc_kb": round(peak_alloc / 1024, 1),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def git_commit() -> str:
+    """
+    :return: current commit, "unknown" outside a git checkout
+    """
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True,
+                                capture_output=True, text=True)  # nosec
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return output.stdout.strip()
+
+
+def run(args) -> dict:
+    """
+    Seed the table and benchmark the selected handlers
+    :param args: parsed command line
+    :return: result document
+    """
+    import boto3
+    from tests.env_setup_for_tests import env_setup_for_tests
+    from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+    env_setup_for_tests()
+    environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    environ["DynamoDefaultLimit"] = str(args.page_size)
+    path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+    from lambdaDdbEnvLayer import EnvParams
+
+    rng = Random(args.seed)
+    names = widget_names(args.widgets, args.name_distribution, rng)
+    colors = widget_colors(args.widgets, args.colors, args.color_distribution, rng)
+
+    resource_kwargs = {"endpoint_url": args.endpoint} if args.endpoint else {}
+    dynamodb = boto3.resource("dynamodb", **resource_kwargs)
+    table = create_mock_widget_ddb_table(dynamodb)
+    try:
+        seed_start = perf_counter()
+        seed_table(table, names, colors, environ["DynamoPartitionKey"])
+        seed_s = perf_counter() - seed_start
+
+        results = []
+        calls = handler_calls(names, colors, rng)
+        for handler in args.handler or HANDLERS:
+            env = EnvParams()
+            env.dynamodb = dynamodb
+            latency_s = args.read_latency_ms / 1000.0
+            env.ddb_table = ReadCounter(table, latency_s, args.replay)
+            env.client = ReadCounter(boto3.client("dynamodb", **resource_kwargs), latency_s,
+                                     args.replay)
+            env.fast_path = args.fast_path
+            env.prefetch_depth = args.prefetch_depth
+            function, make_event = calls[handler]
+            result = measure(function, make_event, env, [env.ddb_table, env.client],
+                             args.iterations)
+            results.append(dict(handler=handler, **result))
+    finally:
+        table.delete()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "backend": args.endpoint or "moto",
+            "widgets": args.widgets,
+            "colors": args.colors,
+            "color_distribution": args.color_distribution,
+            "name_distribution": args.name_distribution,
+            "page_size": args.page_size,
+            "fast_path": args.fast_path,
+            "prefetch_depth": args.prefetch_depth,
+            "read_latency_ms": args.read_latency_ms,
+            "replay": args.replay,
+            "seed": args.seed,
+            "seed_s": round(seed_s, 2)
+        },
+        "results": results
+    }
+
+
+def compare(current: dict, baseline: dict):
+    """
+    Print the change of each metric against an earlier result file
+    :param current: result document of this run
+    :param baseline: earlier result document
+    :return: Nothing
+    """
+    print("\nchange vs %s (%s)" % (baseline.get("commit", "?"), baseline.get("timestamp", "?")))
+    if baseline.get("config", {}).get("widgets") != current["config"]["widgets"]:
+        print("warning: baseline was seeded with %s widgets" %
+              baseline.get("config", {}).get("widgets"))
+    previous = {result["handler"]: result for result in baseline.get("results", [])}
+    for result in current["results"]:
+        before = previous.get(result["handler"], None)
+        if before is None:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p99_ms", "cpu_ms_mean", "pages_mean", "peak_alloc_kb"):
+            if before.get(metric):
+                changes.append("%s %+.1f%%" % (metric,
+                                               (result[metric] / before[metric] - 1) * 100))
+        print("%-20s %s" % (result["handler"], "  ".join(changes)))
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    parser = ArgumentParser(description="Latency and read-cost benchmark for the handlers")
+    parser.add_argument("--widgets", type=int, default=1000, help="widgets to seed, 10^3..10^6")
+    parser.add_argument("--colors", type=int, default=8, help="distinct colors")
+    parser.add_argument("--color-distribution", choices=["uniform", "zipf"], default="uniform")
+    parser.add_argument("--name-distribution", choices=["sequential", "random", "prefixed"],
+                        default="sequential")
+    parser.add_argument("--iterations", type=int, default=50, help="timed calls per handler")
+    parser.add_argument("--page-size", type=int, default=1000, help="DynamoDefaultLimit")
+    parser.add_argument("--handler", choices=HANDLERS, action="append",
+                        help="handler to measure, default all")
+    parser.add_argument("--endpoint", help="DynamoDB Local URL, default in-process moto")
+    parser.add_argument("--fast-path", action="store_true", help="read with DynamoFastPath")
+    parser.add_argument("--prefetch-depth", type=int, default=2,
+                        help="DynamoPrefetchDepth, 0 reads pages serially")
+    parser.add_argument("--read-latency-ms", type=float, default=0.0,
+                        help="simulated latency added to every DynamoDB read")
+    parser.add_argument("--replay", action="store_true",
+                        help="answer repeated reads from memory, for read-only handlers")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the data set")
+    parser.add_argument("--output", help="result file, default benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    if args.endpoint:
+        current = run(args)
+    else:
+        from moto import mock_dynamodb
+        with mock_dynamodb():
+            current = run(args)
+
+    print("%-20s %9s %9s %9s %9s %8s %10s %12s" % ("handler", "p50_ms", "p90_ms", "p99_ms",
+                                                   "cpu_ms", "pages", "scanned", "peak_kb"))
+    for result in current["results"]:
+        print("%-20s %9.2f %9.2f %9.2f %9.2f %8.1f %10.1f %12.1f" % (
+            result["handler"], result["p50_ms"], result["p90_ms"], result["p99_ms"],
+            result["cpu_ms_mean"], result["pages_mean"], result["scanned_mean"],
+            result["peak_alloc_kb"]))
+
+    output = args.output or "benchmarks/results/%s.json" % current["commit"]
+    if dirname(output):
+        makedirs(dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(current, output_file, indent=2)
+    print("results written to %s" % output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as baseline_file:
+            compare(current, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+    Local end-to-end load generator through the API Gateway mapping templates
+
+    Every worker process builds the API from api/apiSkeleton.yaml
+    (benchmarks.apigw), imports the Lambda handlers named by the SAM template
+    and sends a weighted mix of requests through the request templates, the
+    lambda_handler and the integration response mapping, like API Gateway does.
+    The functions get the literal Globals environment of the template with the
+    test table names.
+
+    DynamoDB stand-in:
+        --endpoint URL - DynamoDB Local (or moto_server), shared by all workers;
+                         the table is created and seeded once
+        default        - in-process moto per worker, each seeded identically;
+                         writes are only seen by the worker that made them
+
+    Reported per route: requests, throughput, latency percentiles, template
+    rendering time and status codes, and the error mapping: which selection
+    pattern and status every Lambda error message ended up with, Lambda errors
+    no pattern matched (they are answered with the default 200) and bodies the
+    templates rendered as invalid JSON.
+
+    Usage:
+        python -m benchmarks.loadgen [--workers 4] [--duration 30 | --requests 1000]
+            [--mix read-heavy | --mix widget_get=60,reports_color=10,...]
+            [--widgets 1000] [--colors 8] [--invalid-rate 0.05] [--miss-rate 0.05]
+            [--endpoint http://localhost:8000] [--output loadgen.json]
+"""
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime, timezone
+from importlib import import_module
+from multiprocessing import get_context
+from os import environ
+from random import Random
+from sys import path
+from time import monotonic, perf_counter, time
+import json
+
+from benchmarks.handlers import git_commit, percentile, seed_table
+from benchmarks.handlers import widget_colors, widget_names
+
+ROUTES = ["widget_get", "widget_put", "widget_lookup", "widget_batch",
+          "reports_color", "reports_filterpage"]
+
+MIXES = {
+    "read-heavy": {"widget_get": 60, "widget_lookup": 10, "reports_color": 10,
+                   "reports_filterpage": 15, "widget_put": 4, "widget_batch": 1},
+    "write-heavy": {"widget_put": 50, "widget_batch": 10, "widget_get": 30,
+                    "reports_color": 5, "reports_filterpage": 5},
+    "reports": {"reports_color": 50, "reports_filterpage": 50},
+}
+
+# Functions of the template that are not behind the API
+NON_API_FUNCTIONS = {"colorViewStreamLambda"}
+
+
+def parse_mix(text: str) -> dict:
+    """
+    :param text: preset name or "route=weight,route=weight"
+    :return: {route: weight}
+    """
+    if text in MIXES:
+        return MIXES[text]
+    mix = {}
+    for part in text.split(","):
+        route, _, weight = part.partition("=")
+        if route.strip() not in ROUTES:
+            raise ValueError("unknown route %s, one of %s" % (route, ", ".join(ROUTES)))
+        mix[route.strip()] = float(weight or 1)
+    return mix
+
+
+def setup_environment(config: dict):
+    """
+    Lambda environment of a worker: template Globals, test table names, overrides
+    :param config: run configuration
+    :return: Nothing
+    """
+    from benchmarks.apigw import global_environment
+    from tests.env_setup_for_tests import env_setup_for_tests
+
+    template = global_environment()
+    environ.update(template)
+    env_setup_for_tests()
+    # The test setup pages one item at a time
+    environ["DynamoDefaultLimit"] = template.get("DynamoDefaultLimit", "1000")
+    environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    # Optional tables of the template are not created here
+    for name in ("DynamoNgramName", "ColorViewName", "DynamoMetaName"):
+        environ.pop(name, None)
+    environ.update({"DynamoMetrics": "off", "EnvPrewarm": "false",
+                    "DynamoColorShards": "0", "DynamoColorShardReads": "false"})
+    environ.update(config["env"])
+    path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+
+def seed(config: dict, dynamodb) -> tuple:
+    """
+    Create and seed the widget table
+    :param config: run configuration
+    :param dynamodb: DynamoDB resource
+    :return: (names, colors)
+    """
+    from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+    rng = Random(config["seed"])
+    names = widget_names(config["widgets"], "sequential", rng)
+    colors = widget_colors(config["widgets"], config["colors"], "uniform", rng)
+    table = create_mock_widget_ddb_table(dynamodb)
+    seed_table(table, names, colors, environ["DynamoPartitionKey"])
+    return names, colors
+
+
+def make_request(route: str, rng: Random, names: list, palette: list, config: dict,
+                 counter: iter) -> tuple:
+    """
+    One request of a route, valid or (--invalid-rate) deliberately invalid
+    :param route: route name
+    :param rng: worker random generator
+    :param names: seeded widget names
+    :param palette: seeded colors
+    :param config: run configuration
+    :param counter: source of unique numbers for new widget names
+    :return: (method, path, query, headers, body)
+    """
+    invalid = rng.random() < config["invalid_rate"]
+    miss = rng.random() < config["miss_rate"]
+    name = "MISSING%07d" % next(counter) if miss else rng.choice(names)
+
+    if route == "widget_get":
+        return "GET", "/widget/%s" % ("%20" if invalid else name), {}, {}, None
+    if route == "widget_put":
+        widget = {"widgetName": "NEW%07d" % next(counter) if miss else name,
+                  "color": "" if invalid else rng.choice(palette)}
+        return "PUT", "/widget", {}, {}, widget
+    if route == "widget_lookup":
+        lookup = rng.sample(names, min(len(names), rng.randint(1, 20)))
+        return "POST", "/widgets/lookup", {}, {}, {"widgetNames": "x" if invalid else lookup}
+    if route == "widget_batch":
+        widgets = [{"widgetName": "BATCH%07d" % next(counter), "color": rng.choice(palette)}
+                   for _ in range(rng.randint(1, 25))]
+        return "PUT", "/widgets/batch", {}, {}, {"widgets": [] if invalid else widgets}
+    if route == "reports_color":
+        query = {"limit": str(rng.randint(10, 100))} if rng.random() < 0.5 else {}
+        color = "nocolor" if miss else rng.choice(palette)
+        if invalid:
+            query["lastKey"] = "not-a-key!"
+        return "GET", "/reports/color/%s" % color, query, {}, None
+    query = {"limit": str(rng.randint(10, 100))}
+    if rng.random() < 0.5:
+        query["filter"] = name[-3:]
+    if invalid:
+        query["lastKey"] = "segments:bad"
+    return "GET", "/reports/filterpage", query, {}, None
+
+
+def worker(config: dict) -> dict:
+    """
+    Worker process: set up the stand-in, then send requests until the deadline
+    or the request count
+    :param config: run configuration and worker number
+    :return: raw samples {route: [[latency_ms, template_ms]]}, statuses, error mapping
+    """
+    setup_environment(config)
+    import boto3
+    from benchmarks.apigw import ApiGateway, lambda_handlers, load_api
+
+    mock = None
+    if config["endpoint"]:
+        dynamodb = boto3.resource("dynamodb", endpoint_url=config["endpoint"])
+        client = boto3.client("dynamodb", endpoint_url=config["endpoint"])
+        rng = Random(config["seed"])
+        names = widget_names(config["widgets"], "sequential", rng)
+        colors = widget_colors(config["widgets"], config["colors"], "uniform", rng)
+    else:
+        from moto import mock_dynamodb
+        mock = mock_dynamodb()
+        mock.start()
+        dynamodb = boto3.resource("dynamodb")
+        client = boto3.client("dynamodb")
+        names, colors = seed(config, dynamodb)
+
+    handlers = {}
+    for logical_id, (module_name, function) in lambda_handlers().items():
+        if logical_id in NON_API_FUNCTIONS:
+            continue
+        module = import_module(module_name)
+        module.GLOBAL_ENV.dynamodb = dynamodb
+        module.GLOBAL_ENV.client = client
+        handlers[logical_id] = getattr(module, function)
+    gateway = ApiGateway(load_api(), handlers)
+
+    rng = Random(config["seed"] * 1000 + config["worker"])
+    counter = iter(range(config["worker"] * 10 ** 7, (config["worker"] + 1) * 10 ** 7))
+    palette = sorted(set(colors))
+    routes = list(config["mix"])
+    weights = [config["mix"][route] for route in routes]
+
+    samples = {route: [] for route in routes}
+    statuses = Counter()
+    mapping = Counter()
+    sent = 0
+    started = time()
+    deadline = monotonic() + config["duration"]
+    try:
+        while (config["requests"] > 0 and sent < config["requests"]) or \
+                (config["requests"] <= 0 and monotonic() < deadline):
+            route = rng.choices(routes, weights)[0]
+            request = make_request(route, rng, names, palette, config, counter)
+            start = perf_counter()
+            response = gateway.request(*request)
+            latency_ms = (perf_counter() - start) * 1000
+            sent += 1
+            if sent <= config["warmup"]:
+                started = time()
+                continue
+            samples[route].append([latency_ms, response["template_ms"]])
+            statuses["%s %d" % (route, response["status"])] += 1
+            if response["error"] is not None or not response["valid_json"]:
+                message = (response["error"] or "").split(":")[0][:40]
+                mapping[json.dumps([route, message, response["pattern"], response["status"],
+                                    response["valid_json"]])] += 1
+    finally:
+        if mock is not None:
+            mock.stop()
+    return {"samples": samples, "statuses": dict(statuses), "mapping": dict(mapping),
+            "started": started, "finished": time()}
+
+
+def summarize(results: list) -> dict:
+    """
+    Merge the workers
+    :param results: worker results
+    :return: {total, rps, wall_s, routes, mapping}
+    """
+    # Load phase only: from the first recorded request to the last worker done
+    wall_s = max(result["finished"] for result in results) - \
+        min(result["started"] for result in results)
+    samples = {}
+    statuses = Counter()
+    mapping = Counter()
+    for result in results:
+        for route, values in result["samples"].items():
+            samples.setdefault(route, []).extend(values)
+        statuses.update(result["statuses"])
+        mapping.update(result["mapping"])
+
+    routes = []
+    for route, values in sorted(samples.items()):
+        if len(values) == 0:
+            continue
+        latencies = [value[0] for value in values]
+        templates = [value[1] for value in values]
+        routes.append({
+            "route": route,
+            "requests": len(values),
+            "rps": round(len(values) / wall_s, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 3),
+            "p90_ms": round(percentile(latencies, 0.90), 3),
+            "p99_ms": round(percentile(latencies, 0.99), 3),
+            "max_ms": round(max(latencies), 3),
+            "template_ms_mean": round(sum(templates) / len(templates), 3),
+            "statuses": {key.split(" ")[1]: count for key, count in statuses.items()
+                         if key.split(" ")[0] == route}
+        })
+
+    total = sum(route["requests"] for route in routes)
+    errors = []
+    for key, count in sorted(mapping.items(), key=lambda item: -item[1]):
+        route, message, pattern, status, valid_json = json.loads(key)
+        errors.append({"route": route, "error": message, "pattern": pattern, "status": status,
+                       "unmapped": len(message) > 0 and pattern == "default",
+                       "valid_json": valid_json,
+                       "count": count})
+    return {"total": total, "rps": round(total / wall_s, 1), "wall_s": round(wall_s, 2),
+            "routes": routes, "mapping": errors}
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    parser = ArgumentParser(description="Load generator through the API Gateway templates")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--requests", type=int, default=0,
+                        help="requests per worker instead of --duration")
+    parser.add_argument("--warmup", type=int, default=20, help="unrecorded requests per worker")
+    parser.add_argument("--mix", default="read-heavy",
+                        help="%s or route=weight,... of %s" % (", ".join(MIXES), ", ".join(ROUTES)))
+    parser.add_argument("--widgets", type=int, default=1000, help="widgets to seed")
+    parser.add_argument("--colors", type=int, default=8, help="distinct colors")
+    parser.add_argument("--invalid-rate", type=float, default=0.05,
+                        help="fraction of deliberately invalid requests")
+    parser.add_argument("--miss-rate", type=float, default=0.05,
+                        help="fraction of unknown widget names and colors")
+    parser.add_argument("--env", action="append", default=[],
+                        help="NAME=VALUE function environment override, repeatable")
+    parser.add_argument("--endpoint", help="DynamoDB Local URL, default moto per worker")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--output", help="write the summary as JSON")
+    args = parser.parse_args()
+
+    config = {
+        "mix": parse_mix(args.mix), "duration": args.duration, "requests": args.requests,
+        "warmup": args.warmup, "widgets": args.widgets, "colors": args.colors,
+        "invalid_rate": args.invalid_rate, "miss_rate": args.miss_rate,
+        "env": dict(item.split("=", 1) for item in args.env),
+        "endpoint": args.endpoint, "seed": args.seed
+    }
+    if args.endpoint:
+        setup_environment(config)
+        import boto3
+        seed(config, boto3.resource("dynamodb", endpoint_url=args.endpoint))
+
+    # Fresh interpreters, no boto3 or moto state inherited from this process
+    context = get_context("spawn")
+    with context.Pool(args.workers) as pool:
+        results = pool.map(worker, [dict(config, worker=number)
+                                    for number in range(args.workers)])
+    summary = summarize(results)
+
+    print("%-20s %8s %8s %9s %9s %9s %9s %11s  %s" % (
+        "route", "requests", "rps", "p50_ms", "p90_ms", "p99_ms", "max_ms", "template_ms",
+        "statuses"))
+    for route in summary["routes"]:
+        print("%-20s %8d %8.1f %9.2f %9.2f %9.2f %9.2f %11.3f  %s" % (
+            route["route"], route["requests"], route["rps"], route["p50_ms"], route["p90_ms"],
+            route["p99_ms"], route["max_ms"], route["template_ms_mean"],
+            " ".join("%s:%d" % item for item in sorted(route["statuses"].items()))))
+    print("total %d requests, %.1f rps over %.1f s" % (
+        summary["total"], summary["rps"], summary["wall_s"]))
+
+    print("\n%-20s %-16s %-16s %6s %9s %6s" % ("route", "error", "pattern", "status",
+                                              "unmapped", "count"))
+    for error in summary["mapping"]:
+        print("%-20s %-16s %-16s %6d %9s %6d%s" % (
+            error["route"], error["error"] or "-", error["pattern"], error["status"],
+            "yes" if error["unmapped"] else "no", error["count"],
+            "" if error["valid_json"] else "  invalid JSON body"))
+
+    if args.output:
+        document = {"commit": git_commit(),
+                    "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "config": dict(config, workers=args.workers), **summary}
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(document, output_file, indent=2)
+        print("results written to %s" % args.output)
+
+
+if __name__ == "__main__":
+    main()
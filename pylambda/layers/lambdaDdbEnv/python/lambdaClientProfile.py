@@ -0,0 +1,190 @@
+"""
+    Helper lambda layer for the DynamoDB client profile: connection pool,
+    timeouts, retries and the throttling circuit breaker
+"""
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError
+from botocore.exceptions import HTTPClientError
+from lambdaDdbProxy import DdbProxy
+
+# Error codes of a throttled or overloaded DynamoDB, CircuitOpen is raised by
+# the breaker itself
+THROTTLING_CODES = {"ProvisionedThroughputExceededException", "ThrottlingException",
+                    "RequestLimitExceeded", "TransactionInProgressException",
+                    "CircuitOpen"}
+
+
+
+def client_config(pool_size: int, connect_timeout_s: float, read_timeout_s: float,
+                  keep_alive: bool, retry_mode: str, max_attempts: int) -> Config:
+    """
+    botocore configuration shared by the resource and the low-level client
+    :param pool_size: max_pool_connections, at least the threads calling at once
+    :param connect_timeout_s: connect timeout
+    :param read_timeout_s: read timeout of one attempt
+    :param keep_alive: TCP keep-alive on pooled connections
+    :param retry_mode: "adaptive" adds client-side rate limiting to "standard"
+    :param max_attempts: attempts per call, including the first one
+    :return: Config
+    """
+    return Config(max_pool_connections=pool_size,
+                  connect_timeout=connect_timeout_s,
+                  read_timeout=read_timeout_s,
+                  tcp_keepalive=keep_alive,
+                  retries={"mode": retry_mode, "max_attempts": max_attempts})
+
+
+def is_throttling(client_error: ClientError) -> bool:
+    """
+    :param client_error: error of a DynamoDB call
+    :return: True if DynamoDB throttled the call (after the client retries)
+             or the circuit breaker refused it
+    """
+    return client_error.response.get("Error", {}).get("Code", "") in THROTTLING_CODES
+
+
+def is_overloaded(error: BaseException) -> bool:
+    """
+    :param error: error of a DynamoDB call
+    :return: True if the error counts towards opening the breaker: throttling,
+             or a connection error or timeout (EndpointConnectionError,
+             ConnectTimeoutError, ReadTimeoutError) once the client retries are spent
+    """
+    if isinstance(error, ClientError):
+        return is_throttling(error)
+    return isinstance(error, (BotoConnectionError, HTTPClientError))
+
+
+class CircuitOpenError(ClientError):
+    """
+    Raised instead of calling DynamoDB while the breaker is open.  A
+    ClientError, so the handlers' service error handling applies unchanged.
+    """
+
+    def __init__(self, operation: str, retry_in_s: float):
+        """
+        Init
+        :param operation: refused call
+        :param retry_in_s: time left until a trial call is allowed
+        """
+        super().__init__({"Error": {"Code": "CircuitOpen",
+                                    "Message": "DynamoDB is throttling, retry in %.1f s"
+                                               % retry_in_s}}, operation)
+
+
+class CircuitBreaker:
+    """
+    Fails fast once DynamoDB keeps throttling.  threshold throttled calls
+    (after the client's own retries) within window_s open the breaker; calls
+    then raise CircuitOpenError without a request for cooldown_s.  After that
+    one trial call goes through: success closes the breaker, another throttle
+    opens it again.  Connection errors and timeouts count as throttles, other
+    errors and successes do not.
+    """
+
+    def __init__(self, threshold: int, window_s: float, cooldown_s: float,
+                 clock: Callable = monotonic):
+        """
+        Init
+        :param threshold: throttled calls that open the breaker, 0 never opens
+        :param window_s: time window of the counted throttles
+        :param cooldown_s: time the breaker stays open
+        :param clock: time source, for tests
+        """
+        self.threshold = threshold
+        self.window_s = window_s
+        self.cooldown_s = cooldown_s
+        self.clock = clock
+        self._lock = Lock()
+        self._throttles = []
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        """
+        "closed", "open" or "half-open"
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self.clock() - self._opened_at < self.cooldown_s or self._trial:
+                return "open"
+            return "half-open"
+
+    def before_call(self, operation: str):
+        """
+        Admit a call, or refuse it while open
+        :param operation: call name, for the error
+        :return: Nothing
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = self.clock() - self._opened_at
+            if waited < self.cooldown_s or self._trial:
+                raise CircuitOpenError(operation, max(0.0, self.cooldown_s - waited))
+            # Half-open: this call is the trial, the others keep failing fast
+            self._trial = True
+
+    def success(self):
+        """
+        A call went through, closes a half-open breaker
+        :return: Nothing
+        """
+        with self._lock:
+            if self._trial:
+                self._opened_at = None
+                self._trial = False
+                self._throttles = []
+
+    def failure(self, error: BaseException):
+        """
+        A call failed, throttles and timeouts count towards opening the breaker
+        :param error: error of the call, any exception
+        :return: Nothing
+        """
+        throttled = is_overloaded(error)
+        with self._lock:
+            if self._trial:
+                # The trial decides: throttled opens again, anything else closes
+                self._trial = False
+                self._opened_at = self.clock() if throttled else None
+                self._throttles = []
+                return
+            if not throttled or self.threshold <= 0:
+                return
+            now = self.clock()
+            self._throttles = [at for at in self._throttles if now - at < self.window_s]
+            self._throttles.append(now)
+            if len(self._throttles) >= self.threshold:
+                self._opened_at = now
+                self._throttles = []
+
+    def wrap(self, target: Any) -> Any:
+        """
+        :param target: Table resource or low-level client
+        :return: proxy guarding the calls of the target
+        """
+        return DdbProxy(target, self)
+
+    def before(self, target: Any, operation: str, kwargs: dict):
+        """
+        DdbProxy hook, see before_call
+        :return: Nothing
+        """
+        self.before_call(operation)
+
+    def after(self, target: Any, operation: str, kwargs: dict, token: Any, response: Any,
+              error: BaseException):
+        """
+        DdbProxy hook: any error ends a trial call, or no call would be admitted again
+        :return: Nothing
+        """
+        if error is not None:
+            self.failure(error)
+        else:
+            self.success()
@@ -0,0 +1,375 @@
+"""
+    Helper lambda layer for the materialized per-color widget views
+"""
+from typing import Any
+from zlib import crc32
+from botocore.exceptions import ClientError
+
+COUNT_PART = "count"
+CHUNK_PREFIX = "chunk#"
+
+# Transactions retried with a fresh chunk layout when a split moved it on
+STATE_RETRIES = 5
+
+
+def is_permanent(client_error: ClientError) -> bool:
+    """
+    :param client_error: error of a view change
+    :return: True when retrying the change cannot succeed, e.g. an item past
+             the 400 KB limit
+    """
+    response = client_error.response
+    code = response.get("Error", {}).get("Code")
+    return code == "ValidationException" or (
+        code == "TransactionCanceledException" and
+        any(reason.get("Code") == "ValidationError"
+            for reason in response.get("CancellationReasons", [])))
+
+
+class ColorView:
+    """
+    Per-color view of the widget table, maintained from the table stream.
+    One partition per color in the view table {color, part}:
+        part "count"      - {count, buckets, level, split, rev, stale}
+        part "chunk#0007" - {members}: string set of widget names
+    Chunks are linear hashing buckets: a color starts with `chunks` of them,
+    and a name is in chunk crc32 % (buckets << level), or % (buckets << level + 1)
+    below the split pointer.  Once the color averages more than half of
+    max_members names per chunk, the chunk at the split pointer is split in
+    two, so a chunk stays under max_members names however many widgets the
+    color has.  Members are added and removed without reading the partition
+    first; every change is a conditional transaction of the member set and
+    the count, conditional on the chunk layout, and replaying a stream record
+    is a no-op.  A color whose view could not be changed is marked stale and
+    read from the index until tools/color_view repairs it.
+    """
+
+    def __init__(self, table: Any, chunks: int, max_members: int = 1000):
+        """
+        Init
+        :param table: view Table resource
+        :param chunks: initial member chunks per color
+        :param max_members: names per chunk before it is split
+        """
+        self.table = table
+        self.chunks = chunks
+        self.max_members = max_members
+        # Chunk layout per color, refreshed when a transaction finds it changed
+        self._states = {}
+
+    def _state(self, color: str) -> dict:
+        """
+        :param color: color
+        :return: {buckets, level, split, count, rev, hashed} of the color
+        """
+        state = self._states.get(color, None)
+        if state is not None:
+            return state
+        item = self.table.get_item(
+            Key={"color": color, "part": COUNT_PART}, ConsistentRead=True,
+            ProjectionExpression="#count, #buckets, #level, #split, #rev",
+            ExpressionAttributeNames={"#count": "count", "#buckets": "buckets",
+                                      "#level": "level", "#split": "split",
+                                      "#rev": "rev"}).get("Item", {})
+        state = {"buckets": int(item.get("buckets", self.chunks)),
+                 "level": int(item.get("level", 0)),
+                 "split": int(item.get("split", 0)),
+                 "count": int(item.get("count", 0)),
+                 "rev": int(item.get("rev", 0)),
+                 # Colors written before chunks could split have no layout yet
+                 "hashed": "level" in item}
+        self._states[color] = state
+        return state
+
+    def chunk_part(self, widget_name: str, state: dict = None) -> str:
+        """
+        :param widget_name: widget name
+        :param state: chunk layout of the color, default the initial one
+        :return: sort key of the chunk holding the name
+        """
+        if state is None:
+            state = {"buckets": self.chunks, "level": 0, "split": 0}
+        hashed = crc32(widget_name.encode("utf-8"))
+        bucket = hashed % (state["buckets"] << state["level"])
+        if bucket < state["split"]:
+            bucket = hashed % (state["buckets"] << (state["level"] + 1))
+        return "%s%04d" % (CHUNK_PREFIX, bucket)
+
+    def _transact(self, color: str, widget_name: str, action: str, condition: str,
+                  delta: int) -> bool:
+        """
+        Change one member and the count in a single conditional transaction
+        :param color: color partition
+        :param widget_name: member
+        :param action: ADD or DELETE of the member set
+        :param condition: condition on the member set
+        :param delta: count change
+        :return: True if applied, False if the condition showed it is already applied
+        """
+        for attempt in range(STATE_RETRIES):
+            state = self._state(color)
+            layout = {"ConditionExpression": "attribute_not_exists(#level)",
+                      "ExpressionAttributeNames": {"#level": "level"},
+                      "ExpressionAttributeValues": {}}
+            if state["hashed"]:
+                layout = {"ConditionExpression": "#level = :l AND #split = :s",
+                          "ExpressionAttributeNames": {"#level": "level", "#split": "split"},
+                          "ExpressionAttributeValues": {":l": state["level"],
+                                                        ":s": state["split"]}}
+            try:
+                self.table.meta.client.transact_write_items(TransactItems=[
+                    {"Update": {
+                        "TableName": self.table.name,
+                        "Key": {"color": color, "part": self.chunk_part(widget_name, state)},
+                        "UpdateExpression": "%s #members :m" % action,
+                        "ConditionExpression": condition,
+                        "ExpressionAttributeNames": {"#members": "members"},
+                        "ExpressionAttributeValues": {":m": {widget_name}, ":n": widget_name}
+                    }},
+                    {"Update": {
+                        "TableName": self.table.name,
+                        "Key": {"color": color, "part": COUNT_PART},
+                        "UpdateExpression": "ADD #count :d, #rev :one",
+                        "ConditionExpression": layout["ConditionExpression"],
+                        "ExpressionAttributeNames": dict(layout["ExpressionAttributeNames"],
+                                                         **{"#count": "count", "#rev": "rev"}),
+                        "ExpressionAttributeValues": dict(layout["ExpressionAttributeValues"],
+                                                          **{":d": delta, ":one": 1})
+                    }}
+                ])
+            except ClientError as client_error:
+                reasons = client_error.response.get("CancellationReasons", [])
+                if client_error.response.get("Error", {}).get("Code") != \
+                        "TransactionCanceledException" or len(reasons) < 2:
+                    raise
+                if reasons[1].get("Code") == "ConditionalCheckFailed":
+                    # Another writer split a chunk, retry with the new layout
+                    self._states.pop(color, None)
+                    if attempt < STATE_RETRIES - 1:
+                        continue
+                    raise
+                if reasons[0].get("Code") == "ConditionalCheckFailed":
+                    return False
+                raise
+
+            state["count"] += delta
+            state["rev"] += 1
+            if delta > 0:
+                self._grow(color)
+            return True
+        return False
+
+    def _grow(self, color: str):
+        """
+        Split chunks until the color averages at most max_members / 2 names per chunk
+        :param color: color
+        :return: Nothing
+        """
+        state = self._states.get(color, None)
+        while state is not None and state["count"] * 2 > self.max_members * (
+                (state["buckets"] << state["level"]) + state["split"]):
+            if not self._split(color, state):
+                return
+            state = self._states.get(color, None)
+
+    def _split(self, color: str, state: dict) -> bool:
+        """
+        Split the chunk at the split pointer, conditional on no other change
+        of the color since the layout was read
+        :param color: color
+        :param state: current layout of the color
+        :return: True if split, False if the color changed meanwhile
+        """
+        size = state["buckets"] << state["level"]
+        old_part = "%s%04d" % (CHUNK_PREFIX, state["split"])
+        new_part = "%s%04d" % (CHUNK_PREFIX, state["split"] + size)
+        members = self.table.get_item(Key={"color": color, "part": old_part},
+                                      ConsistentRead=True).get("Item", {}).get("members", set())
+        moved = {name for name in members
+                 if crc32(name.encode("utf-8")) % (size << 1) != state["split"]}
+        kept = set(members) - moved
+
+        split, level = state["split"] + 1, state["level"]
+        if split == size:
+            split, level = 0, level + 1
+        items = []
+        if len(kept) > 0:
+            items.append({"Put": {"TableName": self.table.name,
+                                  "Item": {"color": color, "part": old_part, "members": kept}}})
+        else:
+            items.append({"Delete": {"TableName": self.table.name,
+                                     "Key": {"color": color, "part": old_part}}})
+        if len(moved) > 0:
+            items.append({"Put": {"TableName": self.table.name,
+                                  "Item": {"color": color, "part": new_part, "members": moved}}})
+        items.append({"Update": {
+            "TableName": self.table.name,
+            "Key": {"color": color, "part": COUNT_PART},
+            "UpdateExpression": "SET #buckets = :b, #level = :l, #split = :s ADD #rev :one",
+            "ConditionExpression": "#rev = :rev",
+            "ExpressionAttributeNames": {"#buckets": "buckets", "#level": "level",
+                                         "#split": "split", "#rev": "rev"},
+            "ExpressionAttributeValues": {":b": state["buckets"], ":l": level, ":s": split,
+                                          ":one": 1, ":rev": state["rev"]}
+        }})
+        try:
+            self.table.meta.client.transact_write_items(TransactItems=items)
+        except ClientError as client_error:
+            if client_error.response.get("Error", {}).get("Code") != \
+                    "TransactionCanceledException":
+                raise
+            # Changed meanwhile, the next addition splits again
+            self._states.pop(color, None)
+            return False
+
+        state.update(level=level, split=split, rev=state["rev"] + 1, hashed=True)
+        return True
+
+    def add(self, color: str, widget_name: str) -> bool:
+        """
+        Add a widget to a color
+        :param color: color
+        :param widget_name: widget name
+        :return: True if added, False if it was already a member
+        """
+        return self._transact(color, widget_name, "ADD",
+                              "attribute_not_exists(#members) OR NOT contains(#members, :n)", 1)
+
+    def remove(self, color: str, widget_name: str) -> bool:
+        """
+        Remove a widget from a color
+        :param color: color
+        :param widget_name: widget name
+        :return: True if removed, False if it was not a member
+        """
+        return self._transact(color, widget_name, "DELETE", "contains(#members, :n)", -1)
+
+    def mark_stale(self, color: str):
+        """
+        Send the reports of a color back to the index until the view is repaired
+        :param color: color
+        :return: Nothing
+        """
+        self.table.update_item(Key={"color": color, "part": COUNT_PART},
+                               UpdateExpression="SET #stale = :t",
+                               ExpressionAttributeNames={"#stale": "stale"},
+                               ExpressionAttributeValues={":t": True})
+
+    def members(self, color: str, stale_ok: bool = False) -> Any:
+        """
+        Widget names of a color, read from the chunk items of its partition
+        :param color: color
+        :param stale_ok: return the names of a stale view too
+        :return: names in name order, None when the view of the color is stale
+        """
+        query_kwargs = {
+            "KeyConditionExpression": "color = :c",
+            "ExpressionAttributeNames": {"#members": "members", "#stale": "stale"},
+            "ExpressionAttributeValues": {":c": color},
+            "ProjectionExpression": "#members, #stale"
+        }
+        # A set: a read racing a split may see a moved name in both chunks
+        names = set()
+        stale = False
+        while True:
+            response = self.table.query(**query_kwargs)
+            for item in response.get("Items", []):
+                names.update(item.get("members", ()))
+                stale = stale or bool(item.get("stale", False))
+            if response.get("LastEvaluatedKey", None) is None:
+                return None if stale and not stale_ok else sorted(names)
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def counts(self) -> dict:
+        """
+        Widget count of every color, from the count items only
+        :return: {color: count} of the colors with widgets
+        """
+        scan_kwargs = {
+            "FilterExpression": "#part = :p",
+            "ExpressionAttributeNames": {"#part": "part"},
+            "ExpressionAttributeValues": {":p": COUNT_PART}
+        }
+        counts = {}
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            for item in response.get("Items", []):
+                if int(item.get("count", 0)) != 0:
+                    counts[item["color"]] = int(item["count"])
+            if response.get("LastEvaluatedKey", None) is None:
+                return counts
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def colors(self) -> set:
+        """
+        :return: every color with items in the view, including empty ones
+        """
+        scan_kwargs = {"ProjectionExpression": "color"}
+        colors = set()
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            colors.update(item["color"] for item in response.get("Items", []))
+            if response.get("LastEvaluatedKey", None) is None:
+                return colors
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def set_count(self, color: str, count: int):
+        """
+        Overwrite the count of a color, the view of the color is no longer stale
+        :param color: color
+        :param count: widget count
+        :return: Nothing
+        """
+        self.table.update_item(Key={"color": color, "part": COUNT_PART},
+                               UpdateExpression="SET #count = :c REMOVE #stale ADD #rev :one",
+                               ExpressionAttributeNames={"#count": "count", "#stale": "stale",
+                                                         "#rev": "rev"},
+                               ExpressionAttributeValues={":c": count, ":one": 1})
+        self._states.pop(color, None)
+
+    def replace(self, color: str, widget_names: list):
+        """
+        Overwrite the whole partition of a color, used by the rebuild.  The chunks
+        are laid out for the number of names.  Not atomic with respect to the
+        stream consumer, run the check afterwards.
+        :param color: color
+        :param widget_names: all widget names of the color, may be empty
+        :return: Nothing
+        """
+        count = len(set(widget_names))
+        state = {"buckets": self.chunks, "level": 0, "split": 0}
+        while count * 2 > self.max_members * (state["buckets"] << state["level"]):
+            state["level"] += 1
+
+        chunks = {}
+        for name in widget_names:
+            chunks.setdefault(self.chunk_part(name, state), set()).add(name)
+
+        existing = set()
+        query_kwargs = {
+            "KeyConditionExpression": "color = :c",
+            "ExpressionAttributeNames": {"#part": "part"},
+            "ExpressionAttributeValues": {":c": color},
+            "ProjectionExpression": "#part"
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            existing.update(item["part"] for item in response.get("Items", []))
+            if response.get("LastEvaluatedKey", None) is None:
+                break
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        with self.table.batch_writer() as batch:
+            for part, names in chunks.items():
+                batch.put_item(Item={"color": color, "part": part, "members": names})
+            for part in existing - set(chunks) - {COUNT_PART}:
+                batch.delete_item(Key={"color": color, "part": part})
+        self.table.update_item(
+            Key={"color": color, "part": COUNT_PART},
+            UpdateExpression="SET #count = :c, #buckets = :b, #level = :l, #split = :s "
+                             "REMOVE #stale ADD #rev :one",
+            ExpressionAttributeNames={"#count": "count", "#buckets": "buckets", "#level": "level",
+                                      "#split": "split", "#stale": "stale", "#rev": "rev"},
+            ExpressionAttributeValues={":c": count, ":b": state["buckets"], ":l": state["level"],
+                                       ":s": 0, ":one": 1})
+        self._states.pop(color, None)
@@ -0,0 +1,160 @@
+"""
+    Helper lambda layer for caching widget and report reads
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Hashable
+import json
+
+
+class LruTtlCache:
+    """
+    In-process read-through cache bounded by entry count and bytes, with LRU
+    eviction and a per-entry TTL.  Lives in GLOBAL_ENV, so it is shared by the
+    warm invocations of one Lambda container.  Cached values are shared, callers
+    must not mutate them.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        """
+        Init
+        :param max_entries: maximum number of cached entries
+        :param max_bytes: maximum total (JSON serialized) size of cached values
+        :param ttl_seconds: lifetime of an entry
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (expires at, size, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Look up a key
+        :param key: cache key, e.g. ("widget", widgetName)
+        :return: cached value, None on a miss or expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, value: Any, size: int = None):
+        """
+        Store a value, evicting least recently used entries to stay in bounds
+        :param key: cache key
+        :param value: JSON serializable value
+        :param size: size of the value in bytes, measured as JSON when omitted
+        :return: Nothing
+        """
+        if size is None:
+            size = len(json.dumps(value, separators=(",", ":")))
+        if size > self.max_bytes:
+            # Would evict everything else, not worth caching
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (monotonic() + self.ttl_seconds, size, value)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Look up several keys
+        :param keys: cache keys
+        :return: {key: value} of the keys cached
+        """
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def get_or_build(self, key: Hashable, build: Callable) -> Any:
+        """
+        Read-through lookup
+        :param key: cache key
+        :param build: returns the value on a miss; may raise, nothing is cached then
+        :return: cached or built value
+        """
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def invalidate_many(self, keys: list):
+        """
+        Drop several keys
+        :param keys: cache keys
+        :return: Nothing
+        """
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+
+    def invalidate(self, key: Hashable):
+        """
+        Drop a key if cached
+        :param key: cache key
+        :return: Nothing
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_namespace(self, namespace: str):
+        """
+        Drop every (namespace, ...) key, e.g. all color reports
+        :param namespace: first element of the key tuples to drop
+        :return: Nothing
+        """
+        with self._lock:
+            for key in [key for key in self._entries
+                        if isinstance(key, tuple) and key[0] == namespace]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """
+        :return: counters and current size of the cache
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def _remove(self, key: Hashable):
+        """
+        Remove an entry, caller holds the lock
+        :param key: cache key
+        :return: Nothing
+        """
+        self.bytes -= self._entries.pop(key)[1]
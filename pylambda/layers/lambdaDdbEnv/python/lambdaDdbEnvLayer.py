@@ -1,8 +1,27 @@
 """
     Helper lambda layer for environment variables and DDB connections
 """
-from os import environ
-import boto3
+from os import environ, cpu_count
+import logging
+from random import uniform
+from queue import Full, Queue
+from threading import Event, Lock, RLock, Thread
+from time import monotonic, sleep
+from typing import Any, Callable, Iterator
+from zlib import crc32
+import boto3.session
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from lambdaDdbCache import LruTtlCache
+from lambdaSharedCache import SHARED_CACHE_BACKENDS, SharedCache, TieredCache
+from lambdaColorView import ColorView
+from lambdaVersions import VersionTracker
+from lambdaPageIndex import PageIndex
+from lambdaMetrics import DdbMetrics, EmfSink
+from lambdaProfiler import HandlerProfiler, open_sink
+from lambdaReportSpill import open_spill_store
+from lambdaClientProfile import CircuitBreaker, client_config
 
 
 class EnvParams:
@@ -13,29 +32,420 @@ class EnvParams:
 
     def __init__(self):
         """
-        Init
+        Init.  Only reads the environment: the boto3 session, resource, client
+        and tables are created on first use, see prewarm()
         """
-        self.dynamodb = boto3.resource('dynamodb')
+        self._lock = RLock()
+        self._session = None
+        self._dynamodb = None
+        self._client = None
+        self._ddb_table = None
+        self._ngram_table = None
+        self._color_view = None
+        self._versions = None
+        self._page_index = None
 
         # Use environment variables for all dynamo PK and SK
         # in case of data model changes
 
-        self.ddb_table = self.dynamodb.Table(environ['DynamoName'])
+        self.ddb_name = environ['DynamoName']
         self.ddb_pk = environ['DynamoPartitionKey']
         self.ddb_limit = environ['DynamoDefaultLimit']
         self.ddb_idx_color = environ['DynamoIndexColor']
         self.ddb_idx_color_pk = environ['DynamoIndexColorKey']
 
+        # Optional write sharding of the color index: items also get
+        # colorShard = "<color>#<n>", n derived from the widget name, indexed by
+        # a second GSI.  Reads switch over separately, once the backfill is done
+        # (tools/color_shards.py); 0 shards disables both
+        self.color_shards = int(environ.get('DynamoColorShards', '0'))
+        self.ddb_idx_color_shard = environ.get('DynamoIndexColorShard', 'Widget-by-ColorShard')
+        self.ddb_idx_color_shard_pk = environ.get('DynamoIndexColorShardKey', 'colorShard')
+        self.color_shard_reads = self.color_shards > 0 and \
+            environ.get('DynamoColorShardReads', 'false').lower() == 'true'
+
+        # Optional name index for prefix filters: items also get nameBucket =
+        # "names#<n>", n derived from the widget name, indexed with the widget
+        # name as sort key.  Buckets spread the index writes; reads query every
+        # bucket and merge by name.  Reads switch over separately, once the
+        # backfill is done (tools/name_buckets.py); 0 buckets disables both
+        self.name_buckets = int(environ.get('DynamoNameBuckets', '0'))
+        self.ddb_idx_name = environ.get('DynamoIndexName', 'Widget-by-Name')
+        self.ddb_idx_name_bucket_pk = environ.get('DynamoIndexNameBucketKey', 'nameBucket')
+        self.name_prefix_reads = self.name_buckets > 0 and \
+            environ.get('DynamoNamePrefixReads', 'false').lower() == 'true'
+
+        # Per-invocation caps for paged/streamed reports, so memory and
+        # latency stay bounded regardless of how many rows match
+        self.report_max_items = int(environ.get('ReportMaxItems', '10000'))
+        self.report_time_budget_ms = int(environ.get('ReportTimeBudgetMs', '20000'))
+        # Colors of one /reports/colors request
+        self.report_max_colors = int(environ.get('ReportMaxColors', '16'))
+
+        # Parallel scan fan-out; 1 keeps the single sequential scan.  Workers
+        # default to the vCPUs Lambda allocates for the configured memory
+        self.scan_segments = int(environ.get('DynamoScanSegments', '1'))
+        self.scan_workers = int(environ.get('DynamoScanWorkers', str(cpu_count() or 1)))
+
+        # Filtered scans keep reading until the page is full, within these caps
+        # (0 capacity = no read capacity cap)
+        self.scan_time_budget_ms = int(environ.get('ScanTimeBudgetMs', '5000'))
+        self.scan_max_capacity = float(environ.get('ScanMaxReadCapacity', '0'))
+
+        # Optional companion table of widget name n-gram postings {gram, widgetName}
+        # for substring filters; no table name disables the index.  Reads switch
+        # over separately, once the backfill is done (tools/ngrams.py)
+        self.ngram_name = environ.get('DynamoNgramName', '')
+        self.ngram_size = int(environ.get('DynamoNgramSize', '3'))
+        self.ngram_reads = len(self.ngram_name) > 0 and \
+            environ.get('DynamoNgramReads', 'false').lower() == 'true'
+
+        # Optional stream-maintained per-color view {color, part} read by the
+        # color report; no table name keeps the report on the color index
+        self.color_view_name = environ.get('ColorViewName', '')
+        self.color_view_chunks = int(environ.get('ColorViewChunks', '16'))
+        self.color_view_chunk_members = int(environ.get('ColorViewChunkMembers', '1000'))
+
+        # Optional meta table {metaKey} of data versions behind the report
+        # ETags; no table name disables conditional responses
+        self.meta_name = environ.get('DynamoMetaName', '')
+
+        # Page-boundary index of the filter page report, kept in the meta table
+        # per data version; a 0 TTL disables it
+        self.page_index_ttl_s = int(environ.get('PageIndexTtlSeconds', '3600'))
+        self.page_index_max_pages = int(environ.get('PageIndexMaxPages', '1000'))
+
+        # Full color reports larger than ReportInlineMaxBytes (as serialized
+        # JSON) go to a gzip NDJSON object in ReportSpillStore, a directory or
+        # s3://bucket/prefix, returned as a link valid ReportSpillUrlSeconds;
+        # no store returns every report inline
+        self.report_inline_max_bytes = int(environ.get('ReportInlineMaxBytes', '4000000'))
+        self.report_spill_url_s = int(environ.get('ReportSpillUrlSeconds', '900'))
+        self.report_spill_store = None
+        if len(environ.get('ReportSpillStore', '')) > 0:
+            self.report_spill_store = open_spill_store(
+                environ['ReportSpillStore'],
+                lambda: self.session.client("s3", config=Config(signature_version="s3v4")),
+                int(environ.get('ReportSpillPartBytes', str(8 * 1024 * 1024))))
+
+        # Batch reads/writes: worker threads and retries of unprocessed items
+        # with exponential backoff and full jitter
+        self.batch_workers = int(environ.get('DynamoBatchWorkers', '4'))
+        self.batch_max_retries = int(environ.get('DynamoBatchMaxRetries', '8'))
+        self.batch_backoff_ms = int(environ.get('DynamoBatchBackoffMs', '50'))
+        self.batch_backoff_cap_ms = int(environ.get('DynamoBatchBackoffCapMs', '2000'))
+        self.batch_max_items = int(environ.get('WidgetBatchMaxItems', '1000'))
+        self.lookup_max_names = int(environ.get('WidgetLookupMaxNames', '1000'))
+
+        # Optional read-through cache of ("widget", name) and ("color", color)
+        # reads for warm invocations of this container
+        self.cache = None
+        if environ.get('WidgetCacheEnabled', 'false').lower() == 'true':
+            self.cache = LruTtlCache(
+                int(environ.get('WidgetCacheMaxEntries', '1024')),
+                int(environ.get('WidgetCacheMaxBytes', str(16 * 1024 * 1024))),
+                float(environ.get('WidgetCacheTtlSeconds', '30')))
+
+        # Optional cache tier shared by all containers behind the one above,
+        # e.g. SharedCacheBackend=memcached, SharedCacheEndpoint=host:11211.
+        # Cache errors are misses, reads fall back to DynamoDB.
+        self.shared_cache_backend = environ.get('SharedCacheBackend', '')
+        if len(self.shared_cache_backend) > 0:
+            if self.shared_cache_backend not in SHARED_CACHE_BACKENDS:
+                raise Exception("error: unknown SharedCacheBackend %s"
+                                % self.shared_cache_backend)
+            client = SHARED_CACHE_BACKENDS[self.shared_cache_backend](
+                environ.get('SharedCacheEndpoint', 'localhost:11211'),
+                int(environ.get('SharedCacheTimeoutMs', '50')) / 1000)
+            self.cache = TieredCache(self.cache, SharedCache(
+                client,
+                int(environ.get('SharedCacheTtlSeconds', '300')),
+                int(environ.get('SharedCacheLockMs', '2000')),
+                int(environ.get('SharedCacheWaitMs', '500')),
+                max_item_bytes=int(environ.get('SharedCacheMaxItemBytes', '1048576'))))
+
+        # Report reads through the low-level client, mapping the wire format
+        # straight to widgets instead of going through the Table resource
+        self.fast_path = environ.get('DynamoFastPath', 'false').lower() == 'true'
+        self.widget_attributes = (("widgetName", self.ddb_pk), ("color", "color"))
+        self._mappers = {}
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+
+        # Pages read ahead by paginate_widgets while the current page is mapped,
+        # 0 reads page after page
+        self.prefetch_depth = int(environ.get('DynamoPrefetchDepth', '2'))
+
+        # Optional per-call DynamoDB metrics as embedded metric format log lines;
+        # "off" leaves the tables and the client unwrapped
+        self.metrics = None
+        if environ.get('DynamoMetrics', 'off').lower() == 'emf':
+            self.metrics = DdbMetrics(
+                environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local'),
+                EmfSink(environ.get('MetricsNamespace', 'WidgetApi')))
+
+        # Opt-in profiling of a sample of the handler invocations (cProfile and,
+        # with HandlerProfileMemory, tracemalloc) to /tmp or s3://bucket/prefix;
+        # a 0 rate leaves the handlers unwrapped
+        self.profiler = None
+        profile_rate = float(environ.get('HandlerProfileRate', '0'))
+        if profile_rate > 0:
+            self.profiler = HandlerProfiler(
+                environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local'),
+                profile_rate,
+                open_sink(environ.get('HandlerProfileSink', '/tmp/profiles'),
+                          lambda: self.session.client("s3")),
+                environ.get('HandlerProfileMemory', 'false').lower() == 'true',
+                int(environ.get('HandlerProfileMemoryFrames', '1')))
+
+        # Client profile of the resource and the low-level client.  The pool
+        # covers the threads of parallel scans, shard gathers, batches and the
+        # prefetch thread (0 = derived from those settings); adaptive retries
+        # rate limit the client once DynamoDB throttles, and the attempts times
+        # the read timeout stay well inside the Lambda timeout
+        pool_size = int(environ.get('DynamoMaxPoolConnections', '0'))
+        if pool_size <= 0:
+            pool_size = max(10, self.scan_workers, self.scan_segments, self.batch_workers,
+                            self.color_shards) + 1
+        self.client_config = client_config(
+            pool_size,
+            float(environ.get('DynamoConnectTimeoutS', '1')),
+            float(environ.get('DynamoReadTimeoutS', '5')),
+            environ.get('DynamoTcpKeepAlive', 'true').lower() == 'true',
+            environ.get('DynamoRetryMode', 'adaptive'),
+            int(environ.get('DynamoMaxAttempts', '4')))
+
+        # Circuit breaker failing calls fast once DynamoDB keeps throttling
+        # after the client retries; 0 throttles disables it
+        self.breaker = None
+        if int(environ.get('DynamoBreakerThreshold', '0')) > 0:
+            self.breaker = CircuitBreaker(
+                int(environ['DynamoBreakerThreshold']),
+                float(environ.get('DynamoBreakerWindowS', '10')),
+                float(environ.get('DynamoBreakerCooldownS', '5')))
+
+        # Opt-in pre-warm: "true" always, "provisioned" only when the container
+        # is initialized for provisioned concurrency
+        prewarm = environ.get('EnvPrewarm', 'false').lower()
+        if prewarm == 'true' or (prewarm == 'provisioned' and
+                                 environ.get('AWS_LAMBDA_INITIALIZATION_TYPE', '') ==
+                                 'provisioned-concurrency'):
+            self.prewarm()
+
+    def _create_once(self, attribute: str, factory: Callable) -> Any:
+        """
+        Return a lazily created attribute, creating it once across threads
+        :param attribute: private attribute holding the object
+        :param factory: creates the object
+        :return: the object
+        """
+        value = getattr(self, attribute)
+        if value is None:
+            with self._lock:
+                value = getattr(self, attribute)
+                if value is None:
+                    value = factory()
+                    setattr(self, attribute, value)
+        return value
+
+    def guard(self, target: Any) -> Any:
+        """
+        :param target: service resource, Table resource or low-level client
+        :return: target behind the circuit breaker when it is on, else target itself
+        """
+        if self.breaker is None:
+            return target
+        return self.breaker.wrap(target)
+
+    def profiled(self, handler: Callable) -> Callable:
+        """
+        Decorator of lambda_handler
+        :param handler: lambda_handler(event, context)
+        :return: handler profiling sampled invocations when HandlerProfileRate
+                 is set, else handler itself
+        """
+        if self.profiler is None:
+            return handler
+        return self.profiler.wrap(handler)
+
+    def instrument(self, target: Any) -> Any:
+        """
+        :param target: Table resource or low-level client
+        :return: target behind the circuit breaker and recording its calls when
+                 DynamoMetrics is on, else target itself
+        """
+        target = self.guard(target)
+        if self.metrics is None:
+            return target
+        return self.metrics.wrap(target)
+
+    @property
+    def session(self) -> Any:
+        """
+        One boto3 session, so the resource and client share the botocore
+        session, its credentials and loaded service models
+        """
+        return self._create_once("_session", boto3.session.Session)
+
+    @property
+    def dynamodb(self) -> Any:
+        """
+        DynamoDB service resource, created on first use.  Guarded, so the batch
+        calls through its meta.client see the circuit breaker
+        """
+        return self._create_once("_dynamodb", lambda: self.guard(
+            self.session.resource('dynamodb', config=self.client_config)))
+
+    @dynamodb.setter
+    def dynamodb(self, value: Any):
+        self._dynamodb = value
+
+    @property
+    def client(self) -> Any:
+        """
+        Low-level DynamoDB client, created on first use.  Cheaper to build than
+        the resource and skips its attribute (de)serialization.
+        """
+        return self._create_once("_client", lambda: self.instrument(
+            self.session.client('dynamodb', config=self.client_config)))
+
+    @client.setter
+    def client(self, value: Any):
+        self._client = value
+
+    @property
+    def ddb_table(self) -> Any:
+        """
+        Widget Table resource, created on first use
+        """
+        return self._create_once("_ddb_table", lambda: self.instrument(
+            self.dynamodb.Table(self.ddb_name)))
+
+    @ddb_table.setter
+    def ddb_table(self, value: Any):
+        self._ddb_table = value
+
+    @property
+    def ngram_table(self) -> Any:
+        """
+        N-gram postings Table resource, None when the index is not configured
+        """
+        if len(self.ngram_name) == 0 and self._ngram_table is None:
+            return None
+        return self._create_once("_ngram_table", lambda: self.instrument(
+            self.dynamodb.Table(self.ngram_name)))
+
+    @ngram_table.setter
+    def ngram_table(self, value: Any):
+        self._ngram_table = value
+
+    @property
+    def color_view(self) -> Any:
+        """
+        Materialized color view, None when the view is not configured
+        """
+        if len(self.color_view_name) == 0 and self._color_view is None:
+            return None
+        return self._create_once("_color_view", lambda: ColorView(
+            self.instrument(self.dynamodb.Table(self.color_view_name)), self.color_view_chunks,
+            self.color_view_chunk_members))
+
+    @color_view.setter
+    def color_view(self, value: Any):
+        self._color_view = value
+
+    @property
+    def versions(self) -> Any:
+        """
+        Data version tracker, None when the meta table is not configured
+        """
+        if len(self.meta_name) == 0 and self._versions is None:
+            return None
+        return self._create_once("_versions", lambda: VersionTracker(
+            self.instrument(self.dynamodb.Table(self.meta_name))))
+
+    @versions.setter
+    def versions(self, value: Any):
+        self._versions = value
+
+    @property
+    def page_index(self) -> Any:
+        """
+        Page-boundary index sharing the meta table of the versions, None when
+        versions are not tracked or PageIndexTtlSeconds is 0
+        """
+        if self._page_index is None and (self.versions is None or self.page_index_ttl_s <= 0):
+            return None
+        return self._create_once("_page_index", lambda: PageIndex(
+            self.versions.table, self.page_index_ttl_s, self.page_index_max_pages))
+
+    @page_index.setter
+    def page_index(self, value: Any):
+        self._page_index = value
+
+    def prewarm(self):
+        """
+        Build the session, resource, client and tables and open a connection
+        ahead of the first invocation, e.g. during provisioned concurrency init.
+        The probe read is best effort, errors are only logged.
+        :return: Nothing
+        """
+        _ = self.ddb_table
+        _ = self.ngram_table
+        _ = self.color_view
+        _ = self.versions
+        try:
+            self.client.get_item(TableName=self.ddb_name,
+                                 Key={self.ddb_pk: {"S": "#prewarm"}})
+        except (BotoCoreError, ClientError) as probe_error:
+            logging.info("Pre-warm probe failed: %s", probe_error)
+
+    def color_shard(self, widget_name: str, color: str) -> str:
+        """
+        Sharded color index key of a widget, stable for a given shard count
+        :param widget_name: widget name
+        :param color: widget color
+        :return: "<color>#<shard>"
+        """
+        return "%s#%d" % (color, crc32(widget_name.encode("utf-8")) % self.color_shards)
+
+    def color_shard_keys(self, color: str) -> list:
+        """
+        :param color: widget color
+        :return: every sharded color index key of the color
+        """
+        return ["%s#%d" % (color, shard) for shard in range(self.color_shards)]
+
+    def name_bucket(self, widget_name: str) -> str:
+        """
+        Name index partition of a widget, stable for a given bucket count
+        :param widget_name: widget name
+        :return: "names#<bucket>"
+        """
+        return "names#%d" % (crc32(widget_name.encode("utf-8")) % self.name_buckets)
+
+    def name_bucket_keys(self) -> list:
+        """
+        :return: every name index partition
+        """
+        return ["names#%d" % bucket for bucket in range(self.name_buckets)]
+
     def widget_to_ddb(self, widget: dict) -> dict:
         """
         Converts a widget dictionary to a DynamoDB item
         :param widget: Widget
         :return: ddb item
         """
-        return {
+        ddb_item = {
             self.ddb_pk: widget["widgetName"],
             "color": widget["color"]
         }
+        if self.color_shards > 0:
+            ddb_item[self.ddb_idx_color_shard_pk] = self.color_shard(widget["widgetName"],
+                                                                     widget["color"])
+        if self.name_buckets > 0:
+            ddb_item[self.ddb_idx_name_bucket_pk] = self.name_bucket(widget["widgetName"])
+        return ddb_item
 
     def ddb_to_widget(self, ddb_item: dict) -> dict:
         """
@@ -47,3 +457,345 @@ class EnvParams:
             "widgetName": ddb_item[self.ddb_pk],
             "color": ddb_item["color"]
         }
+
+    def wire_mapper(self, attributes: tuple) -> Callable:
+        """
+        Mapping from a low-level client item {"attr": {"S": value}} to the output
+        shape in one pass, compiled once per projection
+        :param attributes: ((output name, ddb attribute name), ...) of string attributes
+        :return: item mapping function
+        """
+        mapper = self._mappers.get(attributes, None)
+        if mapper is None:
+            def mapper(item: dict, pairs: tuple = attributes) -> dict:
+                return {name: item[attribute]["S"] for name, attribute in pairs}
+            self._mappers[attributes] = mapper
+        return mapper
+
+    def widget_request(self, operation: str, **kwargs) -> tuple:
+        """
+        The call and the parameters of a widget table query or scan.  Takes the
+        Table resource style parameters (string expressions, plain values) and
+        targets the low-level client when DynamoFastPath is enabled.
+        :param operation: "query" or "scan"
+        :param kwargs: query/scan parameters, without TableName
+        :return: (bound call, request parameters)
+        """
+        if not self.fast_path:
+            return getattr(self.ddb_table, operation), dict(kwargs)
+
+        request = dict(kwargs, TableName=self.ddb_name)
+        for parameter in ("ExpressionAttributeValues", "ExclusiveStartKey"):
+            if parameter in request:
+                request[parameter] = {key: self._serializer.serialize(value)
+                                      for key, value in request[parameter].items()}
+        return getattr(self.client, operation), request
+
+    def widget_page(self, response: dict) -> dict:
+        """
+        Map one raw query or scan response of widget_request to widgets
+        :param response: Table resource or low-level client response
+        :return: {Widgets, LastEvaluatedKey (plain, absent on the last page),
+                  Count, ScannedCount, ConsumedCapacity}
+        """
+        last_key = response.get("LastEvaluatedKey", None)
+        if self.fast_path:
+            mapper = self.wire_mapper(self.widget_attributes)
+            widgets = [mapper(item) for item in response.get("Items", [])]
+            if last_key is not None:
+                last_key = {key: self._deserializer.deserialize(value)
+                            for key, value in last_key.items()}
+        else:
+            widgets = [self.ddb_to_widget(item) for item in response.get("Items", [])]
+
+        page = {
+            "Widgets": widgets,
+            "Count": response.get("Count", len(widgets)),
+            "ScannedCount": response.get("ScannedCount", len(widgets)),
+            "ConsumedCapacity": response.get("ConsumedCapacity", {})
+        }
+        if last_key is not None:
+            page["LastEvaluatedKey"] = last_key
+        return page
+
+    def read_widgets(self, operation: str, **kwargs) -> dict:
+        """
+        One query or scan page of the widget table, mapped to widgets
+        :param operation: "query" or "scan"
+        :param kwargs: query/scan parameters, without TableName
+        :return: page, see widget_page
+        """
+        call, request = self.widget_request(operation, **kwargs)
+        return self.widget_page(call(**request))
+
+    def paginate_widgets(self, operation: str, depth: int = None, budget: Any = None,
+                         **kwargs) -> Iterator[dict]:
+        """
+        All query or scan pages of the widget table, mapped to widgets.  The
+        request for the next page is issued by a background thread as soon as
+        LastEvaluatedKey arrives, while the caller maps and consumes the current
+        one.  At most depth raw pages are read ahead, stopping the iteration
+        early wastes at most depth + 1 page reads.  With a budget, every page is
+        charged to it as it is handed to the caller, and nothing is read ahead
+        once the budget including the pages not handed over yet is spent: the
+        pages then end on one that still has a LastEvaluatedKey.
+        :param operation: "query" or "scan"
+        :param depth: look-ahead pages, default DynamoPrefetchDepth, 0 reads serially
+        :param budget: optional ReadBudget of the caller, the caller does not charge it
+        :param kwargs: query/scan parameters, without TableName
+        :return: pages, see widget_page
+        """
+        depth = self.prefetch_depth if depth is None else depth
+        call, request = self.widget_request(operation, **kwargs)
+        if depth <= 0:
+            while True:
+                response = call(**request)
+                if budget is not None:
+                    budget.charge(response)
+                yield self.widget_page(response)
+                if response.get("LastEvaluatedKey", None) is None:
+                    return
+                # The raw key is already in the format of the call
+                request["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        pages = PrefetchQueue(depth, budget)
+        fetcher = Thread(target=pages.produce, args=(call, request), daemon=True)
+        fetcher.start()
+        try:
+            for response in pages:
+                yield self.widget_page(response)
+        finally:
+            pages.stop()
+
+    def widget_ngrams(self, text: str) -> set:
+        """
+        Distinct n-grams of a widget name or filter string
+        :param text: widget name or filter
+        :return: set of n-grams, empty when text is shorter than ngram_size
+        """
+        return {text[idx:idx + self.ngram_size]
+                for idx in range(len(text) - self.ngram_size + 1)}
+
+    def backoff(self, attempt: int):
+        """
+        Sleep before retrying unprocessed batch items: exponential backoff with
+        full jitter, capped by DynamoBatchBackoffCapMs
+        :param attempt: retry number, starting at 0
+        :return: Nothing
+        """
+        ceiling_ms = min(self.batch_backoff_cap_ms, self.batch_backoff_ms * 2 ** attempt)
+        sleep(uniform(0, ceiling_ms) / 1000)  # nosec - jitter, not cryptography
+
+    def batch_get(self, table: Any, keys: list, projection: str = None) -> list:
+        """
+        Fetch items by key with BatchGetItem, 100 keys per call, retrying
+        UnprocessedKeys.  Missing items are left out, order is not preserved.
+        :param table: boto3 Table resource
+        :param keys: list of key dictionaries
+        :param projection: optional ProjectionExpression
+        :return: items found
+        """
+        items = []
+        for start in range(0, len(keys), 100):
+            request = {"Keys": keys[start:start + 100]}
+            if projection is not None:
+                request["ProjectionExpression"] = projection
+            items.extend(self.batch_get_chunk(table, request))
+        return items
+
+    def batch_get_chunk(self, table: Any, request: dict) -> list:
+        """
+        One BatchGetItem request of up to 100 keys, retrying UnprocessedKeys.
+        Uses the thread safe low-level client, so chunks can run concurrently.
+        :param table: boto3 Table resource
+        :param request: {Keys, ProjectionExpression} for the table
+        :return: items found
+        """
+        items = []
+        request_items = {table.name: request}
+        for attempt in range(self.batch_max_retries + 1):
+            if attempt > 0:
+                self.backoff(attempt - 1)
+            response = self.dynamodb.meta.client.batch_get_item(RequestItems=request_items)
+            items.extend(response.get("Responses", {}).get(table.name, []))
+            request_items = response.get("UnprocessedKeys", {})
+            if len(request_items) == 0:
+                return items
+
+        raise Exception("error: BatchGetItem keys still unprocessed after retries")
+
+    def batch_write_chunk(self, table: Any, items: list) -> list:
+        """
+        One BatchWriteItem request of up to 25 puts, retrying UnprocessedItems.
+        Uses the thread safe low-level client, so chunks can run concurrently.
+        :param table: boto3 Table resource
+        :param items: ddb items to put
+        :return: items still unprocessed after the last retry
+        """
+        request_items = {table.name: [{"PutRequest": {"Item": item}} for item in items]}
+        for attempt in range(self.batch_max_retries + 1):
+            if attempt > 0:
+                self.backoff(attempt - 1)
+            response = self.dynamodb.meta.client.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems", {})
+            if len(request_items) == 0:
+                return []
+
+        return [request["PutRequest"]["Item"] for request in request_items[table.name]]
+
+
+class ReadBudget:
+    """
+    Caps the DynamoDB reads of one request by elapsed time and consumed
+    read capacity, and counts what was read
+    """
+
+    def __init__(self, time_budget_ms: int, max_capacity: float = 0, context: Any = None):
+        """
+        Init
+        :param time_budget_ms: time allowed for reads
+        :param max_capacity: read capacity units allowed, 0 for no cap
+        :param context: lambda context, the budget never exceeds its remaining time
+        """
+        if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+            # Leave a second for serializing the response
+            time_budget_ms = min(time_budget_ms, context.get_remaining_time_in_millis() - 1000)
+
+        self.deadline = monotonic() + time_budget_ms / 1000
+        self.max_capacity = max_capacity
+        self.capacity = 0.0
+        self.pages = 0
+        self.scanned = 0
+
+    def charge(self, response: dict):
+        """
+        Account for one query/scan response
+        :param response: DynamoDB response, with ReturnConsumedCapacity=TOTAL
+        :return: Nothing
+        """
+        self.pages += 1
+        self.scanned += response.get("ScannedCount", len(response.get("Items", [])))
+        self.capacity += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+
+    def exhausted(self, pending: float = 0) -> bool:
+        """
+        :param pending: capacity read but not charged yet
+        :return: True once the time or capacity budget is spent
+        """
+        if 0 < self.max_capacity <= self.capacity + pending:
+            return True
+        return monotonic() >= self.deadline
+
+
+class PrefetchQueue:
+    """
+    Bounded hand-off of raw query/scan responses from the fetching thread of
+    EnvParams.paginate_widgets to the consuming thread.  Errors of the fetching
+    thread are re-raised in the consumer.
+    """
+
+    _DONE = object()
+
+    def __init__(self, depth: int, budget: Any = None):
+        """
+        Init
+        :param depth: responses fetched but not consumed yet
+        :param budget: optional ReadBudget, charged as the responses are consumed
+        """
+        self._queue = Queue(maxsize=depth)
+        self._stopped = Event()
+        self._budget = budget
+        # Capacity of the responses read but not charged yet, each response is
+        # in exactly one of _ahead and the budget
+        self._ahead = 0.0
+        self._ahead_lock = Lock()
+
+    def produce(self, call: Callable, request: dict):
+        """
+        Fetching thread: request page after page until the last one, stop() or
+        the budget is spent
+        :param call: Table resource or client query/scan
+        :param request: parameters of the first page, updated in place
+        :return: Nothing
+        """
+        try:
+            while not self._stopped.is_set():
+                response = call(**request)
+                with self._ahead_lock:
+                    self._ahead += self._capacity(response)
+                if not self._offer(response):
+                    return
+                if response.get("LastEvaluatedKey", None) is None:
+                    break
+                # No read ahead past the budget, the consumer would stop there
+                if self._spent():
+                    break
+                request["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except Exception as error:  # pylint: disable=broad-except
+            # Handed over, the consumer raises it
+            self._offer(error)
+            return
+        self._offer(self._DONE)
+
+    def _offer(self, item: Any) -> bool:
+        """
+        Wait for room in the queue unless the consumer is gone
+        :param item: response, error or end marker
+        :return: False if stopped
+        """
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.05)
+                return True
+            except Full:
+                continue
+        return False
+
+    @staticmethod
+    def _capacity(response: dict) -> float:
+        """
+        :param response: raw query/scan response
+        :return: read capacity it consumed
+        """
+        return response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+
+    def _spent(self) -> bool:
+        """
+        :return: True once the budget including the responses read ahead is spent
+        """
+        if self._budget is None:
+            return False
+        with self._ahead_lock:
+            return self._budget.exhausted(self._ahead)
+
+    def _charge(self, response: dict):
+        """
+        Move a response handed to the consumer from _ahead to the budget
+        :param response: raw query/scan response
+        :return: Nothing
+        """
+        if self._budget is None:
+            return
+        with self._ahead_lock:
+            self._ahead -= self._capacity(response)
+            self._budget.charge(response)
+
+    def __iter__(self) -> Iterator[dict]:
+        """
+        :return: the raw responses in page order
+        """
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            self._charge(item)
+            yield item
+
+    def stop(self):
+        """
+        Consumer is done, let the fetching thread exit
+        :return: Nothing
+        """
+        self._stopped.set()
@@ -0,0 +1,65 @@
+"""
+    Helper lambda layer for proxies of DynamoDB tables and clients, shared by
+    the call metrics (lambdaMetrics) and the circuit breaker (lambdaClientProfile)
+"""
+from typing import Any
+
+# DynamoDB calls the proxies intercept, split by the capacity they use
+READ_OPERATIONS = {"get_item", "query", "scan", "batch_get_item", "transact_get_items"}
+WRITE_OPERATIONS = {"put_item", "update_item", "delete_item", "batch_write_item",
+                    "transact_write_items"}
+DDB_OPERATIONS = READ_OPERATIONS | WRITE_OPERATIONS
+
+
+class DdbProxy:
+    """
+    Proxy of a Table resource or low-level client passing every DynamoDB call
+    through the before and after hooks of an observer:
+        before(target, operation, kwargs) -> token, may update kwargs or raise
+        after(target, operation, kwargs, token, response, error), response is
+        None when the call raised error, error None otherwise
+    after runs whatever the call raises, the error is re-raised.  meta.client
+    of a Table is proxied as well, the batch calls, the color view and the
+    version tracker use it.
+    """
+
+    def __init__(self, target: Any, observer: Any):
+        """
+        Init
+        :param target: Table resource or low-level client
+        :param observer: object with the before and after hooks
+        """
+        self._target = target
+        self._observer = observer
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._target, name)
+        if name == "meta" and hasattr(attribute, "client"):
+            return _ProxyMeta(attribute, self._observer)
+        if name not in DDB_OPERATIONS:
+            return attribute
+
+        def proxied(**kwargs) -> Any:
+            token = self._observer.before(self._target, name, kwargs)
+            try:
+                response = attribute(**kwargs)
+            except BaseException as error:
+                self._observer.after(self._target, name, kwargs, token, None, error)
+                raise
+            self._observer.after(self._target, name, kwargs, token, response, None)
+            return response
+
+        return proxied
+
+
+class _ProxyMeta:
+    """
+    Table.meta with its client proxied
+    """
+
+    def __init__(self, meta: Any, observer: Any):
+        self._meta = meta
+        self.client = observer.wrap(meta.client)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._meta, name)
@@ -0,0 +1,182 @@
+"""
+    Helper lambda layer for DynamoDB call metrics
+"""
+from sys import stdout
+from time import perf_counter, time
+from typing import Any, Callable, TextIO
+import json
+from lambdaDdbProxy import WRITE_OPERATIONS, DdbProxy
+
+DIMENSIONS = ["Handler", "Operation", "Index", "Filtered"]
+METRICS = [("Latency", "Milliseconds"), ("Pages", "Count"), ("ScannedCount", "Count"),
+           ("ReturnedCount", "Count"), ("ReadCapacityUnits", "Count"),
+           ("WriteCapacityUnits", "Count"), ("Errors", "Count")]
+
+
+class EmfSink:
+    """
+    Writes metric records as CloudWatch embedded metric format lines, one JSON
+    object per line on stdout; the Lambda log group turns them into metrics
+    """
+
+    def __init__(self, namespace: str, stream: TextIO = None):
+        """
+        Init
+        :param namespace: CloudWatch metric namespace
+        :param stream: output, default stdout
+        """
+        self.namespace = namespace
+        self.stream = stream
+
+    def __call__(self, record: dict):
+        """
+        Write one record
+        :param record: dimensions, metric values and properties of one call
+        :return: Nothing
+        """
+        line = dict(record, _aws={
+            "Timestamp": int(time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": self.namespace,
+                "Dimensions": [DIMENSIONS],
+                "Metrics": [{"Name": name, "Unit": unit} for name, unit in METRICS]
+            }]
+        })
+        # One write per line, lines of concurrent threads do not interleave
+        (self.stream or stdout).write(json.dumps(line, separators=(",", ":")) + "\n")
+
+
+class MemorySink:
+    """
+    Keeps metric records in a list, for tests and local runs
+    """
+
+    def __init__(self):
+        """
+        Init
+        """
+        self.records = []
+
+    def __call__(self, record: dict):
+        """
+        Keep one record
+        :param record: dimensions, metric values and properties of one call
+        :return: Nothing
+        """
+        self.records.append(record)
+
+
+def capacity_units(consumed: Any, operation: str) -> tuple:
+    """
+    Read and write capacity of a ConsumedCapacity element or list (batch calls)
+    :param consumed: ConsumedCapacity of a response, may be missing
+    :param operation: call name
+    :return: (read units, write units)
+    """
+    if not consumed:
+        return 0.0, 0.0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    read = write = 0.0
+    for element in consumed:
+        units = float(element.get("CapacityUnits", 0))
+        if "ReadCapacityUnits" in element or "WriteCapacityUnits" in element:
+            read += float(element.get("ReadCapacityUnits", 0))
+            write += float(element.get("WriteCapacityUnits", 0))
+        elif operation in WRITE_OPERATIONS:
+            write += units
+        else:
+            read += units
+    return read, write
+
+
+class DdbMetrics:
+    """
+    Per-call metrics of DynamoDB tables and clients: latency, pages, items
+    scanned and returned, capacity consumed and errors, recorded by the proxies
+    of wrap() with Handler, Operation, Index and Filtered dimensions.  Tables and
+    clients that are not wrapped cost nothing; batch_writer() of a wrapped table
+    goes around the proxy.
+    """
+
+    def __init__(self, handler: str, sink: Callable):
+        """
+        Init
+        :param handler: Handler dimension, e.g. the Lambda function name
+        :param sink: callable receiving each record, EmfSink or MemorySink
+        """
+        self.handler = handler
+        self.sink = sink
+
+    def wrap(self, target: Any) -> Any:
+        """
+        :param target: Table resource or low-level client
+        :return: instrumented proxy of the target
+        """
+        return DdbProxy(target, self)
+
+    def before(self, target: Any, operation: str, kwargs: dict) -> float:
+        """
+        DdbProxy hook: ask for ReturnConsumedCapacity TOTAL unless the caller set it
+        :param target: Table resource or low-level client
+        :param operation: call name
+        :param kwargs: call parameters, updated
+        :return: start time
+        """
+        if "ReturnConsumedCapacity" not in kwargs:
+            kwargs["ReturnConsumedCapacity"] = "TOTAL"
+        return perf_counter()
+
+    def after(self, target: Any, operation: str, kwargs: dict, start: float, response: Any,
+              error: BaseException):
+        """
+        DdbProxy hook: record the call
+        :param target: Table resource or low-level client
+        :param operation: call name
+        :param kwargs: call parameters
+        :param start: time returned by before
+        :param response: call response, None if the call raised
+        :param error: raised error, None on success
+        :return: Nothing
+        """
+        if error is not None and not isinstance(error, Exception):
+            return
+        self.record(operation, kwargs, response, (perf_counter() - start) * 1000,
+                    getattr(target, "name", ""))
+
+    def record(self, operation: str, request: dict, response: Any, latency_ms: float,
+               table: str):
+        """
+        Send the record of one call to the sink
+        :param operation: call name
+        :param request: call parameters
+        :param response: call response, None if the call raised
+        :param latency_ms: wall time of the call
+        :param table: table name, "" for client calls without TableName
+        :return: Nothing
+        """
+        failed = response is None
+        response = response or {}
+        if "Items" in response:
+            returned = len(response["Items"])
+        elif "Responses" in response:
+            returned = sum(len(items) for items in response["Responses"].values()) \
+                if isinstance(response["Responses"], dict) else len(response["Responses"])
+        else:
+            returned = 1 if "Item" in response else 0
+        read, write = capacity_units(response.get("ConsumedCapacity", None), operation)
+
+        self.sink({
+            "Handler": self.handler,
+            "Operation": operation,
+            "Index": request.get("IndexName", "table"),
+            "Filtered": "true" if "FilterExpression" in request else "false",
+            "Table": request.get("TableName", table) or ",".join(request.get("RequestItems", ())),
+            "Latency": round(latency_ms, 3),
+            "Pages": 1 if operation in {"query", "scan"} else 0,
+            "ScannedCount": response.get("ScannedCount", returned),
+            "ReturnedCount": response.get("Count", returned),
+            "ReadCapacityUnits": read,
+            "WriteCapacityUnits": write,
+            "Errors": 1 if failed else 0
+        })
@@ -0,0 +1,80 @@
+"""
+    Helper lambda layer for the page-boundary index of paged reports
+"""
+from hashlib import sha256
+from time import time
+from typing import Any, Callable
+import json
+from botocore.exceptions import ClientError
+
+
+class PageIndex:
+    """
+    Start cursors of the pages of a paged report, one meta table item per
+    report shape (limit, filter, read mode) and data version:
+        {metaKey: "pages#<digest>", starts: [cursor of page 2, page 3, ...], expiresAt}
+    Cursors are recorded as pages are served, so page n is one lookup and one
+    page read once a client went that far.  A write bumps the data version,
+    later requests use a new item and the old one is left to the TTL on
+    expiresAt.  Pages of unchanged data keep their cursors, an expired item
+    that was not deleted yet is still valid.
+    """
+
+    def __init__(self, table: Any, ttl_s: int, max_pages: int, clock: Callable = time):
+        """
+        Init
+        :param table: meta Table resource
+        :param ttl_s: lifetime of an item after its last update
+        :param max_pages: pages indexed per item, deeper pages are walked
+        :param clock: epoch time source, for tests
+        """
+        self.table = table
+        self.ttl_s = ttl_s
+        self.max_pages = max_pages
+        self.clock = clock
+
+    @staticmethod
+    def key(version: int, *params: Any) -> str:
+        """
+        :param version: data version of the report
+        :param params: request parameters and settings that shape the pages
+        :return: metaKey of the page index item
+        """
+        payload = json.dumps([version, list(params)], separators=(",", ":"))
+        return "pages#" + sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def starts(self, key: str) -> list:
+        """
+        :param key: metaKey from key()
+        :return: start cursors of page 2, 3, ... known so far
+        """
+        item = self.table.get_item(Key={"metaKey": key}).get("Item", {})
+        return list(item.get("starts", []))
+
+    def record(self, key: str, known: int, cursor: str) -> bool:
+        """
+        Append the start cursor of the page after the last known one.  Conditional
+        on the item still holding known cursors, so concurrent requests cannot
+        leave gaps or duplicates; the loser's cursor is the same one anyway.
+        :param key: metaKey from key()
+        :param known: cursors read with starts()
+        :param cursor: start cursor of page known + 2
+        :return: True if recorded
+        """
+        if known + 1 >= self.max_pages:
+            return False
+        try:
+            self.table.update_item(
+                Key={"metaKey": key},
+                UpdateExpression="SET #s = list_append(if_not_exists(#s, :empty), :c), "
+                                 "#e = :e",
+                ConditionExpression="attribute_not_exists(#s) OR size(#s) = :n",
+                ExpressionAttributeNames={"#s": "starts", "#e": "expiresAt"},
+                ExpressionAttributeValues={":empty": [], ":c": [cursor], ":n": known,
+                                           ":e": int(self.clock()) + self.ttl_s})
+        except ClientError as client_error:
+            if client_error.response.get("Error", {}).get("Code") != \
+                    "ConditionalCheckFailedException":
+                raise
+            return False
+        return True
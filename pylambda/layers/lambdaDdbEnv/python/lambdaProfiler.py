@@ -0,0 +1,207 @@
+"""
+    Helper lambda layer for profiling selected handler invocations
+"""
+from cProfile import Profile
+from functools import wraps
+from os import makedirs, replace
+from os.path import dirname, join
+from pstats import Stats
+from random import random
+from tempfile import NamedTemporaryFile
+from time import perf_counter, process_time, time
+from typing import Any, Callable
+from uuid import uuid4
+import json
+import logging
+import tracemalloc
+
+
+class DirectorySink:
+    """
+    Profiles under a local directory, /tmp in Lambda
+    """
+
+    def __init__(self, root: str):
+        """
+        Init
+        :param root: destination directory
+        """
+        self.root = root
+
+    def write(self, name: str, data: bytes):
+        """
+        :param name: relative file name
+        :param data: content
+        :return: Nothing
+        """
+        file_name = join(self.root, name)
+        makedirs(dirname(file_name), exist_ok=True)
+        with open(file_name + ".tmp", "wb") as output:
+            output.write(data)
+        replace(file_name + ".tmp", file_name)
+
+
+class S3Sink:
+    """
+    Profiles under an S3 prefix, the client is created on the first write
+    """
+
+    def __init__(self, bucket: str, prefix: str, client_factory: Callable):
+        """
+        Init
+        :param bucket: bucket name
+        :param prefix: key prefix, without trailing slash
+        :param client_factory: returns an S3 client
+        """
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client_factory = client_factory
+        self._client = None
+
+    def write(self, name: str, data: bytes):
+        """
+        :param name: relative file name
+        :param data: content
+        :return: Nothing
+        """
+        if self._client is None:
+            self._client = self.client_factory()
+        key = "%s/%s" % (self.prefix, name) if len(self.prefix) > 0 else name
+        self._client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+
+def open_sink(destination: str, client_factory: Callable) -> Any:
+    """
+    :param destination: directory or s3://bucket/prefix
+    :param client_factory: returns an S3 client
+    :return: DirectorySink or S3Sink
+    """
+    if destination.startswith("s3://"):
+        bucket, _, prefix = destination[len("s3://"):].partition("/")
+        return S3Sink(bucket, prefix, client_factory)
+    return DirectorySink(destination)
+
+
+class HandlerProfiler:
+    """
+    Profiles a sample of the invocations of a lambda_handler: cProfile stats
+    and, optionally, a tracemalloc snapshot, written to the sink as
+        <function>/<request id>.pstats      pstats.Stats dump
+        <function>/<request id>.json        duration, cold start, memory hot spots
+    Invocations that are not sampled only pay one random() call; with no
+    profiler the handler is not wrapped at all, see EnvParams.profiled().
+    Writing a profile never fails the invocation.
+    """
+
+    def __init__(self, function: str, rate: float, sink: Any, memory: bool = False,
+                 memory_frames: int = 1, memory_top: int = 25, sample: Callable = random):
+        """
+        Init
+        :param function: function name, directory of its profiles
+        :param rate: share of the invocations profiled, 1 profiles every one
+        :param sink: DirectorySink or S3Sink
+        :param memory: also trace allocations, slows the profiled invocation down
+        :param memory_frames: frames kept per traced allocation
+        :param memory_top: allocation sites kept in the summary
+        :param sample: returns a number in [0, 1), for tests
+        """
+        self.function = function
+        self.rate = rate
+        self.sink = sink
+        self.memory = memory
+        self.memory_frames = memory_frames
+        self.memory_top = memory_top
+        self.sample = sample
+        self.cold = True
+
+    def wrap(self, handler: Callable) -> Callable:
+        """
+        :param handler: lambda_handler(event, context)
+        :return: handler profiling the sampled invocations
+        """
+        @wraps(handler)
+        def profiled(event: Any, context: Any) -> Any:
+            cold = self.cold
+            self.cold = False
+            if self.sample() >= self.rate:
+                return handler(event, context)
+            return self.run(handler, event, context, cold)
+
+        return profiled
+
+    def run(self, handler: Callable, event: Any, context: Any, cold: bool) -> Any:
+        """
+        One profiled invocation
+        :param handler: lambda_handler
+        :param event: lambda event
+        :param context: lambda context, may be None locally
+        :param cold: first invocation of the container
+        :return: result of the handler
+        """
+        request_id = getattr(context, "aws_request_id", None) or str(uuid4())
+        # CPU time of the process before the first invocation: imports and module init
+        init_cpu_ms = process_time() * 1000 if cold else None
+        if self.memory:
+            tracemalloc.start(self.memory_frames)
+        profile = Profile()
+        start = perf_counter()
+        error = None
+        profile.enable()
+        try:
+            return handler(event, context)
+        except Exception as handler_error:
+            error = type(handler_error).__name__
+            raise
+        finally:
+            profile.disable()
+            duration_ms = (perf_counter() - start) * 1000
+            snapshot = None
+            if self.memory:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            summary = {
+                "requestId": request_id,
+                "function": self.function,
+                "timestamp": int(time() * 1000),
+                "durationMs": round(duration_ms, 3),
+                "coldStart": cold,
+                "initCpuMs": None if init_cpu_ms is None else round(init_cpu_ms, 3),
+                "error": error
+            }
+            if snapshot is not None:
+                summary["memoryPeakBytes"] = peak
+                summary["memoryTop"] = memory_top(snapshot, self.memory_top)
+            self.save(request_id, profile, summary)
+
+    def save(self, request_id: str, profile: Profile, summary: dict):
+        """
+        Write the stats and the summary of one invocation
+        :param request_id: Lambda request id
+        :param profile: disabled profile
+        :param summary: invocation summary
+        :return: Nothing
+        """
+        try:
+            with NamedTemporaryFile(suffix=".pstats") as stats_file:
+                Stats(profile).dump_stats(stats_file.name)
+                stats_file.seek(0)
+                data = stats_file.read()
+            self.sink.write("%s/%s.pstats" % (self.function, request_id), data)
+            self.sink.write("%s/%s.json" % (self.function, request_id),
+                            json.dumps(summary, separators=(",", ":")).encode("utf-8"))
+        except Exception as sink_error:  # pylint: disable=broad-except
+            logging.warning("Profile of %s not written: %s", request_id, sink_error)
+
+
+def memory_top(snapshot: tracemalloc.Snapshot, top: int) -> list:
+    """
+    :param snapshot: tracemalloc snapshot
+    :param top: allocation sites kept
+    :return: [{site: "file:line", bytes, count}] of the largest sites still allocated
+    """
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__)])
+    return [{"site": "%s:%d" % (stat.traceback[0].filename, stat.traceback[0].lineno),
+             "bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:top]]
@@ -0,0 +1,312 @@
+"""
+    Helper lambda layer for reports too large to return inline: the widgets
+    are streamed to a gzip-compressed NDJSON object and the response carries
+    a time-limited download link instead
+"""
+from gzip import GzipFile
+from os import makedirs, remove, replace
+from os.path import abspath, dirname, exists, join
+from time import time
+from typing import Any, Callable, Iterator
+from urllib.parse import quote
+from uuid import uuid4
+import json
+
+CONTENT_TYPE = "application/x-ndjson"
+CONTENT_ENCODING = "gzip"
+
+
+class LocalSpillUpload:
+    """
+    Object being written to a LocalSpillStore
+    """
+
+    def __init__(self, file_name: str):
+        """
+        Init
+        :param file_name: destination file
+        """
+        self.file_name = file_name
+        makedirs(dirname(file_name), exist_ok=True)
+        self._output = open(file_name + ".tmp", "wb")  # pylint: disable=consider-using-with
+        self.bytes = 0
+        self.aborted = False
+
+    def write(self, data: bytes) -> int:
+        """
+        File interface for GzipFile
+        :param data: compressed bytes
+        :return: bytes written
+        """
+        if self.aborted:
+            return len(data)
+        self._output.write(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def flush(self):
+        """
+        File interface for GzipFile
+        """
+
+    def complete(self):
+        """
+        Move the finished file in place
+        :return: Nothing
+        """
+        self._output.close()
+        replace(self.file_name + ".tmp", self.file_name)
+
+    def abort(self):
+        """
+        Drop the file, later writes (the GzipFile trailer) are ignored
+        :return: Nothing
+        """
+        self.aborted = True
+        self._output.close()
+        if exists(self.file_name + ".tmp"):
+            remove(self.file_name + ".tmp")
+
+
+class LocalSpillStore:
+    """
+    Spilled reports in a local directory, stand-in of the S3 store for tests
+    and local runs; links are file:// URLs that do not expire
+    """
+
+    def __init__(self, root: str):
+        """
+        Init
+        :param root: destination directory
+        """
+        self.root = root
+
+    def open(self, key: str) -> LocalSpillUpload:
+        """
+        :param key: object key
+        :return: upload to write the object with
+        """
+        return LocalSpillUpload(join(self.root, key))
+
+    def url(self, key: str, expires_s: int) -> str:
+        """
+        :param key: object key
+        :param expires_s: ignored
+        :return: file:// link of the object
+        """
+        return "file://" + abspath(join(self.root, key))
+
+
+class S3SpillUpload:
+    """
+    Object being written to S3 as a multipart upload, so memory holds one
+    part at most; an object smaller than one part is a single PutObject
+    """
+
+    def __init__(self, client: Any, bucket: str, key: str, part_size: int):
+        """
+        Init
+        :param client: S3 client
+        :param bucket: bucket name
+        :param key: object key
+        :param part_size: bytes per uploaded part, S3 needs 5 MiB at least
+        """
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self.aborted = False
+
+    def write(self, data: bytes) -> int:
+        """
+        File interface for GzipFile, uploads a part once part_size is buffered
+        :param data: compressed bytes
+        :return: bytes written
+        """
+        if self.aborted:
+            return len(data)
+        self._buffer.extend(data)
+        self.bytes += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def flush(self):
+        """
+        File interface for GzipFile, parts are uploaded by write and complete
+        """
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=CONTENT_TYPE,
+                ContentEncoding=CONTENT_ENCODING)["UploadId"]
+        number = len(self._parts) + 1
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key,
+                                           UploadId=self._upload_id, PartNumber=number,
+                                           Body=bytes(self._buffer))
+        self._parts.append({"PartNumber": number, "ETag": response["ETag"]})
+        self._buffer = bytearray()
+
+    def complete(self):
+        """
+        Upload what is left and finish the object
+        :return: Nothing
+        """
+        if self._upload_id is None:
+            self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer),
+                                   ContentType=CONTENT_TYPE, ContentEncoding=CONTENT_ENCODING)
+            return
+        if len(self._buffer) > 0:
+            self._upload_part()
+        self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                              UploadId=self._upload_id,
+                                              MultipartUpload={"Parts": self._parts})
+
+    def abort(self):
+        """
+        Drop the uploaded parts, later writes (the GzipFile trailer) are ignored
+        :return: Nothing
+        """
+        self.aborted = True
+        if self._upload_id is not None:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                               UploadId=self._upload_id)
+
+
+class S3SpillStore:
+    """
+    Spilled reports under an S3 prefix, links are presigned GetObject URLs.
+    The bucket's lifecycle rule removes the objects.
+    """
+
+    def __init__(self, bucket: str, prefix: str, client_factory: Callable,
+                 part_size: int = 8 * 1024 * 1024):
+        """
+        Init
+        :param bucket: bucket name
+        :param prefix: key prefix, without trailing slash
+        :param client_factory: returns an S3 client, called on first use
+        :param part_size: bytes per multipart upload part
+        """
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client_factory = client_factory
+        self.part_size = part_size
+        self._client = None
+
+    @property
+    def client(self) -> Any:
+        """
+        S3 client, created on first use
+        """
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    def _key(self, key: str) -> str:
+        return "%s/%s" % (self.prefix, key) if len(self.prefix) > 0 else key
+
+    def open(self, key: str) -> S3SpillUpload:
+        """
+        :param key: object key under the prefix
+        :return: upload to write the object with
+        """
+        return S3SpillUpload(self.client, self.bucket, self._key(key), self.part_size)
+
+    def url(self, key: str, expires_s: int) -> str:
+        """
+        :param key: object key under the prefix
+        :param expires_s: lifetime of the link
+        :return: presigned GET link
+        """
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=expires_s)
+
+
+def open_spill_store(destination: str, client_factory: Callable, part_size: int) -> Any:
+    """
+    :param destination: directory or s3://bucket/prefix
+    :param client_factory: returns an S3 client
+    :param part_size: bytes per multipart upload part
+    :return: LocalSpillStore or S3SpillStore
+    """
+    if destination.startswith("s3://"):
+        bucket, _, prefix = destination[len("s3://"):].partition("/")
+        return S3SpillStore(bucket, prefix, client_factory, part_size)
+    return LocalSpillStore(destination)
+
+
+def spill_key(report: str, *params: str) -> str:
+    """
+    :param report: report name, e.g. "color"
+    :param params: report parameters, e.g. the color
+    :return: new object key, report/param/.../<random>.ndjson.gz
+    """
+    return "/".join([report] + [quote(param, safe="") for param in params] +
+                    [uuid4().hex + ".ndjson.gz"])
+
+
+def collect_report(chunks: Iterator[list], store: Any, max_inline_bytes: int,
+                   key: str) -> Any:
+    """
+    Collect a report, spilling it once its JSON passes max_inline_bytes: the
+    widgets read so far and every later chunk are streamed to the store, one
+    widget per line, and only the count stays in memory
+    :param chunks: lists of widgets, e.g. one per query page
+    :param store: LocalSpillStore or S3SpillStore, None never spills
+    :param max_inline_bytes: largest inline report, as serialized by Lambda
+    :param key: object key used when the report spills
+    :return: widget list, or {key, count, bytes} of the spilled object
+    """
+    widgets = []
+    size = 0
+    upload = None
+    output = None
+    count = 0
+    try:
+        for chunk in chunks:
+            if output is None:
+                widgets.extend(chunk)
+                # Lambda serializes with the default separators, ", " between widgets
+                size += len(json.dumps(chunk)) if len(chunk) > 0 else 0
+                if store is None or size <= max_inline_bytes:
+                    continue
+                upload = store.open(key)
+                output = GzipFile(fileobj=upload, mode="wb", mtime=0)
+                chunk = widgets
+                widgets = []
+            output.write("".join(json.dumps(widget, separators=(",", ":")) + "\n"
+                                 for widget in chunk).encode("utf-8"))
+            count += len(chunk)
+        if output is None:
+            return widgets
+        output.close()
+        upload.complete()
+    except BaseException:
+        if upload is not None:
+            upload.abort()
+        raise
+    return {"key": key, "count": count, "bytes": upload.bytes}
+
+
+def download_reference(store: Any, spill: dict, expires_s: int) -> dict:
+    """
+    :param store: store holding the spilled object
+    :param spill: result of collect_report
+    :param expires_s: lifetime of the link
+    :return: {url, expiresAt, count, bytes, contentType, contentEncoding}
+    """
+    return {
+        "url": store.url(spill["key"], expires_s),
+        "expiresAt": int(time()) + expires_s,
+        "count": spill["count"],
+        "bytes": spill["bytes"],
+        "contentType": CONTENT_TYPE,
+        "contentEncoding": CONTENT_ENCODING
+    }
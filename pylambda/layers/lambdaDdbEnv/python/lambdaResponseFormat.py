@@ -0,0 +1,73 @@
+"""
+    Helper lambda layer for the columnar report format
+"""
+from typing import Any
+
+COLUMNAR_TYPE = "application/vnd.widgets.columnar+json"
+
+
+def wants_columnar(accept: str) -> bool:
+    """
+    Accept header negotiation, the plain JSON list stays the default
+    :param accept: request Accept header, may be empty
+    :return: True if the client lists the columnar type without q=0
+    """
+    for media_range in accept.split(","):
+        parts = [part.strip() for part in media_range.split(";")]
+        if parts[0].lower() != COLUMNAR_TYPE:
+            continue
+        for param in parts[1:]:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def to_columnar(widgets: list) -> dict:
+    """
+    Column arrays of a widget list, colors dictionary-encoded:
+        {"columns": {"widgetName": ["a", "b", "c"], "color": [0, 1, 0]},
+         "dictionary": {"color": ["blue", "red"]}}
+    :param widgets: [{widgetName, color}]
+    :return: columns and dictionary
+    """
+    codes = {}
+    names = []
+    colors = []
+    for widget in widgets:
+        names.append(widget["widgetName"])
+        colors.append(codes.setdefault(widget["color"], len(codes)))
+    return {"columns": {"widgetName": names, "color": colors},
+            "dictionary": {"color": list(codes)}}
+
+
+def from_columnar(document: dict) -> list:
+    """
+    Widget list of a columnar document, the inverse of to_columnar
+    :param document: {columns, dictionary}
+    :return: [{widgetName, color}]
+    """
+    palette = document["dictionary"]["color"]
+    return [{"widgetName": name, "color": palette[code]}
+            for name, code in zip(document["columns"]["widgetName"],
+                                  document["columns"]["color"])]
+
+
+def format_report(result: Any, columnar: bool) -> Any:
+    """
+    Apply the negotiated format to a report result
+    :param result: widget list, or a dict with widgetList (and metadata, etag)
+    :param columnar: client asked for the columnar type
+    :return: result unchanged, or the dict with widgetList replaced by the columns
+    """
+    if not columnar:
+        return result
+    if isinstance(result, list):
+        return to_columnar(result)
+    document = {key: value for key, value in result.items() if key != "widgetList"}
+    document.update(to_columnar(result.get("widgetList", [])))
+    return document
@@ -0,0 +1,493 @@
+"""
+    Helper lambda layer for the cache tier shared by all Lambda containers
+"""
+from hashlib import sha256
+from math import ceil
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import Any, Callable, Hashable
+import json
+import logging
+import socket
+
+
+class ItemTooLarge(ValueError):
+    """
+    memcached refused a value over its item size limit (-I, 1 MB by default).
+    The server is fine and the connection stays usable.
+    """
+
+
+class MemcachedClient:
+    """
+    Minimal memcached text protocol client (get, set, add, delete, incr), e.g.
+    for ElastiCache for Memcached.  One connection, reconnected after an error;
+    calls are serialized, so the report threads can share it.
+    """
+
+    def __init__(self, endpoint: str, timeout_s: float):
+        """
+        Init
+        :param endpoint: "host:port", port 11211 when omitted
+        :param timeout_s: connect and read timeout
+        """
+        host, _, port = endpoint.partition(":")
+        self.address = (host, int(port or "11211"))
+        self.timeout_s = timeout_s
+        self._lock = Lock()
+        self._socket = None
+        self._reader = None
+
+    def close(self):
+        """
+        Drop the connection, the next call reconnects
+        :return: Nothing
+        """
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._reader = None
+
+    def _call(self, request: bytes, read: Callable) -> Any:
+        """
+        Send a request and read its reply, on the connection of this client
+        :param request: one or more protocol lines
+        :param read: reads the reply from self._reader
+        :return: result of read
+        """
+        with self._lock:
+            try:
+                if self._socket is None:
+                    self._socket = socket.create_connection(self.address, self.timeout_s)
+                    self._socket.settimeout(self.timeout_s)
+                    self._reader = self._socket.makefile("rb")
+                self._socket.sendall(request)
+                return read()
+            except ItemTooLarge:
+                # memcached swallowed the value, the reply was complete
+                raise
+            except (OSError, ValueError):
+                # The connection state is unknown, never reuse it
+                self.close()
+                raise
+
+    def _line(self) -> bytes:
+        """
+        :return: next reply line without CRLF
+        """
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("memcached closed the connection")
+        if line.startswith(b"SERVER_ERROR") and b"too large" in line:
+            raise ItemTooLarge("memcached: " + line.decode("utf-8", "replace").strip())
+        if line.startswith((b"ERROR", b"CLIENT_ERROR", b"SERVER_ERROR")):
+            raise ValueError("memcached: " + line.decode("utf-8", "replace").strip())
+        return line[:-2]
+
+    def get_multi(self, keys: list) -> dict:
+        """
+        :param keys: keys to read in one request
+        :return: {key: bytes} of the keys found
+        """
+        def read() -> dict:
+            values = {}
+            while True:
+                line = self._line()
+                if line == b"END":
+                    return values
+                parts = line.split()
+                if len(parts) < 4 or parts[0] != b"VALUE":
+                    raise ValueError("memcached: unexpected reply %r" % line[:40])
+                data = self._reader.read(int(parts[3]) + 2)
+                values[parts[1].decode("utf-8")] = data[:-2]
+
+        return self._call(("get %s\r\n" % " ".join(keys)).encode("utf-8"), read)
+
+    def _store(self, command: str, key: str, data: bytes, ttl_s: int) -> bool:
+        """
+        :return: True if stored
+        """
+        request = ("%s %s 0 %d %d\r\n" % (command, key, ttl_s, len(data))).encode("utf-8") + \
+            data + b"\r\n"
+        return self._call(request, self._line) == b"STORED"
+
+    def set(self, key: str, data: bytes, ttl_s: int) -> bool:
+        """
+        :param key: key
+        :param data: value
+        :param ttl_s: lifetime in seconds, 0 for no expiry
+        :return: True if stored
+        """
+        return self._store("set", key, data, ttl_s)
+
+    def add(self, key: str, data: bytes, ttl_s: int) -> bool:
+        """
+        Store only if the key does not exist
+        :return: True if stored, False if the key exists
+        """
+        return self._store("add", key, data, ttl_s)
+
+    def delete_multi(self, keys: list):
+        """
+        Delete keys, pipelined in one request
+        :param keys: keys to delete
+        :return: Nothing
+        """
+        def read():
+            for _ in keys:
+                self._line()
+
+        if len(keys) > 0:
+            self._call("".join("delete %s\r\n" % key for key in keys).encode("utf-8"), read)
+
+    def incr(self, key: str, delta: int = 1) -> Any:
+        """
+        :return: new value, None if the key does not exist
+        """
+        reply = self._call(("incr %s %d\r\n" % (key, delta)).encode("utf-8"), self._line)
+        return None if reply == b"NOT_FOUND" else int(reply)
+
+
+# Shared cache protocols by SharedCacheBackend value
+SHARED_CACHE_BACKENDS = {"memcached": MemcachedClient}
+
+
+class SharedCache:
+    """
+    Read cache shared by every container through a memcached server, same
+    interface as LruTtlCache.  Keys are (namespace, ...) tuples; every value
+    is stored with the generation of its namespace, and invalidate_namespace
+    moves the generation on, so entries written before are ignored.  A value
+    built from data read before an invalidation of its namespace is stored with
+    the old generation and never served.
+
+    Cache errors never fail a request: the lookup is a miss, the write is
+    skipped, and the server is left alone for retry_s.  Invalidations lost
+    that way, or racing a rebuild of the same key, are bounded by ttl_s.
+    Values over the item size limit are not cached, a miss of that key only.
+    """
+
+    def __init__(self, client: Any, ttl_s: int, lock_ms: int = 2000, wait_ms: int = 500,
+                 retry_s: float = 5, prefix: str = "widgets",
+                 max_item_bytes: int = 1024 * 1024):
+        """
+        Init
+        :param client: MemcachedClient or compatible
+        :param ttl_s: lifetime of an entry
+        :param lock_ms: lifetime of a rebuild lock, beyond the slowest rebuild
+        :param wait_ms: time waited for another container's rebuild
+        :param retry_s: time the server is skipped after an error
+        :param prefix: key prefix, separates applications sharing a server
+        :param max_item_bytes: item size limit of the server, larger values are not sent
+        """
+        self.client = client
+        self.ttl_s = ttl_s
+        self.lock_s = max(1, int(ceil(lock_ms / 1000)))
+        self.wait_s = wait_ms / 1000
+        self.retry_s = retry_s
+        self.prefix = prefix
+        self.max_item_bytes = max_item_bytes
+        self._down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.oversized = 0
+
+    def _key(self, key: Hashable) -> str:
+        """
+        :param key: (namespace, ...) tuple
+        :return: memcached key, short and without spaces whatever the names
+        """
+        digest = sha256(json.dumps(list(key[1:])).encode("utf-8")).hexdigest()[:40]
+        return "%s:%s:%s" % (self.prefix, key[0], digest)
+
+    def _generation_key(self, namespace: str) -> str:
+        return "%s:gen:%s" % (self.prefix, namespace)
+
+    def _available(self) -> bool:
+        return monotonic() >= self._down_until
+
+    def _failed(self, error: Exception):
+        """
+        Log a cache error and skip the server for a while
+        """
+        self.errors += 1
+        self._down_until = monotonic() + self.retry_s
+        logging.warning("Shared cache unavailable: %s", error)
+
+    def _read(self, keys: list) -> tuple:
+        """
+        Read entries and the generations of their namespaces in one request
+        :param keys: cache keys
+        :return: ({key: value} of the current entries, {namespace: generation})
+        """
+        namespaces = {key[0] for key in keys}
+        wanted = [self._key(key) for key in keys] + \
+            [self._generation_key(namespace) for namespace in namespaces]
+        stored = self.client.get_multi(wanted)
+        generations = {namespace: stored.get(self._generation_key(namespace), b"").decode()
+                       for namespace in namespaces}
+        found = {}
+        for key in keys:
+            data = stored.get(self._key(key), None)
+            if data is None:
+                continue
+            entry = json.loads(data)
+            if entry["g"] == generations[key[0]]:
+                found[key] = entry["v"]
+        return found, generations
+
+    def _write(self, key: Hashable, value: Any, generation: str):
+        """
+        Store an entry, skipped when it is over the item size limit
+        """
+        data = json.dumps({"g": generation, "v": value}, separators=(",", ":")).encode("utf-8")
+        if len(data) > self.max_item_bytes:
+            self.oversized += 1
+            return
+        try:
+            self.client.set(self._key(key), data, self.ttl_s)
+        except ItemTooLarge:
+            # Key and item header count against the limit too, or the server's
+            # limit is lower: this key stays a miss, the server is fine
+            self.oversized += 1
+
+    def get_many(self, keys: list) -> dict:
+        """
+        :param keys: cache keys
+        :return: {key: value} of the keys cached, {} when the server fails
+        """
+        if len(keys) == 0 or not self._available():
+            self.misses += len(keys)
+            return {}
+        try:
+            found, _ = self._read(keys)
+        except (OSError, ValueError) as cache_error:
+            self._failed(cache_error)
+            self.misses += len(keys)
+            return {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: Hashable) -> Any:
+        """
+        :param key: cache key
+        :return: cached value, None on a miss or error
+        """
+        return self.get_many([key]).get(key, None)
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Store a value with the current generation of its namespace
+        :param key: cache key
+        :param value: JSON serializable value
+        :return: Nothing
+        """
+        if not self._available():
+            return
+        try:
+            _, generations = self._read([key])
+            self._write(key, value, generations[key[0]])
+        except (OSError, ValueError) as cache_error:
+            self._failed(cache_error)
+
+    def get_or_build(self, key: Hashable, build: Callable) -> Any:
+        """
+        Read-through with request coalescing: on a miss one container takes the
+        rebuild lock and builds, the others wait up to wait_ms for its result
+        before building themselves
+        :param key: cache key
+        :param build: returns the value; may raise, nothing is cached then
+        :return: cached or built value
+        """
+        if not self._available():
+            return build()
+        try:
+            found, generations = self._read([key])
+            if key in found:
+                self.hits += 1
+                return found[key]
+            self.misses += 1
+            lock_key = self._key(key) + ":lock"
+            if not self.client.add(lock_key, b"1", self.lock_s):
+                value = self._wait_for(key)
+                if value is not None:
+                    return value
+                return build()
+        except (OSError, ValueError) as cache_error:
+            self._failed(cache_error)
+            return build()
+
+        try:
+            value = build()
+            try:
+                self._write(key, value, generations[key[0]])
+            except (OSError, ValueError) as cache_error:
+                self._failed(cache_error)
+            return value
+        finally:
+            try:
+                self.client.delete_multi([lock_key])
+            except (OSError, ValueError) as cache_error:
+                # The lock expires on its own
+                self._failed(cache_error)
+
+    def _wait_for(self, key: Hashable) -> Any:
+        """
+        Poll for the value another container is building
+        :param key: cache key
+        :return: value, None when it did not arrive in time
+        """
+        deadline = monotonic() + self.wait_s
+        while monotonic() < deadline:
+            sleep(min(0.025, max(0.0, deadline - monotonic())))
+            found, _ = self._read([key])
+            if key in found:
+                self.coalesced += 1
+                return found[key]
+        return None
+
+    def invalidate_many(self, keys: list):
+        """
+        Drop keys, in one request
+        :param keys: cache keys
+        :return: Nothing
+        """
+        if len(keys) == 0 or not self._available():
+            return
+        try:
+            self.client.delete_multi([self._key(key) for key in keys])
+        except (OSError, ValueError) as cache_error:
+            self._failed(cache_error)
+
+    def invalidate(self, key: Hashable):
+        """
+        Drop a key
+        :param key: cache key
+        :return: Nothing
+        """
+        self.invalidate_many([key])
+
+    def invalidate_namespace(self, namespace: str):
+        """
+        Move the generation of a namespace on, every (namespace, ...) entry is stale
+        :param namespace: first element of the key tuples to drop
+        :return: Nothing
+        """
+        if not self._available():
+            return
+        generation_key = self._generation_key(namespace)
+        try:
+            if self.client.incr(generation_key) is None:
+                # Start from the clock: an evicted counter never comes back to
+                # a generation stored in old entries
+                if not self.client.add(generation_key, str(int(time() * 1000)).encode(), 0):
+                    self.client.incr(generation_key)
+        except (OSError, ValueError) as cache_error:
+            self._failed(cache_error)
+
+    def stats(self) -> dict:
+        """
+        :return: counters of the cache
+        """
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors,
+                "coalesced": self.coalesced, "oversized": self.oversized}
+
+
+class TieredCache:
+    """
+    In-process LruTtlCache in front of the SharedCache, same interface.  Reads
+    try the container first, then the shared tier, filling the container
+    cache; writes and invalidations go to both.
+    """
+
+    def __init__(self, local: Any, shared: SharedCache):
+        """
+        Init
+        :param local: LruTtlCache, or None for the shared tier only
+        :param shared: SharedCache
+        """
+        self.local = local
+        self.shared = shared
+
+    def get_many(self, keys: list) -> dict:
+        """
+        :param keys: cache keys
+        :return: {key: value} of the keys cached in either tier
+        """
+        found = self.local.get_many(keys) if self.local is not None else {}
+        shared = self.shared.get_many([key for key in keys if key not in found])
+        if self.local is not None:
+            for key, value in shared.items():
+                self.local.put(key, value)
+        found.update(shared)
+        return found
+
+    def get(self, key: Hashable) -> Any:
+        """
+        :param key: cache key
+        :return: cached value, None on a miss
+        """
+        return self.get_many([key]).get(key, None)
+
+    def put(self, key: Hashable, value: Any):
+        """
+        :param key: cache key
+        :param value: JSON serializable value
+        :return: Nothing
+        """
+        if self.local is not None:
+            self.local.put(key, value)
+        self.shared.put(key, value)
+
+    def get_or_build(self, key: Hashable, build: Callable) -> Any:
+        """
+        :param key: cache key
+        :param build: returns the value on a miss of both tiers
+        :return: cached or built value
+        """
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+        value = self.shared.get_or_build(key, build)
+        if self.local is not None:
+            self.local.put(key, value)
+        return value
+
+    def invalidate_many(self, keys: list):
+        """
+        :param keys: cache keys
+        :return: Nothing
+        """
+        if self.local is not None:
+            self.local.invalidate_many(keys)
+        self.shared.invalidate_many(keys)
+
+    def invalidate(self, key: Hashable):
+        """
+        :param key: cache key
+        :return: Nothing
+        """
+        self.invalidate_many([key])
+
+    def invalidate_namespace(self, namespace: str):
+        """
+        :param namespace: first element of the key tuples to drop
+        :return: Nothing
+        """
+        if self.local is not None:
+            self.local.invalidate_namespace(namespace)
+        self.shared.invalidate_namespace(namespace)
+
+    def stats(self) -> dict:
+        """
+        :return: {local, shared} counters
+        """
+        return {"local": self.local.stats() if self.local is not None else {},
+                "shared": self.shared.stats()}
@@ -0,0 +1,109 @@
+"""
+    Helper lambda layer for data versions and report ETags
+"""
+from hashlib import sha256
+from typing import Any
+import json
+
+TABLE_SCOPE = "table"
+ALL_COLORS_SCOPE = "color#*"
+
+
+def color_scope(color: str) -> str:
+    """
+    :param color: widget color
+    :return: version scope of the widgets of one color
+    """
+    return "color#" + color
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match comparison (weak, a list of tags or *)
+    :param if_none_match: request header value, may be empty
+    :param etag: current ETag of the response
+    :return: True if the client copy is current
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or (len(candidate) > 0 and candidate == etag):
+            return True
+    return False
+
+
+def versions_etag(versions: list, *params: Any) -> str:
+    """
+    Strong ETag of a report: its data versions and request parameters
+    :param versions: data versions the report was read at, from VersionTracker.read
+    :param params: request parameters that shape the response
+    :return: quoted ETag
+    """
+    payload = json.dumps([versions, list(params)], separators=(",", ":"))
+    return '"%s"' % sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class VersionTracker:
+    """
+    Change counters in the meta table {metaKey, version}, one item per scope:
+        "table"     - any widget change
+        "color#red" - a widget gained or lost the color red
+        "color#*"   - widgets changed without knowing their old color (batch
+                      writes), part of every color ETag
+    Writers bump after the data write, so a reader never pairs new versions
+    with old data; at worst it pairs old versions with new data and the client
+    refetches once more.  Cached reports must be keyed by the versions they
+    were read at (see the color report), a cache entry outliving a bump would
+    otherwise pair new versions with old data.
+    """
+
+    def __init__(self, table: Any):
+        """
+        Init
+        :param table: meta Table resource
+        """
+        self.table = table
+
+    def bump(self, scopes: list):
+        """
+        Increment the version of every scope in one transaction
+        :param scopes: version scopes
+        :return: Nothing
+        """
+        self.table.meta.client.transact_write_items(TransactItems=[
+            {"Update": {
+                "TableName": self.table.name,
+                "Key": {"metaKey": scope},
+                "UpdateExpression": "ADD #version :one",
+                "ExpressionAttributeNames": {"#version": "version"},
+                "ExpressionAttributeValues": {":one": 1}
+            }} for scope in sorted(set(scopes))])
+
+    def read(self, scopes: list) -> list:
+        """
+        Current versions, strongly consistent
+        :param scopes: version scopes
+        :return: versions in scope order, 0 for scopes never bumped
+        """
+        keys = [{"metaKey": scope} for scope in dict.fromkeys(scopes)]
+        response = self.table.meta.client.batch_get_item(RequestItems={
+            self.table.name: {"Keys": keys, "ConsistentRead": True}})
+        versions = {item["metaKey"]: int(item.get("version", 0))
+                    for item in response.get("Responses", {}).get(self.table.name, [])}
+        unprocessed = response.get("UnprocessedKeys", {}).get(self.table.name, None)
+        if unprocessed is not None:
+            # Rare for a handful of keys, read them one by one
+            for key in unprocessed["Keys"]:
+                item = self.table.get_item(Key=key, ConsistentRead=True).get("Item", {})
+                versions[key["metaKey"]] = int(item.get("version", 0))
+        return [versions.get(scope, 0) for scope in scopes]
+
+    def etag(self, scopes: list, *params: Any) -> str:
+        """
+        Strong ETag of a report: its data versions and request parameters
+        :param scopes: version scopes the report depends on
+        :param params: request parameters that shape the response
+        :return: quoted ETag
+        """
+        return versions_etag(self.read(scopes), *params)
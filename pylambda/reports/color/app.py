@@ -9,73 +9,577 @@
       "application/json": |
           { "path": "$context.path",
             "user-id": "$context.identity.userArn",
-            "color": "$method.request.path.color" }
+            "color": "$method.request.path.color",
+            "limit": "$method.request.querystring.limit",
+            "lastKey": "$method.request.querystring.lastKey",
+            "ifNoneMatch": "$util.escapeJavaScript($input.params('If-None-Match'))",
+            "accept": "$util.escapeJavaScript($input.params('Accept'))" }
 
+    Optional query parameters switch the report to paged (streamed) mode:
+        event[limit] - the maximum number of widgets to return in this call
+        event[lastKey] - the continuation token returned in metadata.next
+
+    The full list is read from the stream-maintained color view when
+    ColorViewName is set (pylambda/streams/colorView), paged mode always
+    reads the Widget-by-Color index.
+
+    With DynamoMetaName set the response carries an etag of the color's data
+    version and the paging parameters, and a matching If-None-Match raises
+    "NotModified: <etag>" before any widget is read, a 304 whose ETag header
+    API GW takes from the message (api/gatewayResponses/notModified.yaml).
+
+    Accept: application/vnd.widgets.columnar+json returns the widget list as
+    columns with dictionary-encoded colors (lambdaResponseFormat), passed
+    through by API GW without the per-widget template loop.
+
+    colors_lambda_handler serves /reports/colors?color=red&color=blue...
+    (api/paths/reports/reportsColors.yaml): the Widget-by-Color queries of
+    all colors run concurrently in one invocation, grouped per color in the
+    response, within one shared item, size and time budget.
+
+    A full list larger than ReportInlineMaxBytes is streamed to a gzip NDJSON
+    object in ReportSpillStore (lambdaReportSpill) and the response carries an
+    empty widgetList and a time-limited download link instead.
 """
-from typing import Any, ClassVar
+from typing import Any, ClassVar, Iterator
+from collections import deque
+from threading import Lock
+import json
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from lambdaDdbEnvLayer import EnvParams
+from lambdaDdbEnvLayer import EnvParams, ReadBudget
+from lambdaClientProfile import is_throttling
+from lambdaVersions import ALL_COLORS_SCOPE, color_scope, etag_matches, versions_etag
+from lambdaResponseFormat import format_report, wants_columnar
+from lambdaReportSpill import collect_report, download_reference, spill_key
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
 
 # Initialize Global environment once for provisioned concurrency
 
 GLOBAL_ENV = EnvParams()
 
 
-def lambda_handler(event: dict, context: Any) -> list:
+@GLOBAL_ENV.profiled
+def lambda_handler(event: dict, context: Any) -> Any:
     """
     Lambda Handler for /reports/color/{color} GET
 
     :param event: lambda event
     :param context: lambda context
-    :return: metadata and widget records {metadata, widgetList}
+    :return: full widget list, or {metadata, widgetList} in paged mode or
+             with a download link when spilled, with an etag when versions are tracked, columns instead of
+             widgetList in the columnar format
     """
 
     # One try-except block in lambda_handler for all AWS service calls
     try:
-        return get_ddb_data(event, GLOBAL_ENV)
+        etag, versions = color_etag(event, GLOBAL_ENV)
+
+        if is_paged_request(event):
+            result = get_ddb_page(event, GLOBAL_ENV, context)
+        else:
+            result = get_ddb_data(event, GLOBAL_ENV, versions)
+
+        if etag is not None:
+            if isinstance(result, list):
+                result = {"widgetList": result}
+            result = dict(result, etag=etag)
+        return format_report(result, wants_columnar(event.get("accept", "")))
 
     except ClientError as client_error:
         # AWS Service error handling
         logging.info('Context: %s %s', event, context)
         logging.error(client_error.response)
+        if is_throttling(client_error):
+            # Throttled after the client retries, or refused by the circuit breaker
+            raise Exception("Throttled: Service Unavailable") from client_error
         raise Exception("error: Internal Server Error") from client_error
 
 
-def get_ddb_data(event: dict, env: ClassVar) -> list:
+@GLOBAL_ENV.profiled
+def colors_lambda_handler(event: dict, context: Any) -> dict:
     """
-    Retrieve widgets from dynamo dv that match the specified color
+    Lambda Handler for /reports/colors GET
+
+    :param event: lambda event
+    :param context: lambda context
+    :return: {metadata, colors: [{color, count, complete, next, widgetList}]},
+             with an etag when versions are tracked and the report is complete
+    """
+
+    # One try-except block in lambda_handler for all AWS service calls
+    try:
+        etag = colors_etag(event, GLOBAL_ENV)
+        result = get_ddb_colors(event, GLOBAL_ENV, context)
+
+        # A report cut short by the time budget may differ on the next call
+        if etag is not None and result["metadata"]["complete"]:
+            result = dict(result, etag=etag)
+        return result
+
+    except ClientError as client_error:
+        # AWS Service error handling
+        logging.info('Context: %s %s', event, context)
+        logging.error(client_error.response)
+        if is_throttling(client_error):
+            # Throttled after the client retries, or refused by the circuit breaker
+            raise Exception("Throttled: Service Unavailable") from client_error
+        raise Exception("error: Internal Server Error") from client_error
+
+
+def color_etag(event: dict, env: ClassVar) -> tuple:
+    """
+    ETag of the report, checked against If-None-Match before reading widgets
+    :param event: lambda event
     :param env: Lambda execution environment variables and AWS resources
+    :return: (ETag, data versions it was computed from), (None, None) when
+             versions are not tracked
+    """
+    if env.versions is None:
+        return None, None
+
+    color_filter = validate_color(event)
+    versions = env.versions.read([color_scope(color_filter), ALL_COLORS_SCOPE])
+    etag = versions_etag(versions, color_filter, event.get("limit", ""),
+                         event.get("lastKey", ""), wants_columnar(event.get("accept", "")))
+    if etag_matches(event.get("ifNoneMatch", ""), etag):
+        raise Exception("NotModified: " + etag)
+    return etag, versions
+
+
+def colors_etag(event: dict, env: ClassVar) -> Any:
+    """
+    ETag of the multi-color report, checked against If-None-Match before reading widgets
     :param event: lambda event
-    :return:
+    :param env: Lambda execution environment variables and AWS resources
+    :return: ETag, None when versions are not tracked
+    """
+    if env.versions is None:
+        return None
+
+    colors = validate_colors(event, env)
+    etag = env.versions.etag([color_scope(color) for color in colors] + [ALL_COLORS_SCOPE],
+                             "colors", colors)
+    if etag_matches(event.get("ifNoneMatch", ""), etag):
+        raise Exception("NotModified: " + etag)
+    return etag
+
+
+def is_paged_request(event: dict) -> bool:
+    """
+    The API GW template always passes limit and lastKey, empty when absent
+    :param event: lambda event
+    :return: True if the client asked for a bounded page
+    """
+    return len(event.get("limit", "")) > 0 or len(event.get("lastKey", "")) > 0
+
+
+def query_color_pages(env: ClassVar, color_filter: str, start_key: dict = None,
+                      page_size: int = None, depth: int = None,
+                      budget: ReadBudget = None) -> Iterator[dict]:
+    """
+    Generator over the Widget-by-Color query pages, one request per page,
+    read ahead by up to DynamoPrefetchDepth pages
+    :param env: Lambda execution environment variables and AWS resources
+    :param color_filter: color to query
+    :param start_key: ExclusiveStartKey to resume from
+    :param page_size: query Limit, defaults to DynamoDefaultLimit
+    :param depth: look-ahead pages, defaults to DynamoPrefetchDepth
+    :param budget: optional read budget, charged with every page as it is
+                   yielded; the pages end early, on one with a
+                   LastEvaluatedKey, once it is spent
+    :return: query pages from env.read_widgets, {Widgets, LastEvaluatedKey, ...}
+    """
+    if env.color_shard_reads:
+        after = start_key[env.ddb_pk] if start_key else ""
+        for page in sharded_color_pages(env, color_filter, after,
+                                        page_size or int(env.ddb_limit)):
+            if budget is not None:
+                budget.charge(page)
+            yield page
+        return
+
+    # String expressions so the same parameters work with the resource and
+    # the low-level client fast path
+    query_kwargs = {
+        "IndexName": env.ddb_idx_color,
+        "KeyConditionExpression": "#c = :c",
+        "ExpressionAttributeNames": {"#c": env.ddb_idx_color_pk},
+        "ExpressionAttributeValues": {":c": color_filter},
+        "Limit": page_size or int(env.ddb_limit)
+    }
+    if start_key:
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+    # The next page is requested while this one is mapped and consumed
+    yield from env.paginate_widgets("query", depth, budget, **query_kwargs)
+
+
+def query_shard_page(env: ClassVar, shard_key: str, after: str, last_key: dict,
+                     page_size: int) -> dict:
+    """
+    One query page of one shard of the sharded color index
+    :param env: Lambda execution environment variables and AWS resources
+    :param shard_key: "<color>#<shard>"
+    :param after: only widget names after this one, "" for all
+    :param last_key: ExclusiveStartKey of the shard, or None
+    :param page_size: query Limit
+    :return: page from env.read_widgets
     """
+    query_kwargs = {
+        "IndexName": env.ddb_idx_color_shard,
+        "KeyConditionExpression": "#s = :s",
+        "ExpressionAttributeNames": {"#s": env.ddb_idx_color_shard_pk},
+        "ExpressionAttributeValues": {":s": shard_key},
+        "Limit": page_size
+    }
+    if len(after) > 0:
+        query_kwargs["KeyConditionExpression"] += " AND #pk > :after"
+        query_kwargs["ExpressionAttributeNames"]["#pk"] = env.ddb_pk
+        query_kwargs["ExpressionAttributeValues"][":after"] = after
+    if last_key is not None:
+        query_kwargs["ExclusiveStartKey"] = last_key
+    return env.read_widgets("query", **query_kwargs)
 
+
+def sharded_color_pages(env: ClassVar, color_filter: str, after: str,
+                        page_size: int) -> Iterator[dict]:
+    """
+    Scatter-gather over the shards of a color: every shard whose buffered page
+    ran out is queried concurrently, and the shards (each in widget name order)
+    are merged by widget name.  Pages have the shape of query_color_pages, so the
+    output and the resume keys are the same as with the unsharded index.
+    :param env: Lambda execution environment variables and AWS resources
+    :param color_filter: color to query
+    :param after: resume after this widget name, "" to start
+    :param page_size: widgets per merged page and query Limit per shard
+    :return: merged pages {Widgets, LastEvaluatedKey, ScannedCount, ConsumedCapacity}
+    """
+    shard_keys = env.color_shard_keys(color_filter)
+    buffers = [deque() for _ in shard_keys]
+    # Per shard ExclusiveStartKey; None before the first page, "done" at the end
+    positions = [None] * len(shard_keys)
+    done = [False] * len(shard_keys)
+
+    def refill(shard: int) -> dict:
+        return query_shard_page(env, shard_keys[shard], after, positions[shard], page_size)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(shard_keys), env.scan_workers))) as pool:
+        while True:
+            page = {"Widgets": [], "ScannedCount": 0, "ConsumedCapacity": {"CapacityUnits": 0}}
+            while len(page["Widgets"]) < page_size:
+                # A shard may only be skipped once it is exhausted, otherwise a
+                # smaller name could still be in its next page
+                empty = [shard for shard, buffer in enumerate(buffers)
+                         if len(buffer) == 0 and not done[shard]]
+                for shard, response in zip(empty, pool.map(refill, empty)):
+                    buffers[shard].extend(response["Widgets"])
+                    page["ScannedCount"] += response["ScannedCount"]
+                    page["ConsumedCapacity"]["CapacityUnits"] += \
+                        response["ConsumedCapacity"].get("CapacityUnits", 0)
+                    positions[shard] = response.get("LastEvaluatedKey", None)
+                    done[shard] = positions[shard] is None
+
+                if any(len(buffers[shard]) == 0 and not done[shard] for shard in empty):
+                    # An empty shard page is not necessarily its last one, read on
+                    continue
+                heads = [shard for shard, buffer in enumerate(buffers) if len(buffer) > 0]
+                if len(heads) == 0:
+                    break
+                shard = min(heads, key=lambda head: buffers[head][0]["widgetName"])
+                page["Widgets"].append(buffers[shard].popleft())
+
+            if len(page["Widgets"]) > 0 and (any(len(buffer) > 0 for buffer in buffers) or
+                                             not all(done)):
+                page["LastEvaluatedKey"] = {env.ddb_pk: page["Widgets"][-1]["widgetName"]}
+            yield page
+            if "LastEvaluatedKey" not in page:
+                return
+
+
+def validate_color(event: dict) -> str:
+    """
+    Validate the color path parameter
+    :param event: lambda event
+    :return: color
+    """
     if "color" not in event.keys() or len(event["color"]) == 0:
         raise Exception("Malformed path error")
 
-    color_filter = event["color"]
+    return event["color"]
+
+
+def validate_colors(event: dict, env: ClassVar) -> list:
+    """
+    Validate the repeated color query parameter of the multi-color report,
+    every value is passed by API GW in the colors list
+    :param event: lambda event
+    :param env: Lambda execution environment variables and AWS resources
+    :return: colors in request order, without repeats
+    """
+    colors = list(dict.fromkeys(color for color in event.get("colors", [])
+                                if isinstance(color, str) and len(color) > 0))
+    if len(colors) == 0:
+        raise Exception("NotAcceptable: Invalid input for color")
+    if len(colors) > env.report_max_colors:
+        raise Exception("NotAcceptable: More than %d colors" % env.report_max_colors)
+    return colors
+
+
+def get_ddb_data(event: dict, env: ClassVar, versions: list = None) -> Any:
+    """
+    Retrieve widgets from dynamo dv that match the specified color
+    :param env: Lambda execution environment variables and AWS resources
+    :param event: lambda event
+    :param versions: data versions of the ETag sent with the report, part of
+                     the cache key so a cached report never gets a newer ETag
+    :return: widget list, or {metadata, widgetList: [], download} when the
+             report was spilled to ReportSpillStore
+    """
+
+    color_filter = validate_color(event)
+
+    def build() -> Any:
+        report = collect_report(color_chunks(env, color_filter), env.report_spill_store,
+                                env.report_inline_max_bytes, spill_key("color", color_filter))
+
+        # Raise NotFound if return is 0
+        if isinstance(report, list) and len(report) == 0:
+            raise Exception("NotFound: no data matching query")
+        return report
+
+    # Hot color reports come from the cache; with the shared tier a single
+    # container rebuilds a missing report while the others wait for it.  A
+    # spilled report is cached as its object key, the link is signed per call.
+    if env.cache is not None:
+        # Entries of older versions are never read again and age out; a
+        # container that missed the invalidation of a write cannot serve them
+        key = ("color", color_filter) if versions is None else \
+            ("color", color_filter, tuple(versions))
+        report = env.cache.get_or_build(key, build)
+    else:
+        report = build()
+    if isinstance(report, list):
+        return report
+
+    return {
+        "metadata": {
+            "next": "",
+            "previous": "",
+            "message": "OK",
+            "count": report["count"]
+        },
+        "widgetList": [],
+        "download": download_reference(env.report_spill_store, report, env.report_spill_url_s)
+    }
+
+
+def color_chunks(env: ClassVar, color_filter: str) -> Iterator[list]:
+    """
+    Widgets of a color, chunk by chunk
+    :param env: Lambda execution environment variables and AWS resources
+    :param color_filter: color to read
+    :return: lists of widgets in name order
+    """
+    # A few view chunk items instead of every index page of the color, the
+    # index when the view of the color is stale
+    names = env.color_view.members(color_filter) if env.color_view is not None else None
+    if names is not None:
+        yield [{"widgetName": name, "color": color_filter} for name in names]
+    else:
+        # Paginate when compiling a full list, one query page per chunk
+        for page in query_color_pages(env, color_filter):
+            yield page["Widgets"]
+
+
+def get_ddb_page(event: dict, env: ClassVar, context: Any = None) -> dict:
+    """
+    Retrieve a bounded page of widgets of the specified color.  Reading stops at
+    the caller's limit (capped by ReportMaxItems) or when the time budget runs
+    out, so peak memory does not depend on how many widgets match the color.
+    :param event: lambda event
+    :param env: Lambda execution environment variables and AWS resources
+    :param context: lambda context, used to respect the remaining invocation time
+    :return: {metadata, widgetList} with metadata.next as continuation token
+    """
 
-    db_resp = env.ddb_table.query(
-        IndexName=env.ddb_idx_color,
-        KeyConditionExpression=Key(env.ddb_idx_color_pk).eq(color_filter),
-        Limit=int(env.ddb_limit)
-    )
-    widget_list = [env.ddb_to_widget(item) for item in db_resp.get("Items", [])]
+    color_filter = validate_color(event)
 
-    # Paginate when compiling a full list
-    while db_resp.get('LastEvaluatedKey', None) is not None:
-        db_resp = env.ddb_table.query(
-            IndexName=env.ddb_idx_color,
-            KeyConditionExpression=Key(env.ddb_idx_color_pk).eq(color_filter),
-            ExclusiveStartKey=db_resp['LastEvaluatedKey'],
-            Limit=int(env.ddb_limit)
-        )
+    max_items = env.report_max_items
+    if len(event.get("limit", "")) > 0 and int(event["limit"]) > 0:
+        max_items = min(int(event["limit"]), max_items)
+
+    budget = ReadBudget(env.report_time_budget_ms, context=context)
+
+    # The continuation token is the last widget name returned, the GSI start
+    # key also needs the index key (the sharded index resumes by name)
+    start_key = None
+    if len(event.get("lastKey", "")) > 0:
+        start_key = {env.ddb_pk: event["lastKey"], env.ddb_idx_color_pk: color_filter}
+
+    # No read-ahead when one page holds the whole answer
+    page_size = min(int(env.ddb_limit), max_items)
+    pages = query_color_pages(env, color_filter, start_key, page_size,
+                              0 if page_size >= max_items else None, budget)
+    widget_list = []
+    next_key = ""
+    # The pages are charged to the budget as they are yielded
+    for page in pages:
+        widgets = page["Widgets"]
+        room = max_items - len(widget_list)
+        widget_list.extend(widgets[:room])
+
+        if len(widgets) > room:
+            # Stopped part way through a page, resume after the last widget sent
+            next_key = widget_list[-1]["widgetName"]
+            break
+
+        last_key = page.get("LastEvaluatedKey", None)
+        if last_key is None:
+            next_key = ""
+            break
+
+        # Kept when the read-ahead stops on the budget and the pages end here
+        next_key = last_key[env.ddb_pk]
+        if len(widget_list) >= max_items or budget.exhausted():
+            break
+
+    # Raise NotFound if return is 0 and there is nothing left to read
+    if len(widget_list) == 0 and len(next_key) == 0:
+        raise Exception("NotFound: no data matching query")
+
+    return {
+        "metadata": {
+            "next": next_key,
+            "previous": event.get("lastKey", ""),
+            "message": "OK",
+            "count": len(widget_list)
+        },
+        "widgetList": widget_list
+    }
+
+
+class ColorsBudget:
+    """
+    Budget shared by the color queries of one multi-color report: widgets
+    (ReportMaxItems), serialized bytes (ReportInlineMaxBytes) and read time
+    (ReportTimeBudgetMs)
+    """
+
+    def __init__(self, max_items: int, max_bytes: int, time_budget_ms: int, context: Any = None):
+        """
+        Init
+        :param max_items: widgets returned across all colors
+        :param max_bytes: JSON size of the widgets returned across all colors
+        :param time_budget_ms: time allowed for reads
+        :param context: lambda context, the budget never exceeds its remaining time
+        """
+        self.items = max_items
+        self.bytes = max_bytes
+        self.reads = ReadBudget(time_budget_ms, context=context)
+        self._lock = Lock()
+
+    def take(self, page: dict) -> int:
+        """
+        Charge a query page and reserve room for its widgets
+        :param page: page from query_color_pages
+        :return: widgets of the page that fit, from the first one
+        """
+        # A JSON list of n widgets is their sizes, the brackets and n - 1 ", ",
+        # so each widget adds its size + 2; serialized outside the lock
+        sizes = [len(json.dumps(widget)) + 2 for widget in page["Widgets"]]
+        with self._lock:
+            self.reads.charge(page)
+            room = 0
+            size = 0
+            for widget_size in sizes[:max(0, self.items)]:
+                if size + widget_size > self.bytes:
+                    break
+                room += 1
+                size += widget_size
+            self.items -= room
+            self.bytes -= size
+            return room
+
+    def exhausted(self) -> bool:
+        """
+        :return: True once any part of the budget is spent
+        """
+        with self._lock:
+            return self.items <= 0 or self.bytes <= 0 or self.reads.exhausted()
+
+
+def read_color(env: ClassVar, color: str, budget: ColorsBudget) -> dict:
+    """
+    Widgets of one color within the shared budget, page by page from the
+    Widget-by-Color index
+    :param env: Lambda execution environment variables and AWS resources
+    :param color: color to query
+    :param budget: budget shared with the other colors of the report
+    :return: {color, count, complete, next, widgetList}; an incomplete color
+             resumes with /reports/color/{color}?lastKey=next, from the start
+             when next is empty
+    """
+    widget_list = []
+    next_key = ""
+    complete = True
+    # Colors already run concurrently, no read-ahead thread per color
+    pages = query_color_pages(env, color, None, int(env.ddb_limit), 0)
+    for page in pages:
+        room = budget.take(page)
+        widget_list.extend(page["Widgets"][:room])
+        if room < len(page["Widgets"]):
+            # Stopped part way through a page, resume after the last widget sent
+            complete = False
+            next_key = widget_list[-1]["widgetName"] if len(widget_list) > 0 else ""
+            break
+
+        last_key = page.get("LastEvaluatedKey", None)
+        if last_key is None:
+            break
+
+        if budget.exhausted():
+            complete = False
+            next_key = last_key[env.ddb_pk]
+            break
+    pages.close()
+
+    return {
+        "color": color,
+        "count": len(widget_list),
+        "complete": complete,
+        "next": next_key,
+        "widgetList": widget_list
+    }
+
+
+def get_ddb_colors(event: dict, env: ClassVar, context: Any = None) -> dict:
+    """
+    Widgets of several colors in one call: the Widget-by-Color queries run
+    concurrently, at most DynamoScanWorkers at a time, so the report takes
+    about as long as the largest color
+    :param event: lambda event
+    :param env: Lambda execution environment variables and AWS resources
+    :param context: lambda context, used to respect the remaining invocation time
+    :return: {metadata, colors} with one group per color in request order
+    """
+    colors = validate_colors(event, env)
+    budget = ColorsBudget(env.report_max_items, env.report_inline_max_bytes,
+                          env.report_time_budget_ms, context)
 
-        widget_list.extend([env.ddb_to_widget(item) for item in db_resp.get("Items", [])])
+    with ThreadPoolExecutor(max_workers=max(1, min(len(colors), env.scan_workers))) as pool:
+        groups = list(pool.map(lambda color: read_color(env, color, budget), colors))
 
-    # Raise NotFound if return is 0
-    if len(widget_list) == 0:
+    # Raise NotFound if no color has a widget
+    if all(group["count"] == 0 and group["complete"] for group in groups):
         raise Exception("NotFound: no data matching query")
 
-    return widget_list
+    return {
+        "metadata": {
+            "message": "OK",
+            "count": sum(group["count"] for group in groups),
+            "colors": len(groups),
+            "complete": all(group["complete"] for group in groups)
+        },
+        "colors": groups
+    }
@@ -6,6 +6,8 @@
         event[limit] - the number of records to return
         event[lastkey] - the starting widget of the list
         event[filter] - a "contains" filtering of widget name
+        event[prefix] - a "begins with" filtering of widget name
+        event[page] - a page number (1-based) instead of lastKey
 
      Optional parameters are passed from the API GW with querystring integration:
         api/paths/reports/reportsAll.yaml
@@ -19,21 +21,61 @@
         #set ($root=$input.path('$'))
         { "limit": "$method.request.querystring.limit",
           "lastKey": "$method.request.querystring.lastkey",
-          "filter": "$method.request.querystring.filter"
+          "filter": "$method.request.querystring.filter",
+          "prefix": "$method.request.querystring.prefix",
+          "page": "$method.request.querystring.page",
+          "ifNoneMatch": "$util.escapeJavaScript($input.params('If-None-Match'))",
+          "accept": "$util.escapeJavaScript($input.params('Accept'))"
         }
 
+    With DynamoMetaName set the response carries an etag of the table's data
+    version and the query parameters, and a matching If-None-Match raises
+    "NotModified: <etag>" before the scan, a 304 carrying that ETag.
+
+    Accept: application/vnd.widgets.columnar+json returns the page as columns
+    with dictionary-encoded colors, see lambdaResponseFormat.
+
+    With page, the start cursor of the page comes from the page-boundary index
+    (lambdaPageIndex, needs DynamoMetaName): one lookup and one page read for
+    any page a client reached before.  Pages not indexed yet are walked from
+    the last indexed one, within the read budget.  metadata.page is the page
+    served and metadata.previous the lastKey of the page before it.
+
+    With DynamoNgramReads, filters of at least DynamoNgramSize characters
+    intersect the n-gram postings (DynamoNgramName) and return widgets in name
+    order; otherwise the filter is a scan filter.
+
+    With DynamoNamePrefixReads, prefix filters query the Widget-by-Name index
+    (one begins_with query per name bucket) and return widgets in name order;
+    otherwise the prefix is one more scan filter.
 """
 
 from typing import Any, ClassVar
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+import json
 import logging
-from lambdaDdbEnvLayer import EnvParams
+from lambdaDdbEnvLayer import EnvParams, ReadBudget
+from lambdaClientProfile import is_throttling
+from lambdaVersions import TABLE_SCOPE, etag_matches
+from lambdaResponseFormat import format_report, wants_columnar
 from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Key
+
+# Composite cursors for the parallel scan are prefixed so they can be told apart
+# from a plain widget name passed as lastKey
+SEGMENT_CURSOR_PREFIX = "segments:"
+
+# Largest segment count accepted in a composite cursor, every round of the
+# parallel scan reads one page per segment
+MAX_CURSOR_SEGMENTS = 64
 
 # Initialize Global environment once for provisioned concurrency
 
 GLOBAL_ENV = EnvParams()
 
 
+@GLOBAL_ENV.profiled
 def lambda_handler(event: dict, context: Any) -> dict:
     """
     Lambda Handler for /reports/filterpage GET
@@ -45,20 +87,24 @@ def lambda_handler(event: dict, context: Any) -> dict:
 
     # One try-except block in lambda_handler for all AWS service calls
     try:
-        return widget_get(event, GLOBAL_ENV)
+        return widget_get(event, GLOBAL_ENV, context)
 
     except ClientError as client_error:
         # AWS Service error handling
         logging.info('Context: %s %s', event, context)
         logging.error(client_error.response)
+        if is_throttling(client_error):
+            # Throttled after the client retries, or refused by the circuit breaker
+            raise Exception("Throttled: Service Unavailable") from client_error
         raise Exception("error: Internal Server Error") from client_error
 
 
-def widget_get(event: dict, env: ClassVar) -> dict:
+def widget_get(event: dict, env: ClassVar, context: Any = None) -> dict:
     """
     Retrieve a page of widgets based on event parameters
     :param event: lambda event dictionary
     :param env: passed environment
+    :param context: lambda context, used to respect the remaining invocation time
     :return:
     """
 
@@ -72,39 +118,555 @@ def widget_get(event: dict, env: ClassVar) -> dict:
     # ProjectionExpression and Limit are always specified
     scan_kwargs = {
         'ProjectionExpression': env.ddb_pk + ", color",
-        'Limit': scan_limit
+        'Limit': scan_limit,
+        'ReturnConsumedCapacity': 'TOTAL'
     }
 
     # Client requests an option for filtering on widget name
+    filter_expressions = []
+    filter_values = {}
     if "filter" in event.keys() and len(event["filter"]) > 0:
-        scan_kwargs["FilterExpression"] = 'contains(#S, :s)'
+        filter_expressions.append('contains(#S, :s)')
+        filter_values[":s"] = event["filter"]
+    if "prefix" in event.keys() and len(event["prefix"]) > 0:
+        # The filter of a scan, the name index query has the prefix as key condition
+        filter_expressions.append('begins_with(#S, :p)')
+        filter_values[":p"] = event["prefix"]
+    if len(filter_expressions) > 0:
+        scan_kwargs["FilterExpression"] = " AND ".join(filter_expressions)
         scan_kwargs["ExpressionAttributeNames"] = {"#S": env.ddb_pk}
-        scan_kwargs["ExpressionAttributeValues"] = {":s": event["filter"]}
+        scan_kwargs["ExpressionAttributeValues"] = filter_values
 
-    # Client has specified a pagination start
-    if "lastKey" in event.keys() and len(event["lastKey"]) > 0:
-        scan_kwargs["ExclusiveStartKey"] = {env.ddb_pk: event["lastKey"]}
+    # Limit is applied before the filter, keep reading until the page is full
+    # or the read budget is spent
+    budget = ReadBudget(env.scan_time_budget_ms, env.scan_max_capacity, context)
 
-    # Execute the query
-    response = env.ddb_table.scan(**scan_kwargs)
+    last_key = event.get("lastKey", "")
+    filter_text = event.get("filter", "")
+    prefix = event.get("prefix", "")
+    columnar = wants_columnar(event.get("accept", ""))
+    page = requested_page = page_number(event)
+    if page is not None and len(last_key) > 0:
+        raise Exception("NotAcceptable: page and lastKey are exclusive")
 
-    # Raise NotFound if return is 0
-    if len(response.get("Items", [])) == 0:
+    # Unchanged table, same page: answer 304 without scanning
+    etag = None
+    if env.versions is not None:
+        etag = env.versions.etag([TABLE_SCOPE], scan_limit, last_key, filter_text, columnar,
+                                 page, prefix)
+        if etag_matches(event.get("ifNoneMatch", ""), etag):
+            raise Exception("NotModified: " + etag)
+
+    previous = last_key
+    index_key = None
+    starts = []
+    if page is not None:
+        page, last_key, index_key, starts = locate_page(page, scan_kwargs, filter_text, prefix,
+                                                        env, scan_limit, budget)
+        previous = starts[page - 2] if page > 1 else ""
+
+    items, next_key = read_page(scan_kwargs, filter_text, prefix, env, scan_limit, last_key,
+                                budget)
+
+    if index_key is not None and len(next_key) > 0 and len(starts) == page:
+        # First time past this page, index where the next one starts
+        env.page_index.record(index_key, page - 1, next_key)
+
+    # Raise NotFound if return is 0 and there is nothing left to read
+    if len(items) == 0 and len(next_key) == 0:
         raise Exception("NotFound: no data matching query")
 
     # Return the payload.  With web client pagination,
     # you will need to specify "next" so it can pass it as "lastKey"
     # in the next call
 
+    data = items
 
-    data = [env.ddb_to_widget(item) for item in response.get("Items", [])]
-
-    return {
+    response = {
         "metadata": {
-            "next": response.get("LastEvaluatedKey", {env.ddb_pk: ""})[env.ddb_pk],
-            "previous": event.get("lastKey", ""),
+            "next": next_key,
+            "previous": previous,
             "message": "OK",
-            "count": len(data)
+            "count": len(data),
+            "scanned": budget.scanned
         },
         "widgetList": data
     }
+    if page is not None:
+        response["metadata"]["page"] = page
+    if etag is not None and page == requested_page:
+        # A walk cut short served another page than the one the ETag names
+        response["etag"] = etag
+    return format_report(response, columnar)
+
+
+def page_number(event: dict) -> Any:
+    """
+    :param event: lambda event dictionary
+    :return: requested page number, None when absent
+    """
+    page = event.get("page", "")
+    if len(page) == 0:
+        return None
+    if not page.isdigit() or int(page) < 1:
+        raise Exception("NotAcceptable: Invalid page")
+    return int(page)
+
+
+def read_page(scan_kwargs: dict, filter_text: str, prefix: str, env: ClassVar,
+              scan_limit: int, last_key: str, budget: ReadBudget) -> tuple:
+    """
+    Read one page with the strategy of the filters and the cursor
+    :param scan_kwargs: scan parameters, not modified
+    :param filter_text: widget name filter, or ""
+    :param prefix: widget name prefix, or ""
+    :param env: passed environment
+    :param scan_limit: number of items wanted
+    :param last_key: cursor to resume after, or ""
+    :param budget: read budget for this request
+    :return: (widgets, next key)
+    """
+    scan_kwargs = dict(scan_kwargs)
+    if len(prefix) > 0 and env.name_prefix_reads:
+        # Only the names with the prefix are read, in name order
+        return prefix_query(scan_kwargs, filter_text, prefix, env, scan_limit, last_key,
+                            budget)
+    if env.ngram_reads and len(env.widget_ngrams(filter_text)) > 0 and len(prefix) == 0:
+        # Substring filters long enough to have n-grams use the postings index,
+        # shorter ones fall back to the scan
+        return ngram_search(filter_text, env, scan_limit, last_key, budget)
+    if last_key.startswith(SEGMENT_CURSOR_PREFIX) or \
+            ("FilterExpression" in scan_kwargs and env.scan_segments > 1 and len(last_key) == 0):
+        # Selective filters read many pages per hit, fan them out over segments.
+        # A plain widget name (a cursor of the sequential scan, or a filter added
+        # while paging) resumes the sequential scan instead of starting over
+        return parallel_scan(scan_kwargs, env, scan_limit, last_key, budget)
+    return sequential_scan(scan_kwargs, env, scan_limit, last_key, budget)
+
+
+def locate_page(page: int, scan_kwargs: dict, filter_text: str, prefix: str, env: ClassVar,
+                scan_limit: int, budget: ReadBudget) -> tuple:
+    """
+    Start cursor of a page number: the indexed one, else walk forward from the
+    last indexed page and index the cursors on the way.  A walk stopped by the
+    read budget ends on the last page it reached.
+    :param page: requested page number
+    :param scan_kwargs: scan parameters, not modified
+    :param filter_text: widget name filter, or ""
+    :param prefix: widget name prefix, or ""
+    :param env: passed environment
+    :param scan_limit: page size
+    :param budget: read budget for this request
+    :return: (page number reached, its start cursor, index key or None,
+              start cursors of the pages known, "" for page 1)
+    """
+    index_key = None
+    starts = [""]
+    if env.page_index is not None:
+        # Cursors depend on the data and on the read strategy of the settings
+        index_key = env.page_index.key(env.versions.read([TABLE_SCOPE])[0], scan_limit,
+                                       filter_text, prefix, env.ngram_reads, env.scan_segments,
+                                       env.name_prefix_reads)
+        starts.extend(env.page_index.starts(index_key))
+
+    while len(starts) < page and not budget.exhausted():
+        _, next_key = read_page(scan_kwargs, filter_text, prefix, env, scan_limit, starts[-1],
+                                budget)
+        if len(next_key) == 0:
+            raise Exception("NotFound: page %d is past the last page" % page)
+        if index_key is not None:
+            env.page_index.record(index_key, len(starts) - 1, next_key)
+        starts.append(next_key)
+
+    reached = min(page, len(starts))
+    return reached, starts[reached - 1], index_key, starts
+
+
+def sequential_scan(scan_kwargs: dict, env: ClassVar, scan_limit: int, last_key: str,
+                    budget: ReadBudget) -> tuple:
+    """
+    Scan page after page until scan_limit items match, the table is exhausted or
+    the budget is spent.  The resume key is exact: when a page holds more matches
+    than needed, the next page starts after the last item returned.
+    :param scan_kwargs: scan parameters
+    :param env: passed environment
+    :param scan_limit: number of items wanted
+    :param last_key: widget name to resume after, or ""
+    :param budget: read budget for this request
+    :return: (widgets, next key)
+    """
+    # Client has specified a pagination start
+    if len(last_key) > 0:
+        scan_kwargs["ExclusiveStartKey"] = {env.ddb_pk: last_key}
+
+    # Filtered scans read many pages, the next one is requested while this one
+    # is mapped.  An unfiltered page is one read, nothing to read ahead
+    depth = None if "FilterExpression" in scan_kwargs else 0
+    items = []
+    next_key = ""
+    # The pages are charged to the budget as they are handed over
+    for response in env.paginate_widgets("scan", depth, budget, **scan_kwargs):
+        page_items = response["Widgets"]
+        room = scan_limit - len(items)
+        items.extend(page_items[:room])
+        if len(page_items) > room:
+            return items, items[-1]["widgetName"]
+
+        if response.get("LastEvaluatedKey", None) is None:
+            return items, ""
+
+        next_key = response["LastEvaluatedKey"][env.ddb_pk]
+        if len(items) >= scan_limit or budget.exhausted():
+            return items, next_key
+    # The read-ahead stopped on the budget, the table goes on after the last page
+    return items, next_key
+
+
+def prefix_successor(prefix: str) -> Any:
+    """
+    Smallest string above every string starting with prefix, in the code point
+    (= UTF-8 byte) order DynamoDB sorts keys in
+    :param prefix: widget name prefix
+    :return: upper bound, None when there is none
+    """
+    chars = list(prefix)
+    while len(chars) > 0:
+        code = ord(chars[-1]) + 1
+        if code == 0xD800:
+            # Surrogates are not valid in UTF-8
+            code = 0xE000
+        if code <= 0x10FFFF:
+            chars[-1] = chr(code)
+            return "".join(chars)
+        chars.pop()
+    return None
+
+
+def query_name_bucket(scan_kwargs: dict, filter_text: str, prefix: str, bucket_key: str,
+                      env: ClassVar, scan_limit: int, last_key: str,
+                      budget: ReadBudget) -> tuple:
+    """
+    Widgets of one name bucket starting with prefix and after last_key, read
+    until scan_limit match, the bucket ends or the budget is spent.  The widget
+    name is the sort key of the index and a query cannot filter on key
+    attributes, so the substring filter is applied here.
+    :param scan_kwargs: scan parameters, the projection and limit are reused
+    :param filter_text: widget name filter, or ""
+    :param prefix: widget name prefix
+    :param bucket_key: "names#<bucket>"
+    :param env: passed environment
+    :param scan_limit: number of items wanted
+    :param last_key: widget name to resume after, or ""
+    :param budget: read budget for this request, only checked
+    :return: (widgets in name order, last name read or None once the bucket is done,
+              responses to charge)
+    """
+    query_kwargs = {key: value for key, value in scan_kwargs.items()
+                    if key in ("ProjectionExpression", "Limit", "ReturnConsumedCapacity")}
+    query_kwargs["IndexName"] = env.ddb_idx_name
+    query_kwargs["ExpressionAttributeNames"] = {"#b": env.ddb_idx_name_bucket_pk,
+                                                "#n": env.ddb_pk}
+    query_kwargs["ExpressionAttributeValues"] = {":b": bucket_key, ":p": prefix}
+    upper = prefix_successor(prefix)
+    if len(last_key) == 0:
+        query_kwargs["KeyConditionExpression"] = "#b = :b AND begins_with(#n, :p)"
+    elif upper is not None:
+        # A key condition has one sort key clause: resume inside the prefix range,
+        # the bounds themselves are dropped below
+        query_kwargs["KeyConditionExpression"] = "#b = :b AND #n BETWEEN :after AND :upper"
+        query_kwargs["ExpressionAttributeValues"].update({":after": last_key, ":upper": upper})
+    else:
+        query_kwargs["KeyConditionExpression"] = "#b = :b AND #n > :after"
+        query_kwargs["ExpressionAttributeValues"][":after"] = last_key
+
+    widgets = []
+    responses = []
+    while True:
+        page = env.read_widgets("query", **query_kwargs)
+        responses.append(page)
+        widgets.extend(widget for widget in page["Widgets"]
+                       if widget["widgetName"] > last_key and
+                       widget["widgetName"].startswith(prefix) and
+                       filter_text in widget["widgetName"])
+        if page.get("LastEvaluatedKey", None) is None:
+            return widgets, None, responses
+        if len(widgets) >= scan_limit or budget.exhausted():
+            return widgets, page["LastEvaluatedKey"][env.ddb_pk], responses
+        query_kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def prefix_query(scan_kwargs: dict, filter_text: str, prefix: str, env: ClassVar,
+                 scan_limit: int, last_key: str, budget: ReadBudget) -> tuple:
+    """
+    Widgets whose name starts with prefix, in name order, from the Widget-by-Name
+    index.  Every name bucket is queried concurrently and the results merged by
+    name.  A bucket stopped early by the budget has read every name up to its
+    position, so the page only goes that far and the cursor stays exact.
+    :param scan_kwargs: scan parameters, the projection and limit are reused
+    :param filter_text: widget name filter, or ""
+    :param prefix: widget name prefix
+    :param env: passed environment
+    :param scan_limit: number of items wanted
+    :param last_key: widget name to resume after, or ""
+    :param budget: read budget for this request
+    :return: (widgets, next key)
+    """
+    bucket_keys = env.name_bucket_keys()
+    with ThreadPoolExecutor(max_workers=max(1, min(len(bucket_keys), env.scan_workers))) as pool:
+        results = list(pool.map(lambda bucket_key: query_name_bucket(
+            scan_kwargs, filter_text, prefix, bucket_key, env, scan_limit, last_key, budget),
+            bucket_keys))
+
+    for _, _, responses in results:
+        for response in responses:
+            budget.charge(response)
+
+    # Names up to the lowest position of an unfinished bucket are complete
+    positions = [position for _, position, _ in results if position is not None]
+    bound = min(positions) if len(positions) > 0 else None
+    candidates = sorted((widget for widgets, _, _ in results for widget in widgets
+                         if bound is None or widget["widgetName"] <= bound),
+                        key=lambda widget: widget["widgetName"])
+
+    items = candidates[:scan_limit]
+    if len(candidates) > scan_limit:
+        return items, items[-1]["widgetName"]
+    return items, bound or ""
+
+
+class PostingCursor:
+    """
+    Position in the postings of one n-gram, in widget name order.  seek()
+    answers from the page read last and only queries again past its end, from
+    the name sought, so a long posting list is jumped over rather than read.
+    """
+
+    def __init__(self, gram: str, env: ClassVar, budget: ReadBudget):
+        """
+        Init
+        :param gram: n-gram
+        :param env: passed environment
+        :param budget: read budget for this request, charged per query
+        """
+        self.gram = gram
+        self.env = env
+        self.budget = budget
+        self.names = []
+        self.index = 0
+        self.complete = False
+
+    def _query(self, name: str, strict: bool):
+        key_condition = Key("gram").eq(self.gram)
+        if len(name) > 0:
+            key_condition = key_condition & (Key("widgetName").gt(name) if strict
+                                             else Key("widgetName").gte(name))
+        response = self.env.ngram_table.query(KeyConditionExpression=key_condition,
+                                              ProjectionExpression="widgetName",
+                                              Limit=int(self.env.ddb_limit),
+                                              ReturnConsumedCapacity="TOTAL")
+        self.budget.charge(response)
+        self.names = [posting["widgetName"] for posting in response.get("Items", [])]
+        self.index = 0
+        self.complete = response.get("LastEvaluatedKey", None) is None
+
+    def seek(self, name: str, strict: bool = False) -> Any:
+        """
+        :param name: widget name
+        :param strict: skip name itself
+        :return: first posted name at or after name (after it when strict), None past the end
+        """
+        while True:
+            while self.index < len(self.names) and (
+                    self.names[self.index] < name or (strict and self.names[self.index] == name)):
+                self.index += 1
+            if self.index < len(self.names):
+                return self.names[self.index]
+            if self.complete:
+                return None
+            # Names are sought in increasing order, everything before name is behind us
+            self._query(name, strict)
+
+    def rarity(self) -> tuple:
+        """
+        :return: sort key, postings known to be few first
+        """
+        return not self.complete, len(self.names)
+
+
+def ngram_matches(filter_text: str, env: ClassVar, wanted: int, last_key: str,
+                  budget: ReadBudget) -> tuple:
+    """
+    Names after last_key containing filter_text, by a leapfrog intersection of
+    the postings of its n-grams started from the rarest one.  Posting pages are
+    read lazily, so the cost follows the matches returned and the names jumped
+    over rather than the length of the posting lists.
+    :param filter_text: substring to search for
+    :param env: passed environment
+    :param wanted: matches wanted
+    :param last_key: widget name to resume after, or ""
+    :param budget: read budget for this request, checked between candidates
+    :return: (matching names in name order, every name up to this one decided,
+              True when the postings are exhausted)
+    """
+    cursors = [PostingCursor(gram, env, budget) for gram in sorted(env.widget_ngrams(filter_text))]
+    heads = [cursor.seek(last_key, strict=True) for cursor in cursors]
+    if any(head is None for head in heads):
+        return [], last_key, True
+    cursors.sort(key=lambda cursor: cursor.rarity())
+
+    matches = []
+    decided = last_key
+    candidate = cursors[0].seek(last_key, strict=True)
+    while candidate is not None and len(matches) < wanted:
+        if budget.exhausted() and decided > last_key:
+            return matches, decided, False
+
+        # Every cursor jumps to the candidate, one ahead of it moves the candidate on
+        agreed = True
+        for cursor in cursors:
+            head = cursor.seek(candidate)
+            if head is None:
+                return matches, decided, True
+            if head != candidate:
+                decided = max(decided, candidate)
+                candidate = head
+                agreed = False
+                break
+        if not agreed:
+            continue
+
+        # All n-grams present does not guarantee they are adjacent, confirm the match
+        if filter_text in candidate:
+            matches.append(candidate)
+        decided = candidate
+        candidate = cursors[0].seek(candidate, strict=True)
+    return matches, decided, candidate is None
+
+
+def ngram_search(filter_text: str, env: ClassVar, scan_limit: int, last_key: str,
+                 budget: ReadBudget) -> tuple:
+    """
+    Intersect the postings of every n-gram of the filter and fetch only the matching
+    widgets.  Results are in widget name order, the resume key is the last name
+    decided, the last name returned or one rejected after it.
+    :param filter_text: substring to search for
+    :param env: passed environment
+    :param scan_limit: number of items wanted
+    :param last_key: widget name to resume after, or ""
+    :param budget: read budget for this request
+    :return: (widgets, next key)
+    """
+    # One match past the page tells whether another page follows
+    matches, decided, complete = ngram_matches(filter_text, env, scan_limit + 1, last_key,
+                                               budget)
+    page = matches[:scan_limit]
+    if len(matches) > scan_limit:
+        next_key = page[-1]
+    else:
+        next_key = "" if complete else decided
+
+    found = env.batch_get(env.ddb_table, [{env.ddb_pk: name} for name in page],
+                          env.ddb_pk + ", color") if len(page) > 0 else []
+    budget.scanned += len(found)
+    by_name = {item[env.ddb_pk]: env.ddb_to_widget(item) for item in found}
+    items = [by_name[name] for name in page if name in by_name]
+
+    return items, next_key
+
+
+def encode_segment_cursor(positions: list) -> str:
+    """
+    Encode per-segment scan positions as an opaque lastKey
+    :param positions: per segment "" (not started), widget name, or None (done)
+    :return: cursor string, "" when every segment is exhausted
+    """
+    if all(position is None for position in positions):
+        return ""
+    payload = json.dumps(positions, separators=(",", ":")).encode("utf-8")
+    return SEGMENT_CURSOR_PREFIX + urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_segment_cursor(cursor: str, total_segments: int) -> list:
+    """
+    Decode a composite cursor, or start every segment from the beginning
+    :param cursor: lastKey passed by the client
+    :param total_segments: segment count used when starting a new scan
+    :return: per segment positions
+    """
+    if not cursor.startswith(SEGMENT_CURSOR_PREFIX):
+        return [""] * total_segments
+    try:
+        payload = urlsafe_b64decode(cursor[len(SEGMENT_CURSOR_PREFIX):].encode("ascii"))
+        positions = json.loads(payload)
+    except ValueError as value_error:
+        raise Exception("NotAcceptable: Invalid lastKey") from value_error
+    if not isinstance(positions, list) or not 0 < len(positions) <= MAX_CURSOR_SEGMENTS or \
+            not all(position is None or isinstance(position, str) for position in positions):
+        raise Exception("NotAcceptable: Invalid lastKey")
+    return positions
+
+
+def scan_segment(scan_kwargs: dict, env: ClassVar, segment: int,
+                 total_segments: int, position: str) -> dict:
+    """
+    Read one page of one scan segment
+    :param scan_kwargs: shared scan parameters
+    :param env: passed environment
+    :param segment: segment number
+    :param total_segments: TotalSegments of the scan
+    :param position: widget name to resume after, "" to start the segment
+    :return: widget page from env.read_widgets
+    """
+    segment_kwargs = dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)
+    if len(position) > 0:
+        segment_kwargs["ExclusiveStartKey"] = {env.ddb_pk: position}
+    return env.read_widgets("scan", **segment_kwargs)
+
+
+def parallel_scan(scan_kwargs: dict, env: ClassVar, scan_limit: int, cursor: str,
+                  budget: ReadBudget) -> tuple:
+    """
+    Scan all segments concurrently, one page per segment per round, and merge the
+    results in segment order until scan_limit items are collected.  Segments whose
+    page is not (fully) used keep an exact resume position in the cursor.
+    :param scan_kwargs: shared scan parameters
+    :param env: passed environment
+    :param scan_limit: number of items wanted
+    :param cursor: composite cursor from the previous page, or ""
+    :param budget: read budget for this request
+    :return: (widgets, next cursor)
+    """
+    positions = decode_segment_cursor(cursor, env.scan_segments)
+    total_segments = len(positions)
+    items = []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(total_segments, env.scan_workers))) as pool:
+        while len(items) < scan_limit:
+            active = [segment for segment, position in enumerate(positions)
+                      if position is not None]
+            if len(active) == 0:
+                break
+
+            pages = list(pool.map(lambda segment: scan_segment(scan_kwargs, env, segment,
+                                                               total_segments, positions[segment]),
+                                  active))
+            for page in pages:
+                budget.charge(page)
+
+            # Merge in segment order so the same cursor always yields the same page
+            for segment, page in zip(active, pages):
+                room = scan_limit - len(items)
+                if room <= 0:
+                    # Page not used, the segment will re-read it from its position
+                    break
+                page_items = page["Widgets"]
+                items.extend(page_items[:room])
+                if len(page_items) > room:
+                    positions[segment] = page_items[room - 1]["widgetName"]
+                else:
+                    positions[segment] = page.get("LastEvaluatedKey", {}).get(env.ddb_pk, None)
+
+            if budget.exhausted():
+                break
+
+    return items, encode_segment_cursor(positions)
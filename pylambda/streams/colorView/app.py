@@ -0,0 +1,122 @@
+"""
+  Lambda Handler for the widget table stream
+  Function operation: keep the materialized per-color view in step with the widget table
+
+  Expects a DynamoDB stream batch with NEW_AND_OLD_IMAGES:
+    cloudformation/resources/lambda/streams/colorViewStreamLambda.yaml
+
+  INSERT adds the widget to its color, REMOVE takes it out, MODIFY moves it
+  when widget_put changed its color.  Records are applied in order; the first
+  failed record and everything after it is reported back in batchItemFailures,
+  so Lambda retries from there.  Replays are no-ops, see ColorView.  A change
+  that can never succeed (a validation error) is not retried: its color is
+  marked stale, so reports read the index, until tools/color_view repairs it.
+  The event source caps the retries of anything else and bisects the batch,
+  records still failing go to the on-failure queue.
+
+  The versions of the colors changed are bumped again once the view has them,
+  widget_put bumps before the view catches up and a report read in between
+  must not keep its ETag.
+"""
+
+from typing import Any, ClassVar
+import logging
+from lambdaDdbEnvLayer import EnvParams
+from lambdaVersions import color_scope
+from lambdaColorView import is_permanent
+from botocore.exceptions import ClientError
+
+#
+# Global ENV will enable 1 connection setup per lambda instantiation,
+# subsequent executions will re-use this connection for optimization.
+#
+GLOBAL_ENV = EnvParams()
+
+
+@GLOBAL_ENV.profiled
+def lambda_handler(event: dict, context: Any) -> dict:
+    """
+    Lambda Handler for the widget table stream
+
+    :param event: lambda event
+    :param context: lambda context
+    :return: partial batch response {batchItemFailures}
+    """
+    return apply_records(event, GLOBAL_ENV)
+
+
+def record_change(record: dict, env: ClassVar) -> tuple:
+    """
+    Widget name and color before and after one stream record
+    :param record: DynamoDB stream record
+    :param env: passed environment
+    :return: (widget name, old color or None, new color or None)
+    """
+    change = record["dynamodb"]
+    widget_name = change["Keys"][env.ddb_pk]["S"]
+    old_color = change.get("OldImage", {}).get("color", {}).get("S", None)
+    new_color = change.get("NewImage", {}).get("color", {}).get("S", None)
+    if record["eventName"] == "REMOVE":
+        new_color = None
+    return widget_name, old_color, new_color
+
+
+def apply_change(change: Any, color: str, widget_name: str, env: ClassVar):
+    """
+    Apply one membership change, a permanent failure marks the color stale
+    :param change: ColorView add or remove
+    :param color: color changed
+    :param widget_name: widget name
+    :param env: passed environment
+    :return: Nothing
+    """
+    try:
+        change(color, widget_name)
+    except ClientError as client_error:
+        if not is_permanent(client_error):
+            raise
+        # Retrying would block the shard, the reports of the color read the index
+        logging.error("Color view of %s is stale: %s", color, client_error.response)
+        env.color_view.mark_stale(color)
+
+
+def apply_records(event: dict, env: ClassVar) -> dict:
+    """
+    Apply a stream batch to the color view
+    :param event: DynamoDB stream batch
+    :param env: passed environment
+    :return: {batchItemFailures: [{itemIdentifier}]}
+    """
+    changed = set()
+    failures = []
+    for record in event.get("Records", []):
+        widget_name, old_color, new_color = record_change(record, env)
+        if old_color == new_color:
+            continue
+        try:
+            if old_color is not None:
+                apply_change(env.color_view.remove, old_color, widget_name, env)
+                changed.add(old_color)
+            if new_color is not None:
+                apply_change(env.color_view.add, new_color, widget_name, env)
+                changed.add(new_color)
+
+        except ClientError as client_error:
+            # AWS Service error handling, retry from this record
+            logging.error(client_error.response)
+            failures = [{"itemIdentifier": record["dynamodb"]["SequenceNumber"]}]
+            break
+
+    if env.versions is not None and len(changed) > 0:
+        try:
+            # TransactWriteItems takes at most 100 items
+            scopes = sorted(color_scope(color) for color in changed)
+            for start in range(0, len(scopes), 100):
+                env.versions.bump(scopes[start:start + 100])
+        except ClientError as client_error:
+            # Retry the whole batch, the view changes are idempotent
+            logging.error(client_error.response)
+            failures = [{"itemIdentifier":
+                         event["Records"][0]["dynamodb"]["SequenceNumber"]}]
+
+    return {"batchItemFailures": failures}
@@ -0,0 +1,190 @@
+"""
+  Lambda Handler for /widgets/batch PUT
+  Function operation: post or update many widgets [{ widgetName, color }, ...] in one call
+
+  Expects event[widgets] from the API GW body integration:
+    api/paths/widget/widgetBatchPut.yaml
+
+    requestTemplates:
+      "application/json": |
+          { "widgets" : $input.json('$.widgets') }
+
+  Returns a status per input widget, in request order:
+    written - stored
+    duplicate - superseded by a later entry with the same widgetName
+    invalid - missing widgetName or color
+    failed - still unprocessed after the BatchWriteItem retries
+"""
+
+from typing import Any, ClassVar
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from lambdaDdbEnvLayer import EnvParams
+from lambdaClientProfile import is_throttling
+from lambdaVersions import ALL_COLORS_SCOPE, TABLE_SCOPE
+from botocore.exceptions import ClientError
+
+# BatchWriteItem accepts at most 25 put requests
+BATCH_WRITE_SIZE = 25
+
+#
+# Global ENV will enable 1 connection setup per lambda instantiation,
+# subsequent executions will re-use this connection for optimization.
+#
+GLOBAL_ENV = EnvParams()
+
+
+@GLOBAL_ENV.profiled
+def lambda_handler(event: dict, context: Any) -> dict:
+    """
+    Lambda Handler for /widgets/batch PUT
+
+    :param event: lambda event
+    :param context: lambda context
+    :return: per widget status {metadata, results}
+    """
+
+    # One try-except block in lambda_handler for all AWS service calls
+    try:
+        return widget_batch_put(event, GLOBAL_ENV)
+
+    except ClientError as client_error:
+        # AWS Service error handling
+        logging.info('Context: %s %s', event, context)
+        logging.error(client_error.response)
+        if is_throttling(client_error):
+            # Throttled after the client retries, or refused by the circuit breaker
+            raise Exception("Throttled: Service Unavailable") from client_error
+        raise Exception("error: Internal Server Error") from client_error
+
+
+def is_valid_widget(widget: Any) -> bool:
+    """
+    Same validation as the single widget PUT
+    :param widget: one entry of the request
+    :return: True if widgetName and color are non-blank strings
+    """
+    return isinstance(widget, dict) and \
+        isinstance(widget.get("widgetName", None), str) and \
+        len(widget["widgetName"].strip()) > 0 and \
+        isinstance(widget.get("color", None), str) and \
+        len(widget["color"].strip()) > 0
+
+
+def widget_batch_put(event: dict, env: ClassVar) -> dict:
+    """
+    Validate, deduplicate and write a list of widgets
+    :param event: Lambda event Data
+    :param env: environment configuration
+    :return:
+    """
+    widgets = event.get("widgets", None)
+    if not isinstance(widgets, list) or len(widgets) == 0:
+        raise Exception("NotAcceptable: Invalid input for widgets")
+    if len(widgets) > env.batch_max_items:
+        raise Exception("NotAcceptable: More than %d widgets" % env.batch_max_items)
+
+    results = [None] * len(widgets)
+
+    # Last entry wins for a repeated widgetName, BatchWriteItem rejects
+    # duplicate keys in one request
+    latest = {}
+    for idx, widget in enumerate(widgets):
+        if not is_valid_widget(widget):
+            name = widget.get("widgetName", "") if isinstance(widget, dict) else ""
+            results[idx] = {"widgetName": name, "status": "invalid"}
+            continue
+        if widget["widgetName"] in latest:
+            results[latest[widget["widgetName"]]] = {"widgetName": widget["widgetName"],
+                                                      "status": "duplicate"}
+        latest[widget["widgetName"]] = idx
+
+    put_payloads = [env.widget_to_ddb(widgets[idx]) for idx in latest.values()]
+    failed = write_widgets(put_payloads, env)
+
+    for name, idx in latest.items():
+        if name in failed:
+            results[idx] = {"widgetName": name, "status": "failed", "message": failed[name]}
+        else:
+            results[idx] = {"widgetName": name, "status": "written"}
+
+    return {
+        "metadata": {
+            "message": "OK",
+            "count": len(results),
+            "written": len(latest) - len(failed),
+            "failed": len(failed)
+        },
+        "results": results
+    }
+
+
+def write_widgets(put_payloads: list, env: ClassVar) -> dict:
+    """
+    Write ddb items in 25 item BatchWriteItem chunks from several threads
+    :param put_payloads: ddb items with distinct keys
+    :param env: environment configuration
+    :return: {widgetName: reason} of the items that were not written
+    """
+    if len(put_payloads) == 0:
+        return {}
+
+    # New widgets get their name n-gram postings before the widgets are written,
+    # same as the single widget PUT
+    if env.ngram_table is not None:
+        put_ngram_postings([item[env.ddb_pk] for item in put_payloads], env)
+
+    chunks = [put_payloads[start:start + BATCH_WRITE_SIZE]
+              for start in range(0, len(put_payloads), BATCH_WRITE_SIZE)]
+    with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), env.batch_workers))) as pool:
+        chunk_failures = list(pool.map(lambda chunk: write_chunk(chunk, env), chunks))
+
+    # Old colors are unknown without reading every item, drop all color reports
+    if env.cache is not None:
+        env.cache.invalidate_many([("widget", item[env.ddb_pk]) for item in put_payloads])
+        env.cache.invalidate_namespace("color")
+
+    # Old colors are unknown here too, move every report ETag on
+    if env.versions is not None:
+        env.versions.bump([TABLE_SCOPE, ALL_COLORS_SCOPE])
+
+    failed = {}
+    for chunk_failure in chunk_failures:
+        failed.update(chunk_failure)
+    return failed
+
+
+def write_chunk(chunk: list, env: ClassVar) -> dict:
+    """
+    Write one chunk, a service error fails only the widgets of this chunk
+    :param chunk: up to 25 ddb items
+    :param env: environment configuration
+    :return: {widgetName: reason} of the items that were not written
+    """
+    try:
+        unprocessed = env.batch_write_chunk(env.ddb_table, chunk)
+    except ClientError as client_error:
+        logging.error(client_error.response)
+        reason = client_error.response.get("Error", {}).get("Code", "error")
+        return {item[env.ddb_pk]: reason for item in chunk}
+
+    return {item[env.ddb_pk]: "Unprocessed after retries" for item in unprocessed}
+
+
+def put_ngram_postings(widget_names: list, env: ClassVar):
+    """
+    Write the {gram, widgetName} postings of the widgets not stored yet
+    :param widget_names: distinct widget names
+    :param env: environment configuration
+    :return: Nothing
+    """
+    existing = env.batch_get(env.ddb_table, [{env.ddb_pk: name} for name in widget_names],
+                             env.ddb_pk)
+    existing_names = {item[env.ddb_pk] for item in existing}
+
+    with env.ngram_table.batch_writer() as batch:
+        for name in widget_names:
+            if name in existing_names:
+                continue
+            for gram in env.widget_ngrams(name):
+                batch.put_item(Item={"gram": gram, "widgetName": name})
@@ -16,7 +16,7 @@
 from typing import Any, ClassVar
 import logging
 from lambdaDdbEnvLayer import EnvParams
-from boto3.dynamodb.conditions import Key
+from lambdaClientProfile import is_throttling
 from botocore.exceptions import ClientError
 
 #
@@ -25,6 +25,7 @@ from botocore.exceptions import ClientError
 #
 GLOBAL_ENV = EnvParams()
 
+@GLOBAL_ENV.profiled
 def lambda_handler(event: dict, context: Any) -> dict:
     """
     Lambda Handler for /widget/{widgetName} GET
@@ -42,6 +43,9 @@ def lambda_handler(event: dict, context: Any) -> dict:
         # AWS Service error handling
         logging.info('Context: %s %s', event, context)
         logging.error(client_error.response)
+        if is_throttling(client_error):
+            # Throttled after the client retries, or refused by the circuit breaker
+            raise Exception("Throttled: Service Unavailable") from client_error
         raise Exception("error: Internal Server Error") from client_error
 
 
@@ -60,15 +64,24 @@ def widget_get(event: dict, env: ClassVar) -> dict:
         # Validate the input, otherwise throw NotAcceptable
         raise Exception("NotAcceptable: Invalid input")
 
-    # Dynamo DB query through the ENV object to facilitate mock/test
-    db_response = env.ddb_table.query(
-        KeyConditionExpression=Key(env.ddb_pk).eq(event["widgetName"]),
-        Limit=1
+    # Warm containers serve hot widgets from the in-process cache
+    if env.cache is not None:
+        widget = env.cache.get(("widget", event["widgetName"]))
+        if widget is not None:
+            return widget
+
+    # Dynamo DB key lookup through the ENV object to facilitate mock/test
+    db_response = env.ddb_table.get_item(
+        Key={env.ddb_pk: event["widgetName"]}
     )
 
-    if 'Items' not in db_response or len(db_response['Items']) == 0:
+    if 'Item' not in db_response:
         # No return, throw NotFound
         raise Exception("NotFound: Item not located in DDB")
 
     # Convert DynamoDB entry to widget using centralized lambda layer method
-    return env.ddb_to_widget(db_response['Items'][0])
+    widget = env.ddb_to_widget(db_response['Item'])
+    if env.cache is not None:
+        env.cache.put(("widget", event["widgetName"]), widget)
+
+    return widget
@@ -0,0 +1,119 @@
+"""
+  Lambda Handler for /widgets/lookup POST
+  Function operation: retrieve many widgets by widgetName in one call
+
+  Expects event[widgetNames] from the API GW body integration:
+    api/paths/widget/widgetLookupPost.yaml
+
+    requestTemplates:
+      "application/json": |
+          { "widgetNames" : $input.json('$.widgetNames') }
+
+  Returns one entry per requested name, in request order, with status
+  found (widgetName, color) or notFound (widgetName only).
+"""
+
+from typing import Any, ClassVar
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from lambdaDdbEnvLayer import EnvParams
+from lambdaClientProfile import is_throttling
+from botocore.exceptions import ClientError
+
+# BatchGetItem accepts at most 100 keys
+BATCH_GET_SIZE = 100
+
+#
+# Global ENV will enable 1 connection setup per lambda instantiation,
+# subsequent executions will re-use this connection for optimization.
+#
+GLOBAL_ENV = EnvParams()
+
+
+@GLOBAL_ENV.profiled
+def lambda_handler(event: dict, context: Any) -> dict:
+    """
+    Lambda Handler for /widgets/lookup POST
+
+    :param event: lambda event
+    :param context: lambda context
+    :return: widget records in request order {metadata, results}
+    """
+
+    # One try-except block in lambda_handler for all AWS service calls
+    try:
+        return widget_lookup(event, GLOBAL_ENV)
+
+    except ClientError as client_error:
+        # AWS Service error handling
+        logging.info('Context: %s %s', event, context)
+        logging.error(client_error.response)
+        if is_throttling(client_error):
+            # Throttled after the client retries, or refused by the circuit breaker
+            raise Exception("Throttled: Service Unavailable") from client_error
+        raise Exception("error: Internal Server Error") from client_error
+
+
+def widget_lookup(event: dict, env: ClassVar) -> dict:
+    """
+    Resolve a list of widget names
+    :param event: lambda event dictionary
+    :param env: passed environment
+    :return:
+    """
+    names = event.get("widgetNames", None)
+    if not isinstance(names, list) or len(names) == 0 or \
+            not all(isinstance(name, str) and len(name.strip()) > 0 for name in names):
+        # Validate the input, otherwise throw NotAcceptable
+        raise Exception("NotAcceptable: Invalid input for widgetNames")
+    if len(names) > env.lookup_max_names:
+        raise Exception("NotAcceptable: More than %d widgetNames" % env.lookup_max_names)
+
+    # Repeated names are fetched once, hot widgets come from the cache
+    unique = list(dict.fromkeys(names))
+    found = {}
+    if env.cache is not None:
+        cached = env.cache.get_many([("widget", name) for name in unique])
+        found = {key[1]: widget for key, widget in cached.items()}
+    to_fetch = [name for name in unique if name not in found]
+
+    for widget in fetch_widgets(to_fetch, env):
+        found[widget["widgetName"]] = widget
+        if env.cache is not None:
+            env.cache.put(("widget", widget["widgetName"]), widget)
+
+    results = []
+    for name in names:
+        if name in found:
+            results.append(dict(found[name], status="found"))
+        else:
+            results.append({"widgetName": name, "status": "notFound"})
+
+    return {
+        "metadata": {
+            "message": "OK",
+            "count": len(results),
+            "found": sum(1 for result in results if result["status"] == "found")
+        },
+        "results": results
+    }
+
+
+def fetch_widgets(names: list, env: ClassVar) -> list:
+    """
+    BatchGetItem the names in 100 key chunks issued concurrently
+    :param names: distinct widget names
+    :param env: passed environment
+    :return: widgets found, in no particular order
+    """
+    if len(names) == 0:
+        return []
+
+    requests = [{"Keys": [{env.ddb_pk: name} for name in names[start:start + BATCH_GET_SIZE]],
+                 "ProjectionExpression": env.ddb_pk + ", color"}
+                for start in range(0, len(names), BATCH_GET_SIZE)]
+    with ThreadPoolExecutor(max_workers=max(1, min(len(requests), env.batch_workers))) as pool:
+        chunks = list(pool.map(lambda request: env.batch_get_chunk(env.ddb_table, request),
+                               requests))
+
+    return [env.ddb_to_widget(item) for chunk in chunks for item in chunk]
@@ -17,6 +17,8 @@
 from typing import Any, ClassVar
 import logging
 from lambdaDdbEnvLayer import EnvParams
+from lambdaClientProfile import is_throttling
+from lambdaVersions import TABLE_SCOPE, color_scope
 from botocore.exceptions import ClientError
 
 #
@@ -26,6 +28,7 @@ from botocore.exceptions import ClientError
 GLOBAL_ENV = EnvParams()
 
 
+@GLOBAL_ENV.profiled
 def lambda_handler(event: dict, context: Any) -> dict:
     """
     Lambda Handler for /widget PUT
@@ -43,6 +46,9 @@ def lambda_handler(event: dict, context: Any) -> dict:
         # AWS Service error handling
         logging.info('Context: %s %s', event, context)
         logging.error(client_error.response)
+        if is_throttling(client_error):
+            # Throttled after the client retries, or refused by the circuit breaker
+            raise Exception("Throttled: Service Unavailable") from client_error
         raise Exception("error: Internal Server Error") from client_error
 
 
@@ -65,12 +71,51 @@ def widget_put(event: dict, env: ClassVar) -> dict:
 
     put_payload = env.widget_to_ddb(event)
 
-    # Dynamo DB query through the ENV object to facilitate mock/test
-    env.ddb_table.update_item(
-        Key={'PK': put_payload[env.ddb_pk]},
-        UpdateExpression='SET color = :value',
-        ExpressionAttributeValues={
-            ':value': put_payload["color"]
-        })
+    # New widgets get their name n-gram postings before the widget itself is
+    # written, so a stored widget is always findable by substring
+    if env.ngram_table is not None:
+        existing = env.ddb_table.get_item(
+            Key={env.ddb_pk: put_payload[env.ddb_pk]},
+            ProjectionExpression="#pk",
+            ExpressionAttributeNames={"#pk": env.ddb_pk})
+        if "Item" not in existing:
+            put_ngram_postings(put_payload[env.ddb_pk], env)
+
+    # Dynamo DB query through the ENV object to facilitate mock/test.  Every
+    # non-key attribute of the item is set, color and the sharded color key
+    attributes = sorted(name for name in put_payload if name != env.ddb_pk)
+    db_response = env.ddb_table.update_item(
+        Key={env.ddb_pk: put_payload[env.ddb_pk]},
+        UpdateExpression='SET ' + ', '.join('#%s = :%s' % (name, name) for name in attributes),
+        ExpressionAttributeNames={'#' + name: name for name in attributes},
+        ExpressionAttributeValues={':' + name: put_payload[name] for name in attributes},
+        ReturnValues='UPDATED_OLD')
+
+    # Drop cached reads of this widget and of its old and new color reports
+    old_color = db_response.get("Attributes", {}).get("color", None)
+    if env.cache is not None:
+        env.cache.invalidate(("widget", put_payload[env.ddb_pk]))
+        env.cache.invalidate(("color", put_payload["color"]))
+        if old_color is not None:
+            env.cache.invalidate(("color", old_color))
+
+    # New report ETags for the table and the old and new color
+    if env.versions is not None:
+        scopes = [TABLE_SCOPE, color_scope(put_payload["color"])]
+        if old_color is not None:
+            scopes.append(color_scope(old_color))
+        env.versions.bump(scopes)
 
     return env.ddb_to_widget(put_payload)
+
+
+def put_ngram_postings(widget_name: str, env: ClassVar):
+    """
+    Write the {gram, widgetName} postings of a widget name to the n-gram table
+    :param widget_name: name of the widget
+    :param env: environment configuration
+    :return: Nothing
+    """
+    with env.ngram_table.batch_writer() as batch:
+        for gram in env.widget_ngrams(widget_name):
+            batch.put_item(Item={"gram": gram, "widgetName": widget_name})
@@ -0,0 +1,217 @@
+"""
+    Test Suite for benchmarks/apigw
+"""
+
+# Standard Imports
+from sys import path
+import json
+import unittest
+from unittest.mock import patch
+
+import boto3
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_meta_ddb_table
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from benchmarks.apigw import ApiGateway
+from benchmarks.apigw import InputVariable
+from benchmarks.apigw import UtilVariable
+from benchmarks.apigw import VtlTemplate
+from benchmarks.apigw import lambda_handlers
+from benchmarks.apigw import load_api
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaVersions import VersionTracker
+from pylambda.reports.color.app import colors_lambda_handler as colors_handler
+from pylambda.reports.color.app import lambda_handler as color_handler
+
+
+class TestVtlTemplate(unittest.TestCase):
+    """
+    Test Suite for the mapping template subset
+    """
+
+    def test_render(self):
+        """
+        #set, #if / #else, #foreach with $foreach.hasNext, undefined references
+        :return:
+        """
+        template = VtlTemplate(
+            "#set($root = $input.path('$'))"
+            "#if($root.items)[#foreach($item in $root.items)\"$item.name\""
+            "#if($foreach.hasNext),#end#end]#else none#end|$root.missing|$!root.count")
+        body = json.dumps({"items": [{"name": "a"}, {"name": "b"}], "count": 2})
+        assert template.render({"input": InputVariable(body)}) == '["a","b"]||2'
+        assert template.render({"input": InputVariable("{}")}) == " none||"
+
+        context = {}
+        VtlTemplate("#set($tag = 'NotModified: abc')"
+                    "#set($context.responseOverride.header.ETag = $tag.substring(13))"
+                    ).render({"context": context})
+        assert context == {"responseOverride": {"header": {"ETag": "abc"}}}
+
+    def test_input_and_util(self):
+        """
+        $input.params is case-insensitive for headers, escapeJavaScript escapes quotes
+        :return:
+        """
+        variables = {"input": InputVariable('{"a": {"b": [1, 2]}}', {
+            "path": {"color": "red"}, "querystring": {"limit": "5"},
+            "header": {"If-None-Match": '"x"'}}), "util": UtilVariable()}
+        template = VtlTemplate("$input.params('color') $input.params('limit') "
+                               "$util.escapeJavaScript($input.params('if-none-match')) "
+                               "$input.json('$.a.b') $input.params('absent')|")
+        assert template.render(variables) == 'red 5 \\"x\\" [1, 2] |'
+        assert UtilVariable.escapeJavaScript("it's\n") == "it\\'s\\n"
+
+
+class TestApiGateway(unittest.TestCase):
+    """
+    Test Suite for the request/response mapping of the gateway
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        self.definition = load_api()
+
+    def test_load(self):
+        """
+        References are inlined, parameter siblings kept, handlers found in the template
+        :return:
+        """
+        parameters = self.definition["paths"]["/reports/color/{color}"]["get"]["parameters"]
+        assert parameters[0]["name"] == "color" and parameters[0]["in"] == "path"
+        handlers = lambda_handlers()
+        assert handlers["ReportsColorLambda"] == ("pylambda.reports.color.app", "lambda_handler")
+        assert handlers["reportsFilterPageLambda"][0] == "pylambda.reports.filterPage.app"
+
+    def test_error_mapping(self):
+        """
+        Lambda errors select the integration response by errorMessage
+        :return:
+        """
+        def failing(event, context):
+            raise Exception(event["color"])
+
+        gateway = ApiGateway(self.definition, {name: failing for name in lambda_handlers()})
+        response = gateway.request("GET", "/reports/color/NotFound: none")
+        assert response["status"] == 400 and response["pattern"] == "NotFound.*"
+        response = gateway.request("GET", "/reports/color/error: Internal Server Error")
+        assert response["status"] == 500
+        response = gateway.request("GET", "/reports/color/Unexpected")
+        assert response["status"] == 200 and response["pattern"] == "default"
+        assert response["error"] == "Unexpected"
+
+        assert gateway.request("GET", "/nowhere")["status"] == 404
+        assert gateway.request("DELETE", "/widget")["status"] == 404
+
+
+@mock_dynamodb
+class TestApiGatewayHandlers(unittest.TestCase):
+    """
+    Requests through the templates to a real handler
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+        for idx in range(3):
+            self.mock_table.put_item(Item={"testing_ddb_pk": "TEST%03d" % idx,
+                                           "color": "blue"})
+        self.test_env = EnvParams()
+        self.test_env.ddb_table = self.mock_table
+        self.test_env.ddb_limit = 10
+        self.gateway = ApiGateway(load_api(), {"ReportsColorLambda": color_handler,
+                                               "ReportsColorsLambda": colors_handler})
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        :return:
+        """
+        self.mock_table.delete()
+
+    def test_color_report(self):
+        """
+        Request template event, JSON and columnar response templates, paging metadata
+        :return:
+        """
+        with patch('pylambda.reports.color.app.GLOBAL_ENV', new=self.test_env):
+            response = self.gateway.request("GET", "/reports/color/blue")
+            assert response["status"] == 200 and response["valid_json"]
+            assert [widget["widgetName"] for widget in json.loads(response["body"])[
+                "widgetList"]] == ["TEST000", "TEST001", "TEST002"]
+
+            response = self.gateway.request("GET", "/reports/color/blue", {"limit": "2"})
+            document = json.loads(response["body"])
+            assert document["metadata"]["next"] == "TEST001"
+            assert len(document["widgetList"]) == 2
+
+            response = self.gateway.request(
+                "GET", "/reports/color/blue",
+                headers={"Accept": "application/vnd.widgets.columnar+json"})
+            assert response["headers"]["Content-Type"] == "application/vnd.widgets.columnar+json"
+            assert json.loads(response["body"])["dictionary"]["color"] == ["blue"]
+
+            response = self.gateway.request("GET", "/reports/color/green")
+            assert response["status"] == 400 and response["error"].startswith("NotFound")
+
+    def test_colors_report(self):
+        """
+        Multi-color report groups through the nested response template loops
+        :return:
+        """
+        self.mock_table.put_item(Item={"testing_ddb_pk": "TEST100", "color": "red"})
+        with patch('pylambda.reports.color.app.GLOBAL_ENV', new=self.test_env):
+            response = self.gateway.request("GET", "/reports/colors",
+                                            {"color": ["red", "blue"]})
+            assert response["status"] == 200 and response["valid_json"]
+            document = json.loads(response["body"])
+            assert [group["color"] for group in document["colors"]] == ["red", "blue"]
+            assert document["colors"][1]["count"] == 3 and document["colors"][1]["complete"]
+            assert document["metadata"]["count"] == 4
+
+            response = self.gateway.request("GET", "/reports/colors", {"color": "green"})
+            assert response["status"] == 400 and response["error"].startswith("NotFound")
+
+            response = self.gateway.request("GET", "/reports/colors", {"color": [""]})
+            assert response["status"] == 406
+
+            # Every value is one color, commas included
+            self.mock_table.put_item(Item={"testing_ddb_pk": "TEST200", "color": "red,blue"})
+            response = self.gateway.request("GET", "/reports/colors", {"color": "red,blue"})
+            document = json.loads(response["body"])
+            assert [group["color"] for group in document["colors"]] == ["red,blue"]
+            assert document["metadata"]["count"] == 1
+
+    def test_not_modified(self):
+        """
+        304 with the current ETag and no body for a matching If-None-Match
+        :return:
+        """
+        self.test_env.versions = VersionTracker(create_mock_meta_ddb_table(self.mock_dynamodb))
+        with patch('pylambda.reports.color.app.GLOBAL_ENV', new=self.test_env):
+            response = self.gateway.request("GET", "/reports/color/blue")
+            etag = response["headers"]["ETag"]
+            assert response["status"] == 200 and etag.startswith('"')
+
+            response = self.gateway.request("GET", "/reports/color/blue",
+                                            headers={"If-None-Match": etag})
+            assert response["status"] == 304 and response["pattern"] == "NotModified.*"
+            assert response["headers"]["ETag"] == etag
+            assert response["body"] == ""
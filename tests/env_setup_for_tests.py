@@ -17,6 +17,10 @@ def env_setup_for_tests():
     environ['DynamoDefaultLimit'] = "1"
     environ['DynamoIndexColor'] = "testing_color_idx"
     environ['DynamoIndexColorKey'] = "color"
+    environ['DynamoIndexColorShard'] = "testing_color_shard_idx"
+    environ['DynamoIndexColorShardKey'] = "colorShard"
+    environ['DynamoIndexName'] = "testing_name_idx"
+    environ['DynamoIndexNameBucketKey'] = "nameBucket"
 
 def create_mock_widget_ddb_table(dynamodb=None):
     """
@@ -36,7 +40,9 @@ def create_mock_widget_ddb_table(dynamodb=None):
         ],
         AttributeDefinitions=[
             {"AttributeName": environ["DynamoPartitionKey"], "AttributeType": "S"},
-            {"AttributeName": "color", "AttributeType": "S"}
+            {"AttributeName": "color", "AttributeType": "S"},
+            {"AttributeName": environ['DynamoIndexColorShardKey'], "AttributeType": "S"},
+            {"AttributeName": environ['DynamoIndexNameBucketKey'], "AttributeType": "S"}
         ],
         ProvisionedThroughput={
             "ReadCapacityUnits": 10,
@@ -53,8 +59,123 @@ def create_mock_widget_ddb_table(dynamodb=None):
                     "ReadCapacityUnits": 10,
                     "WriteCapacityUnits": 10,
                 },
+            },
+            {
+                "IndexName": environ['DynamoIndexColorShard'],
+                "KeySchema": [
+                    {"AttributeName": environ['DynamoIndexColorShardKey'], "KeyType": "HASH"},
+                    {"AttributeName": environ["DynamoPartitionKey"], "KeyType": "RANGE"}
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+                "ProvisionedThroughput": {
+                    "ReadCapacityUnits": 10,
+                    "WriteCapacityUnits": 10,
+                },
+            },
+            {
+                "IndexName": environ['DynamoIndexName'],
+                "KeySchema": [
+                    {"AttributeName": environ['DynamoIndexNameBucketKey'], "KeyType": "HASH"},
+                    {"AttributeName": environ["DynamoPartitionKey"], "KeyType": "RANGE"}
+                ],
+                "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": ["color"]},
+                "ProvisionedThroughput": {
+                    "ReadCapacityUnits": 10,
+                    "WriteCapacityUnits": 10,
+                },
             }
         ],
     )
 
     return table
+
+
+def create_mock_ngram_ddb_table(dynamodb=None, table_name="testing_ngram"):
+    """
+    Create the widget name n-gram postings table for unit testing
+    :param dynamodb: DynamoDB resource for table creation
+    :param table_name: name of the table
+    :return:
+    """
+    if not dynamodb:
+        dynamodb = boto3.resource(
+            "dynamodb", endpoint_url="http://localhost:8000"
+        )
+
+    table = dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": "gram", "KeyType": "HASH"},
+            {"AttributeName": "widgetName", "KeyType": "RANGE"}
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "gram", "AttributeType": "S"},
+            {"AttributeName": "widgetName", "AttributeType": "S"}
+        ],
+        ProvisionedThroughput={
+            "ReadCapacityUnits": 10,
+            "WriteCapacityUnits": 10,
+        },
+    )
+
+    return table
+
+
+def create_mock_color_view_ddb_table(dynamodb=None, table_name="testing_color_view"):
+    """
+    Create the materialized color view table for unit testing
+    :param dynamodb: DynamoDB resource for table creation
+    :param table_name: name of the table
+    :return:
+    """
+    if not dynamodb:
+        dynamodb = boto3.resource(
+            "dynamodb", endpoint_url="http://localhost:8000"
+        )
+
+    table = dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": "color", "KeyType": "HASH"},
+            {"AttributeName": "part", "KeyType": "RANGE"}
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "color", "AttributeType": "S"},
+            {"AttributeName": "part", "AttributeType": "S"}
+        ],
+        ProvisionedThroughput={
+            "ReadCapacityUnits": 10,
+            "WriteCapacityUnits": 10,
+        },
+    )
+
+    return table
+
+
+def create_mock_meta_ddb_table(dynamodb=None, table_name="testing_meta"):
+    """
+    Create the meta table (data versions) for unit testing
+    :param dynamodb: DynamoDB resource for table creation
+    :param table_name: name of the table
+    :return:
+    """
+    if not dynamodb:
+        dynamodb = boto3.resource(
+            "dynamodb", endpoint_url="http://localhost:8000"
+        )
+
+    table = dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": "metaKey", "KeyType": "HASH"}
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "metaKey", "AttributeType": "S"}
+        ],
+        ProvisionedThroughput={
+            "ReadCapacityUnits": 10,
+            "WriteCapacityUnits": 10,
+        },
+    )
+
+    return table
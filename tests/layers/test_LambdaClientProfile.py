@@ -0,0 +1,183 @@
+"""
+    Test Suite for /layers/lambdaClientProfile
+"""
+# Standard Imports
+
+from os import environ
+from sys import path
+import unittest
+
+import boto3
+from botocore.exceptions import ClientError, EndpointConnectionError, ParamValidationError
+from botocore.exceptions import ReadTimeoutError
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaClientProfile import CircuitBreaker
+from pylambda.layers.lambdaDdbEnv.python.lambdaClientProfile import is_throttling
+
+
+def throttle(operation: str = "Query") -> ClientError:
+    """
+    :param operation: failed call
+    :return: error DynamoDB returns once the client retries are spent
+    """
+    return ClientError({"Error": {"Code": "ProvisionedThroughputExceededException",
+                                  "Message": "Rate exceeded"}}, operation)
+
+
+class FakeClock:
+    """
+    Settable time source
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Test Suite for the circuit breaker states
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(3, 10, 5, self.clock)
+
+    def test_opens_on_throttles(self):
+        """
+        threshold throttles within the window open the breaker, older ones expire
+        """
+        self.breaker.failure(throttle())
+        self.breaker.failure(ClientError({"Error": {"Code": "ValidationException"}}, "Query"))
+        self.breaker.failure(throttle())
+        self.clock.now += 11
+        self.breaker.failure(throttle())
+        assert self.breaker.state == "closed"
+
+        self.breaker.failure(throttle())
+        self.breaker.failure(throttle())
+        assert self.breaker.state == "open"
+        with self.assertRaises(ClientError) as context:
+            self.breaker.before_call("query")
+        assert is_throttling(context.exception)
+        assert context.exception.response["Error"]["Code"] == "CircuitOpen"
+
+    def test_half_open_trial(self):
+        """
+        After the cooldown one trial call decides: success closes, a throttle reopens
+        """
+        for _ in range(3):
+            self.breaker.failure(throttle())
+        self.clock.now += 5
+        assert self.breaker.state == "half-open"
+        self.breaker.before_call("query")
+        with self.assertRaises(ClientError):
+            self.breaker.before_call("query")
+        self.breaker.failure(throttle())
+        assert self.breaker.state == "open"
+
+        self.clock.now += 5
+        self.breaker.before_call("query")
+        self.breaker.success()
+        assert self.breaker.state == "closed"
+        self.breaker.before_call("query")
+
+    def test_trial_timeout(self):
+        """
+        A trial call that times out reopens the breaker, any other error gives the
+        trial back, so a later trial is still admitted
+        """
+        calls = []
+
+        def timing_out(**kwargs):
+            calls.append(kwargs)
+            raise ReadTimeoutError(endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
+
+        guarded = self.breaker.wrap(type("Client", (), {"query": staticmethod(timing_out)})())
+        for _ in range(3):
+            self.breaker.failure(EndpointConnectionError(endpoint_url="https://dynamodb"))
+        assert self.breaker.state == "open"
+
+        self.clock.now += 5
+        with self.assertRaises(ReadTimeoutError):
+            guarded.query(TableName="widgets")
+        assert self.breaker.state == "open" and len(calls) == 1
+
+        self.clock.now += 5
+        assert self.breaker.state == "half-open"
+        self.breaker.before_call("query")
+        self.breaker.failure(ParamValidationError(report="bad"))
+        assert self.breaker.state == "closed"
+        self.breaker.before_call("query")
+
+
+@mock_dynamodb
+class TestClientProfile(unittest.TestCase):
+    """
+    Test Suite for the client profile of EnvParams
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+        for name in ("DynamoBreakerThreshold", "DynamoMaxPoolConnections"):
+            environ.pop(name, None)
+
+    def test_config(self):
+        """
+        Pool size derived from the thread settings unless set, adaptive retries
+        """
+        env = EnvParams()
+        config = env.client_config
+        assert config.max_pool_connections >= max(10, env.scan_workers, env.batch_workers) + 1
+        assert config.retries == {"mode": "adaptive", "max_attempts": 4}
+        assert config.read_timeout == 5 and config.connect_timeout == 1
+        assert config.tcp_keepalive
+        assert env.breaker is None and env.guard(self.mock_table) is self.mock_table
+
+        environ["DynamoMaxPoolConnections"] = "32"
+        env = EnvParams()
+        assert env.client.meta.config.max_pool_connections == 32
+        assert env.client.meta.config.retries["mode"] == "adaptive"
+
+    def test_breaker_guards_tables(self):
+        """
+        Tables, the client and the batch calls fail fast once the breaker is open
+        """
+        environ["DynamoBreakerThreshold"] = "1"
+        env = EnvParams()
+        env.dynamodb = env.guard(self.mock_dynamodb)
+        env.ddb_table.put_item(Item={"testing_ddb_pk": "TEST001", "color": "blue"})
+
+        env.breaker.failure(throttle())
+        for call in (lambda: env.ddb_table.get_item(Key={"testing_ddb_pk": "TEST001"}),
+                     lambda: env.batch_get(env.ddb_table, [{"testing_ddb_pk": "TEST001"}])):
+            with self.assertRaises(ClientError) as context:
+                call()
+            assert context.exception.response["Error"]["Code"] == "CircuitOpen"
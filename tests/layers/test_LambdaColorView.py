@@ -0,0 +1,138 @@
+"""
+    Test Suite for /layers/lambdaColorView
+"""
+# Standard Imports
+
+from sys import path
+import unittest
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_color_view_ddb_table
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaColorView import ColorView
+from pylambda.layers.lambdaDdbEnv.python.lambdaColorView import is_permanent
+
+
+@mock_dynamodb
+class TestLambdaColorView(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaColorView
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_color_view_ddb_table(self.mock_dynamodb)
+        self.view = ColorView(self.mock_table, 4)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_add_remove(self):
+        """
+        Members and counts, replayed changes are no-ops
+        """
+        names = ["TEST%03d" % idx for idx in range(10)]
+        for name in names:
+            assert self.view.add("blue", name)
+        assert not self.view.add("blue", "TEST000")
+        assert self.view.add("red", "TEST000")
+
+        assert self.view.members("blue") == names
+        assert self.view.counts() == {"blue": 10, "red": 1}
+        assert len({self.view.chunk_part(name) for name in names}) > 1
+
+        assert self.view.remove("red", "TEST000")
+        assert not self.view.remove("red", "TEST000")
+        assert self.view.members("red") == []
+        assert self.view.counts() == {"blue": 10}
+
+    def chunk_sizes(self, color: str) -> list:
+        """
+        :return: member count of every chunk item of a color
+        """
+        return [len(item["members"]) for item in self.mock_table.scan()["Items"]
+                if item["color"] == color and item["part"].startswith("chunk#")]
+
+    def test_split(self):
+        """
+        Chunks split as the color grows, a writer with an old layout catches up
+        """
+        view = ColorView(self.mock_table, 2, max_members=4)
+        other = ColorView(self.mock_table, 2, max_members=4)
+        assert other.add("blue", "FIRST")
+
+        names = ["TEST%03d" % idx for idx in range(60)]
+        for name in names:
+            assert view.add("blue", name)
+        assert len(self.chunk_sizes("blue")) >= 30
+        assert max(self.chunk_sizes("blue")) <= 8
+
+        # The old layout is refused and refreshed
+        assert not other.add("blue", "TEST010")
+        assert other.add("blue", "LAST")
+        assert view.members("blue") == sorted(names + ["FIRST", "LAST"])
+        assert view.counts() == {"blue": 62}
+
+        for name in names + ["FIRST", "LAST"]:
+            assert other.remove("blue", name)
+        assert view.members("blue") == []
+        assert view.counts() == {}
+
+    def test_stale(self):
+        """
+        A stale color has no members until the count is repaired
+        """
+        self.view.add("blue", "TEST001")
+        self.view.mark_stale("blue")
+        assert self.view.members("blue") is None
+        assert self.view.members("blue", stale_ok=True) == ["TEST001"]
+        self.view.set_count("blue", 1)
+        assert self.view.members("blue") == ["TEST001"]
+
+        assert is_permanent(ClientError({"Error": {"Code": "ValidationException"}}, "UpdateItem"))
+        assert is_permanent(ClientError({"Error": {"Code": "TransactionCanceledException"},
+                                         "CancellationReasons": [{"Code": "ValidationError"},
+                                                                 {"Code": "None"}]},
+                                        "TransactWriteItems"))
+        assert not is_permanent(ClientError(
+            {"Error": {"Code": "ProvisionedThroughputExceededException"}}, "TransactWriteItems"))
+
+    def test_replace(self):
+        """
+        Rebuild overwrite drops stale chunks and fixes the count
+        """
+        for name in ["OLD1", "OLD2", "KEEP"]:
+            self.view.add("blue", name)
+        self.view.replace("blue", ["KEEP", "NEW1"])
+        assert self.view.members("blue") == ["KEEP", "NEW1"]
+        assert self.view.counts() == {"blue": 2}
+
+        self.view.replace("blue", [])
+        assert self.view.members("blue") == []
+        assert self.view.counts() == {}
+        assert self.view.colors() == {"blue"}
+
+        # A large color is laid out for its size, later changes keep the layout
+        view = ColorView(self.mock_table, 2, max_members=4)
+        names = ["TEST%03d" % idx for idx in range(40)]
+        view.replace("green", names)
+        assert max(self.chunk_sizes("green")) <= 8
+        assert view.remove("green", "TEST007")
+        assert not view.add("green", "TEST008")
+        assert view.members("green") == [name for name in names if name != "TEST007"]
@@ -3,16 +3,26 @@
 """
 # Standard Imports
 
+from sys import path
+from os import environ
 import unittest
+from unittest.mock import patch
+
+from time import sleep
 
 import boto3
+from botocore.exceptions import ClientError
 from moto import mock_dynamodb
 
 # Common test helper utilities for setup
 from tests.env_setup_for_tests import env_setup_for_tests
 from tests.env_setup_for_tests import create_mock_widget_ddb_table
 
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
 from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import ReadBudget
 
 
 @mock_dynamodb
@@ -48,6 +58,28 @@ class TestLambdaDdbEnvLayer(unittest.TestCase):
         response = self.env_params.widget_to_ddb(widget)
         self.assertEqual(response, {"testing_ddb_pk": "Super Widget", "color": "Red"})
 
+    def test_widget_to_ddb_sharded(self):
+        """
+        Test the sharded color key is derived from the widget name
+        """
+        self.env_params.color_shards = 4
+        response = self.env_params.widget_to_ddb({"widgetName": "Super Widget", "color": "Red"})
+        assert response["colorShard"] in self.env_params.color_shard_keys("Red")
+        assert response["colorShard"] == self.env_params.color_shard("Super Widget", "Red")
+        assert len(set(self.env_params.color_shard("W%d" % idx, "Red")
+                       for idx in range(50))) == 4
+
+    def test_widget_to_ddb_name_bucket(self):
+        """
+        Test the name index bucket is derived from the widget name
+        """
+        self.env_params.name_buckets = 4
+        response = self.env_params.widget_to_ddb({"widgetName": "Super Widget", "color": "Red"})
+        assert response["nameBucket"] in self.env_params.name_bucket_keys()
+        assert response["nameBucket"] == self.env_params.name_bucket("Super Widget")
+        assert "colorShard" not in response
+        assert len(set(self.env_params.name_bucket("W%d" % idx) for idx in range(50))) == 4
+
     def test_ddb_to_widget(self):
         """
         Test convert from DB object to widget
@@ -55,3 +87,156 @@ class TestLambdaDdbEnvLayer(unittest.TestCase):
         db_object = {"testing_ddb_pk": "Super Widget", "color": "Red"}
         response = self.env_params.ddb_to_widget(db_object)
         self.assertEqual(response, {"widgetName": "Super Widget", "color": "Red"})
+
+    def test_wire_mapper(self):
+        """
+        Test the cached DynamoDB JSON to widget mapper
+        """
+        mapper = self.env_params.wire_mapper(self.env_params.widget_attributes)
+        assert mapper is self.env_params.wire_mapper(self.env_params.widget_attributes)
+        wire_item = {"testing_ddb_pk": {"S": "Super Widget"}, "color": {"S": "Red"}}
+        self.assertEqual(mapper(wire_item), {"widgetName": "Super Widget", "color": "Red"})
+
+    def test_read_widgets(self):
+        """
+        Resource and client fast path return the same widget pages
+        """
+        for idx in range(5):
+            self.mock_table.put_item(Item={"testing_ddb_pk": "TEST%03d" % idx, "color": "blue"})
+        self.env_params.client = boto3.client('dynamodb', region_name='us-east-1')
+
+        pages = {}
+        for fast_path in (False, True):
+            self.env_params.fast_path = fast_path
+            scan_kwargs = {"Limit": 2, "FilterExpression": "#c = :c",
+                           "ExpressionAttributeNames": {"#c": "color"},
+                           "ExpressionAttributeValues": {":c": "blue"}}
+            pages[fast_path] = []
+            while True:
+                page = self.env_params.read_widgets("scan", **scan_kwargs)
+                pages[fast_path].append(page["Widgets"])
+                if "LastEvaluatedKey" not in page:
+                    break
+                assert isinstance(page["LastEvaluatedKey"]["testing_ddb_pk"], str)
+                scan_kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+        self.assertEqual(pages[False], pages[True])
+        assert sum(len(widgets) for widgets in pages[True]) == 5
+
+    def test_paginate_widgets(self):
+        """
+        Prefetched pages match the serial loop, read-ahead is bounded, errors surface
+        """
+        for idx in range(10):
+            self.mock_table.put_item(Item={"testing_ddb_pk": "TEST%03d" % idx, "color": "blue"})
+        self.env_params.client = boto3.client('dynamodb', region_name='us-east-1')
+
+        for fast_path in (False, True):
+            self.env_params.fast_path = fast_path
+            serial = list(self.env_params.paginate_widgets("scan", 0, Limit=3))
+            prefetched = list(self.env_params.paginate_widgets("scan", 2, Limit=3))
+            assert [page["Widgets"] for page in serial] == \
+                   [page["Widgets"] for page in prefetched]
+            assert len(serial) == 4
+
+        # Stopping early leaves at most depth + 1 pages read ahead
+        self.env_params.fast_path = False
+        calls = []
+        real_scan = self.mock_table.scan
+
+        def counted_scan(**kwargs):
+            calls.append(kwargs)
+            return real_scan(**kwargs)
+
+        with patch.object(self.mock_table, 'scan', side_effect=counted_scan):
+            pages = self.env_params.paginate_widgets("scan", 1, Limit=1)
+            next(pages)
+            sleep(0.3)
+            pages.close()
+        assert len(calls) <= 3
+
+        # Nothing is read ahead past the caller's read budget
+        calls.clear()
+
+        def endless_scan(**kwargs):
+            calls.append(kwargs)
+            return {"Items": [{"testing_ddb_pk": "TEST%03d" % len(calls), "color": "blue"}],
+                    "LastEvaluatedKey": {"testing_ddb_pk": "TEST%03d" % len(calls)},
+                    "ConsumedCapacity": {"CapacityUnits": 1}}
+
+        budget = ReadBudget(60000, max_capacity=2)
+        with patch.object(self.mock_table, 'scan', side_effect=endless_scan):
+            pages = self.env_params.paginate_widgets("scan", 5, budget, Limit=1)
+            next(pages)
+            sleep(0.3)
+            pages.close()
+        assert len(calls) == 2
+
+        # A slow consumer gets every page the budget pays for, each charged once,
+        # and the last one tells there is more to read
+        calls.clear()
+        budget = ReadBudget(60000, max_capacity=6)
+        slow = []
+        with patch.object(self.mock_table, 'scan', side_effect=endless_scan):
+            for page in self.env_params.paginate_widgets("scan", 5, budget, Limit=1):
+                sleep(0.05)
+                slow.append(page)
+        assert len(slow) == len(calls) == 6 and budget.capacity == 6
+        assert slow[-1]["LastEvaluatedKey"]["testing_ddb_pk"] == "TEST006"
+
+        # Errors of the fetching thread are raised to the consumer
+        error = ClientError({"Error": {"Code": "500", "Message": "Error"}}, "Scan")
+        with patch.object(self.mock_table, 'scan', side_effect=error):
+            with self.assertRaises(ClientError):
+                list(self.env_params.paginate_widgets("scan", 2, Limit=3))
+
+    def test_read_budget(self):
+        """
+        Test read budget accounting and caps
+        """
+        budget = ReadBudget(60000, max_capacity=1)
+        assert not budget.exhausted()
+        budget.charge({"Items": [], "ScannedCount": 5,
+                       "ConsumedCapacity": {"CapacityUnits": 0.5}})
+        assert budget.scanned == 5 and budget.pages == 1
+        assert not budget.exhausted()
+        budget.charge({"Items": [{}, {}], "ConsumedCapacity": {"CapacityUnits": 0.5}})
+        assert budget.scanned == 7
+        assert budget.exhausted()
+
+        # No capacity cap, spent time
+        assert ReadBudget(0).exhausted()
+
+    def test_lazy_init(self):
+        """
+        Resources and clients are created on first use, once
+        """
+        env_params = EnvParams()
+        assert env_params._session is None
+        assert env_params._dynamodb is None
+        assert env_params._client is None
+
+        assert env_params.ddb_table.name == environ["DynamoName"]
+        assert env_params.ddb_table is env_params.ddb_table
+        assert env_params._client is None
+        assert env_params.client.meta.service_model.service_name == "dynamodb"
+
+        assert env_params.ngram_table is None
+        env_params.ngram_name = "testing_ngram"
+        assert env_params.ngram_table.name == "testing_ngram"
+
+    def test_prewarm(self):
+        """
+        Opt-in pre-warm builds everything at init
+        """
+        with patch.dict(environ, {"EnvPrewarm": "provisioned",
+                                  "AWS_LAMBDA_INITIALIZATION_TYPE": "on-demand"}):
+            assert EnvParams()._client is None
+
+        with patch.dict(environ, {"EnvPrewarm": "provisioned",
+                                  "AWS_LAMBDA_INITIALIZATION_TYPE": "provisioned-concurrency"}):
+            env_params = EnvParams()
+            assert env_params._client is not None
+            assert env_params._ddb_table is not None
+
+        with patch.dict(environ, {"EnvPrewarm": "true"}):
+            assert EnvParams()._client is not None
@@ -0,0 +1,95 @@
+"""
+    Test Suite for /layers/lambdaDdbCache
+"""
+# Standard Imports
+
+import unittest
+from unittest.mock import patch
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbCache import LruTtlCache
+
+
+class TestLruTtlCache(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaDdbCache LruTtlCache
+    """
+
+    def test_lru_eviction(self):
+        """
+        Entry bound evicts the least recently used key
+        """
+        cache = LruTtlCache(max_entries=2, max_bytes=1000, ttl_seconds=60)
+        cache.put(("widget", "A"), {"widgetName": "A"})
+        cache.put(("widget", "B"), {"widgetName": "B"})
+        assert cache.get(("widget", "A")) == {"widgetName": "A"}
+        cache.put(("widget", "C"), {"widgetName": "C"})
+
+        assert cache.get(("widget", "B")) is None
+        assert cache.get(("widget", "A")) is not None
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+
+    def test_byte_bound(self):
+        """
+        Byte bound evicts, oversized values are not cached
+        """
+        cache = LruTtlCache(max_entries=10, max_bytes=10, ttl_seconds=60)
+        cache.put("a", "x", size=6)
+        cache.put("b", "y", size=6)
+        assert cache.get("a") is None
+        assert cache.stats()["bytes"] == 6
+
+        cache.put("c", "z", size=11)
+        assert cache.get("c") is None
+        assert cache.get("b") == "y"
+
+    @patch('pylambda.layers.lambdaDdbEnv.python.lambdaDdbCache.monotonic')
+    def test_ttl(self, mock_monotonic):
+        """
+        Expired entries are misses and are dropped
+        :param mock_monotonic: mocked clock
+        """
+        mock_monotonic.return_value = 100.0
+        cache = LruTtlCache(max_entries=10, max_bytes=1000, ttl_seconds=5)
+        cache.put("a", [1, 2])
+        mock_monotonic.return_value = 104.0
+        assert cache.get("a") == [1, 2]
+        mock_monotonic.return_value = 105.0
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+        assert cache.stats()["bytes"] == 0
+
+    def test_invalidate(self):
+        """
+        Single key and namespace invalidation
+        """
+        cache = LruTtlCache(max_entries=10, max_bytes=1000, ttl_seconds=60)
+        cache.put(("widget", "A"), {"widgetName": "A"})
+        cache.put(("color", "red"), [])
+        cache.put(("color", "blue"), [])
+
+        cache.invalidate(("widget", "A"))
+        cache.invalidate(("widget", "NOTCACHED"))
+        assert cache.get(("widget", "A")) is None
+
+        cache.invalidate_namespace("color")
+        assert cache.stats()["entries"] == 0
+
+    def test_many_and_build(self):
+        """
+        Multi-key lookups and invalidations, read-through builds
+        """
+        cache = LruTtlCache(max_entries=10, max_bytes=1000, ttl_seconds=60)
+        cache.put(("widget", "A"), {"widgetName": "A"})
+        assert cache.get_many([("widget", "A"), ("widget", "B")]) == \
+            {("widget", "A"): {"widgetName": "A"}}
+
+        assert cache.get_or_build(("widget", "B"), lambda: {"widgetName": "B"}) == \
+            {"widgetName": "B"}
+        assert cache.get_or_build(("widget", "B"), lambda: None) == {"widgetName": "B"}
+
+        cache.invalidate_many([("widget", "A"), ("widget", "B"), ("widget", "C")])
+        assert cache.stats()["entries"] == 0
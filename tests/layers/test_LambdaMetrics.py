@@ -0,0 +1,140 @@
+"""
+    Test Suite for /layers/lambdaMetrics
+"""
+# Standard Imports
+
+from io import StringIO
+from os import environ
+from sys import path
+import json
+import unittest
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+from tests.env_setup_for_tests import create_mock_meta_ddb_table
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaMetrics import DdbMetrics
+from pylambda.layers.lambdaDdbEnv.python.lambdaMetrics import EmfSink
+from pylambda.layers.lambdaDdbEnv.python.lambdaMetrics import MemorySink
+from pylambda.layers.lambdaDdbEnv.python.lambdaMetrics import capacity_units
+from pylambda.layers.lambdaDdbEnv.python.lambdaVersions import VersionTracker
+
+
+@mock_dynamodb
+class TestLambdaMetrics(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaMetrics
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+        self.sink = MemorySink()
+        self.metrics = DdbMetrics("test_handler", self.sink)
+        self.table = self.metrics.wrap(self.mock_table)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_disabled(self):
+        """
+        Without DynamoMetrics tables and clients are not wrapped, with emf they are
+        """
+        env = EnvParams()
+        assert env.metrics is None
+        assert env.instrument(self.mock_table) is self.mock_table
+
+        environ["DynamoMetrics"] = "emf"
+        try:
+            env = EnvParams()
+            env.dynamodb = self.mock_dynamodb
+            env.metrics.sink = self.sink
+            env.ddb_table.scan(Limit=1)
+            assert env.metrics.handler == "local"
+            assert [record["Operation"] for record in self.sink.records] == ["scan"]
+        finally:
+            del environ["DynamoMetrics"]
+
+    def test_table_calls(self):
+        """
+        One record per call with the dimensions of the request
+        """
+        self.table.put_item(Item={"testing_ddb_pk": "TEST001", "color": "blue"})
+        self.table.put_item(Item={"testing_ddb_pk": "TEST002", "color": "red"})
+        response = self.table.scan(FilterExpression="color = :c",
+                                   ExpressionAttributeValues={":c": "blue"})
+        assert response["Count"] == 1
+        self.table.query(IndexName="testing_color_idx", KeyConditionExpression="color = :c",
+                         ExpressionAttributeValues={":c": "red"})
+
+        put, _, scan, query = self.sink.records
+        assert put["Operation"] == "put_item" and put["Handler"] == "test_handler"
+        assert put["Table"] == "testing_ddb" and put["Pages"] == 0
+        assert put["WriteCapacityUnits"] > 0 and put["ReadCapacityUnits"] == 0
+
+        assert scan["Filtered"] == "true" and scan["Index"] == "table"
+        assert scan["Pages"] == 1 and scan["ScannedCount"] == 2 and scan["ReturnedCount"] == 1
+        assert scan["ReadCapacityUnits"] > 0
+
+        assert query["Filtered"] == "false" and query["Index"] == "testing_color_idx"
+        assert all(record["Latency"] >= 0 and record["Errors"] == 0
+                   for record in self.sink.records)
+
+    def test_errors_and_meta_client(self):
+        """
+        Failed calls are recorded and raised, meta.client writes are recorded
+        """
+        with self.assertRaises(ClientError):
+            self.table.get_item(Key={"unknown": "x"})
+        assert self.sink.records[-1]["Errors"] == 1
+
+        versions = VersionTracker(self.metrics.wrap(
+            create_mock_meta_ddb_table(self.mock_dynamodb)))
+        versions.bump(["table"])
+        assert versions.read(["table"]) == [1]
+        assert [record["Operation"] for record in self.sink.records[1:]] == \
+               ["transact_write_items", "batch_get_item"]
+        assert self.sink.records[-1]["ReturnedCount"] == 1
+
+    def test_emf_sink(self):
+        """
+        Embedded metric format lines
+        """
+        stream = StringIO()
+        DdbMetrics("test_handler", EmfSink("TestNamespace", stream)).wrap(
+            self.mock_table).scan(Limit=1)
+        line = json.loads(stream.getvalue())
+        directive = line["_aws"]["CloudWatchMetrics"][0]
+        assert directive["Namespace"] == "TestNamespace"
+        assert directive["Dimensions"] == [["Handler", "Operation", "Index", "Filtered"]]
+        assert all(metric["Name"] in line for metric in directive["Metrics"])
+        assert line["Operation"] == "scan" and line["Pages"] == 1
+
+    def test_capacity_units(self):
+        """
+        Total, per-kind and batch ConsumedCapacity
+        """
+        assert capacity_units(None, "scan") == (0.0, 0.0)
+        assert capacity_units({"CapacityUnits": 2.5}, "query") == (2.5, 0.0)
+        assert capacity_units({"CapacityUnits": 1}, "update_item") == (0.0, 1.0)
+        assert capacity_units([{"CapacityUnits": 1}, {"CapacityUnits": 2}],
+                              "batch_write_item") == (0.0, 3.0)
+        assert capacity_units({"CapacityUnits": 3, "ReadCapacityUnits": 1,
+                               "WriteCapacityUnits": 2}, "transact_write_items") == (1.0, 2.0)
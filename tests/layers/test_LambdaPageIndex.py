@@ -0,0 +1,75 @@
+"""
+    Test Suite for /layers/lambdaPageIndex
+"""
+# Standard Imports
+
+from sys import path
+import unittest
+
+import boto3
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_meta_ddb_table
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaPageIndex import PageIndex
+from pylambda.layers.lambdaDdbEnv.python.lambdaVersions import VersionTracker
+
+
+@mock_dynamodb
+class TestLambdaPageIndex(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaPageIndex
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_meta_ddb_table(self.mock_dynamodb)
+        self.index = PageIndex(self.mock_table, 60, 4, clock=lambda: 1000)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_record(self):
+        """
+        Cursors are appended in page order only, up to max_pages, with a TTL
+        """
+        key = PageIndex.key(1, 10, "filter")
+        assert key != PageIndex.key(2, 10, "filter") and key.startswith("pages#")
+        assert self.index.starts(key) == []
+
+        assert self.index.record(key, 0, "A")
+        assert not self.index.record(key, 0, "B")
+        assert not self.index.record(key, 2, "C")
+        assert self.index.record(key, 1, "B")
+        assert self.index.record(key, 2, "C")
+        assert not self.index.record(key, 3, "D")
+        assert self.index.starts(key) == ["A", "B", "C"]
+        assert self.mock_table.get_item(Key={"metaKey": key})["Item"]["expiresAt"] == 1060
+
+    def test_env(self):
+        """
+        The index needs the versions, a 0 TTL disables it
+        """
+        env = EnvParams()
+        assert env.page_index is None
+        env.versions = VersionTracker(self.mock_table)
+        assert env.page_index.table is self.mock_table
+
+        env = EnvParams()
+        env.versions = VersionTracker(self.mock_table)
+        env.page_index_ttl_s = 0
+        assert env.page_index is None
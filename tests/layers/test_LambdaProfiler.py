@@ -0,0 +1,117 @@
+"""
+    Test Suite for /layers/lambdaProfiler
+"""
+# Standard Imports
+
+from os import environ
+from os.path import exists, join
+from pstats import Stats
+from sys import path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+import json
+import unittest
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaProfiler import DirectorySink
+from pylambda.layers.lambdaDdbEnv.python.lambdaProfiler import HandlerProfiler
+
+
+def busy_handler(event: dict, context: object) -> list:
+    """
+    Handler allocating a list
+    """
+    if event.get("fail"):
+        raise Exception("NotFound: no data matching query")
+    return [str(number) for number in range(event["size"])]
+
+
+class TestLambdaProfiler(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaProfiler
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        self.directory = TemporaryDirectory()
+        self.sink = DirectorySink(self.directory.name)
+
+    def tearDown(self):
+        """
+        Tear down test configuration
+        :return: Nothing
+        """
+        self.directory.cleanup()
+
+    def read_summary(self, request_id: str) -> dict:
+        with open(join(self.directory.name, "fn", request_id + ".json"), "r") as source:
+            return json.load(source)
+
+    def test_profile(self):
+        """
+        Sampled invocations write stats and a summary named by request id
+        """
+        samples = iter([0.0, 0.9, 0.1])
+        handler = HandlerProfiler("fn", 0.5, self.sink, memory=True,
+                                  sample=lambda: next(samples)).wrap(busy_handler)
+        assert handler.__name__ == "busy_handler"
+
+        assert len(handler({"size": 1000}, SimpleNamespace(aws_request_id="r1"))) == 1000
+        handler({"size": 10}, SimpleNamespace(aws_request_id="r2"))
+        with self.assertRaises(Exception):
+            handler({"fail": True}, SimpleNamespace(aws_request_id="r3"))
+
+        first = self.read_summary("r1")
+        assert first["coldStart"] and first["initCpuMs"] > 0
+        assert first["error"] is None
+        assert first["memoryPeakBytes"] > 0 and len(first["memoryTop"]) > 0
+        stats = Stats(join(self.directory.name, "fn", "r1.pstats"))
+        assert any(function[2] == "busy_handler" for function in stats.stats)
+
+        # Not sampled
+        assert not exists(join(self.directory.name, "fn", "r2.json"))
+        third = self.read_summary("r3")
+        assert not third["coldStart"] and third["initCpuMs"] is None
+        assert third["error"] == "Exception"
+
+    def test_sink_errors(self):
+        """
+        A failing sink does not fail the invocation
+        """
+        class BrokenSink:
+            def write(self, name: str, data: bytes):
+                raise OSError("No space left on device")
+
+        handler = HandlerProfiler("fn", 1, BrokenSink()).wrap(busy_handler)
+        assert handler({"size": 3}, None) == ["0", "1", "2"]
+
+    def test_env_params(self):
+        """
+        No rate leaves the handler unwrapped, a rate wraps it
+        """
+        env_setup_for_tests()
+        assert EnvParams().profiled(busy_handler) is busy_handler
+
+        environ["HandlerProfileRate"] = "1"
+        environ["HandlerProfileSink"] = self.directory.name
+        try:
+            handler = EnvParams().profiled(busy_handler)
+            assert handler is not busy_handler
+            handler({"size": 3}, SimpleNamespace(aws_request_id="r1"))
+            assert exists(join(self.directory.name, "local", "r1.pstats"))
+        finally:
+            del environ["HandlerProfileRate"]
+            del environ["HandlerProfileSink"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+    Test Suite for /layers/lambdaReportSpill
+"""
+# Standard Imports
+
+from gzip import decompress
+from os import listdir
+from os.path import join
+from sys import path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+import json
+import unittest
+
+import boto3
+from botocore.config import Config
+from moto import mock_s3
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaReportSpill import LocalSpillStore
+from pylambda.layers.lambdaDdbEnv.python.lambdaReportSpill import S3SpillStore
+from pylambda.layers.lambdaDdbEnv.python.lambdaReportSpill import collect_report
+from pylambda.layers.lambdaDdbEnv.python.lambdaReportSpill import download_reference
+from pylambda.layers.lambdaDdbEnv.python.lambdaReportSpill import spill_key
+
+
+def widget_chunks(chunks: int, size: int) -> list:
+    """
+    :return: chunks of widgets with unique names
+    """
+    return [[{"widgetName": "W%03d-%03d" % (chunk, number), "color": "blue"}
+             for number in range(size)] for chunk in range(chunks)]
+
+
+def read_ndjson(data: bytes) -> list:
+    return [json.loads(line) for line in decompress(data).splitlines()]
+
+
+class TestLambdaReportSpill(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaReportSpill with the local store
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        self.directory = TemporaryDirectory()
+        self.store = LocalSpillStore(self.directory.name)
+
+    def tearDown(self):
+        """
+        Tear down test configuration
+        :return: Nothing
+        """
+        self.directory.cleanup()
+
+    def test_inline(self):
+        """
+        Reports up to the threshold stay inline, as do all without a store
+        """
+        chunks = widget_chunks(3, 10)
+        inline = sum(chunks, [])
+        size = len(json.dumps(inline))
+        assert collect_report(iter(chunks), self.store, size, "k.ndjson.gz") == inline
+        assert collect_report(iter(chunks), None, 1, "k.ndjson.gz") == inline
+        assert collect_report(iter([[], []]), self.store, 0, "k.ndjson.gz") == []
+        assert listdir(self.directory.name) == []
+
+    def test_spill(self):
+        """
+        Past the threshold every widget, read before or after, is in the object
+        """
+        chunks = widget_chunks(5, 10)
+        key = spill_key("color", "blue/green")
+        assert key.startswith("color/blue%2Fgreen/") and key.endswith(".ndjson.gz")
+
+        spill = collect_report(iter(chunks), self.store, 700, key)
+        assert spill["key"] == key and spill["count"] == 50
+        with open(join(self.directory.name, key), "rb") as source:
+            data = source.read()
+        assert spill["bytes"] == len(data)
+        assert read_ndjson(data) == sum(chunks, [])
+
+        reference = download_reference(self.store, spill, 60)
+        assert reference["url"].startswith("file://") and reference["url"].endswith(key)
+        assert reference["count"] == 50 and reference["contentEncoding"] == "gzip"
+
+    def test_abort(self):
+        """
+        A failing read leaves no object behind
+        """
+        def failing_chunks():
+            yield from widget_chunks(3, 10)
+            raise Exception("error: Internal Server Error")
+
+        with self.assertRaises(Exception):
+            collect_report(failing_chunks(), self.store, 100, "color/blue/x.ndjson.gz")
+        assert listdir(join(self.directory.name, "color", "blue")) == []
+
+
+@mock_s3
+class TestLambdaReportSpillS3(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaReportSpill with the S3 store
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        # moto does not decode the aws-chunked bodies of flexible checksums
+        self.client = boto3.client("s3", region_name="us-east-1", config=Config(
+            request_checksum_calculation="when_required"))
+        self.client.create_bucket(Bucket="spill")
+
+    @patch("moto.s3.models.S3_UPLOAD_PART_MIN_SIZE", 256)
+    def test_multipart(self):
+        """
+        Objects larger than a part are uploaded in parts
+        """
+        store = S3SpillStore("spill", "reports/", lambda: self.client, part_size=1024)
+        chunks = widget_chunks(40, 100)
+        spill = collect_report(iter(chunks), store, 1000, "color/blue/a.ndjson.gz")
+
+        stored = self.client.get_object(Bucket="spill", Key="reports/color/blue/a.ndjson.gz")
+        assert stored["ContentEncoding"] == "gzip"
+        data = stored["Body"].read()
+        assert spill["bytes"] == len(data) > 2048
+        assert read_ndjson(data) == sum(chunks, [])
+
+        assert "reports/color/blue/a.ndjson.gz?" in download_reference(store, spill, 60)["url"]
+
+    def test_single_put_and_abort(self):
+        """
+        A small object is one PutObject, a failed upload is aborted
+        """
+        store = S3SpillStore("spill", "", lambda: self.client)
+        spill = collect_report(iter(widget_chunks(2, 10)), store, 100, "b.ndjson.gz")
+        data = self.client.get_object(Bucket="spill", Key="b.ndjson.gz")["Body"].read()
+        assert len(read_ndjson(data)) == spill["count"] == 20
+
+        def failing_chunks():
+            yield from widget_chunks(40, 100)
+            raise Exception("error: Internal Server Error")
+
+        small_parts = S3SpillStore("spill", "", lambda: self.client, part_size=1024)
+        with self.assertRaises(Exception):
+            collect_report(failing_chunks(), small_parts, 100, "c.ndjson.gz")
+        assert self.client.list_multipart_uploads(Bucket="spill").get("Uploads", []) == []
+        assert [item["Key"] for item in self.client.list_objects_v2(
+            Bucket="spill")["Contents"]] == ["b.ndjson.gz"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+    Test Suite for /layers/lambdaResponseFormat
+"""
+# Standard Imports
+
+from sys import path
+import unittest
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaResponseFormat import format_report
+from pylambda.layers.lambdaDdbEnv.python.lambdaResponseFormat import from_columnar
+from pylambda.layers.lambdaDdbEnv.python.lambdaResponseFormat import to_columnar
+from pylambda.layers.lambdaDdbEnv.python.lambdaResponseFormat import wants_columnar
+
+
+class TestLambdaResponseFormat(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaResponseFormat
+    """
+
+    def test_wants_columnar(self):
+        """
+        Only an explicit, non-zero quality columnar media range switches the format
+        """
+        assert not wants_columnar("")
+        assert not wants_columnar("application/json, */*")
+        assert wants_columnar("application/vnd.widgets.columnar+json")
+        assert wants_columnar("application/json;q=0.5, Application/Vnd.Widgets.Columnar+JSON")
+        assert wants_columnar("application/vnd.widgets.columnar+json; q=0.9")
+        assert not wants_columnar("application/vnd.widgets.columnar+json;q=0")
+        assert not wants_columnar("application/vnd.widgets.columnar+json;q=high")
+
+    def test_columnar_round_trip(self):
+        """
+        Colors are dictionary-encoded in first-seen order, decoding restores the list
+        """
+        widgets = [{"widgetName": "a", "color": "red"},
+                   {"widgetName": "b", "color": "blue"},
+                   {"widgetName": "c", "color": "red"}]
+        document = to_columnar(widgets)
+        assert document == {"columns": {"widgetName": ["a", "b", "c"], "color": [0, 1, 0]},
+                            "dictionary": {"color": ["red", "blue"]}}
+        assert from_columnar(document) == widgets
+        assert from_columnar(to_columnar([])) == []
+
+    def test_format_report(self):
+        """
+        Lists and {widgetList, ...} results, the JSON format is left untouched
+        """
+        widgets = [{"widgetName": "a", "color": "red"}]
+        result = {"metadata": {"count": 1}, "widgetList": widgets, "etag": '"x"'}
+        assert format_report(result, False) is result
+        assert format_report(widgets, True) == to_columnar(widgets)
+        document = format_report(result, True)
+        assert "widgetList" not in document
+        assert document["metadata"] == {"count": 1} and document["etag"] == '"x"'
+        assert from_columnar(document) == widgets
+
@@ -0,0 +1,225 @@
+"""
+    Test Suite for /layers/lambdaSharedCache
+"""
+# Standard Imports
+
+from os import environ
+from sys import path
+from threading import Event, Thread
+import socket
+import unittest
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.memcached_standin import MemcachedStandIn
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbCache import LruTtlCache
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaSharedCache import MemcachedClient
+from pylambda.layers.lambdaDdbEnv.python.lambdaSharedCache import SharedCache
+from pylambda.layers.lambdaDdbEnv.python.lambdaSharedCache import TieredCache
+
+
+class TestLambdaSharedCache(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaSharedCache against a memcached stand-in
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        self.server = MemcachedStandIn().start()
+        self.client = MemcachedClient(self.server.endpoint, 1)
+        self.cache = SharedCache(self.client, 60, lock_ms=1000, wait_ms=2000)
+
+    def tearDown(self):
+        """
+        Tear down test configuration
+        :return: Nothing
+        """
+        self.client.close()
+        self.server.stop()
+
+    def test_client(self):
+        """
+        Protocol commands of the client
+        """
+        assert self.client.set("a", b"x y\r\nz", 0)
+        assert not self.client.add("a", b"other", 0)
+        assert self.client.add("n", b"5", 0)
+        assert self.client.incr("n") == 6
+        assert self.client.incr("missing") is None
+        assert self.client.get_multi(["a", "n", "missing"]) == {"a": b"x y\r\nz", "n": b"6"}
+        self.client.delete_multi(["a", "missing"])
+        assert self.client.get_multi(["a"]) == {}
+
+    def test_get_put_invalidate(self):
+        """
+        Values are shared between clients, invalidations are seen by all
+        """
+        other = SharedCache(MemcachedClient(self.server.endpoint, 1), 60)
+        self.cache.put(("widget", "A B"), {"widgetName": "A B"})
+        assert other.get(("widget", "A B")) == {"widgetName": "A B"}
+        assert other.get(("widget", "C")) is None
+        assert other.get_many([("widget", "A B"), ("widget", "C")]) == \
+            {("widget", "A B"): {"widgetName": "A B"}}
+
+        other.invalidate(("widget", "A B"))
+        assert self.cache.get(("widget", "A B")) is None
+        assert other.stats()["hits"] == 2
+        other.client.close()
+
+    def test_invalidate_namespace(self):
+        """
+        A namespace generation bump hides every entry written before it
+        """
+        self.cache.put(("color", "red"), [{"widgetName": "A"}])
+        self.cache.put(("color", "blue"), [{"widgetName": "B"}])
+        self.cache.put(("widget", "A"), {"widgetName": "A"})
+
+        self.cache.invalidate_namespace("color")
+        assert self.cache.get(("color", "red")) is None
+        assert self.cache.get(("color", "blue")) is None
+        assert self.cache.get(("widget", "A")) is not None
+
+        self.cache.put(("color", "red"), [])
+        assert self.cache.get(("color", "red")) == []
+        self.cache.invalidate_namespace("color")
+        assert self.cache.get(("color", "red")) is None
+
+    def test_get_or_build_coalesces(self):
+        """
+        Concurrent misses of one key build it once
+        """
+        started = Event()
+        release = Event()
+        builds = []
+
+        def build() -> list:
+            builds.append(1)
+            started.set()
+            release.wait(2)
+            return ["built"]
+
+        first = Thread(target=lambda: builds.append(self.cache.get_or_build(("color", "red"),
+                                                                            build)))
+        first.start()
+        started.wait(2)
+
+        waiter = SharedCache(MemcachedClient(self.server.endpoint, 1), 60, wait_ms=2000)
+        results = []
+        second = Thread(target=lambda: results.append(waiter.get_or_build(("color", "red"),
+                                                                          build)))
+        second.start()
+        # Let the first build finish once the second container lost the lock
+        while self.server.commands.count("add") < 2:
+            second.join(0.01)
+        release.set()
+        first.join(2)
+        second.join(2)
+
+        assert results == [["built"]]
+        assert builds == [1, ["built"]]
+        assert waiter.stats()["coalesced"] == 1
+        waiter.client.close()
+
+    def test_get_or_build_error(self):
+        """
+        A failed build caches nothing and releases the rebuild lock
+        """
+        def build():
+            raise Exception("NotFound: no data matching query")
+
+        with self.assertRaises(Exception) as context:
+            self.cache.get_or_build(("color", "none"), build)
+        self.assertTrue("NotFound" in str(context.exception))
+        assert self.cache.get_or_build(("color", "none"), lambda: ["x"]) == ["x"]
+        assert self.cache.get(("color", "none")) == ["x"]
+
+    def test_oversized_values(self):
+        """
+        A value over the item size limit is a miss of its key, not a server outage
+        """
+        self.server.item_max = 200
+        self.cache.put(("widget", "A"), {"widgetName": "A"})
+        big = [{"widgetName": "W%04d" % idx} for idx in range(100)]
+        assert self.cache.get_or_build(("color", "red"), lambda: big) == big
+        self.cache.put(("color", "blue"), big)
+        assert self.cache.get(("color", "red")) is None
+        assert self.cache.get(("widget", "A")) == {"widgetName": "A"}
+        self.cache.put(("widget", "B"), {"widgetName": "B"})
+        assert self.cache.get(("widget", "B")) == {"widgetName": "B"}
+        assert self.cache.stats()["errors"] == 0 and self.cache.stats()["oversized"] == 2
+
+        # Values known to be too large are not sent at all
+        sets = self.server.commands.count("set")
+        small = SharedCache(self.client, 60, max_item_bytes=200)
+        small.put(("color", "red"), big)
+        assert self.server.commands.count("set") == sets
+        assert small.stats()["oversized"] == 1
+
+    def test_degrades_when_down(self):
+        """
+        A server that is down is a miss, builds still work and errors back off
+        """
+        probe = socket.socket()
+        probe.bind(("127.0.0.1", 0))
+        endpoint = "%s:%d" % probe.getsockname()
+        probe.close()
+
+        cache = SharedCache(MemcachedClient(endpoint, 0.2), 60, retry_s=60)
+        assert cache.get(("widget", "A")) is None
+        cache.put(("widget", "A"), {})
+        cache.invalidate(("widget", "A"))
+        cache.invalidate_namespace("color")
+        assert cache.get_or_build(("color", "red"), lambda: ["built"]) == ["built"]
+        # Only the first call reached the server
+        assert cache.stats()["errors"] == 1
+
+    def test_tiered(self):
+        """
+        The local tier fills from the shared one, invalidations reach both
+        """
+        shared = TieredCache(LruTtlCache(10, 10000, 60), self.cache)
+        self.cache.put(("widget", "A"), {"widgetName": "A"})
+        assert shared.get(("widget", "A")) == {"widgetName": "A"}
+        assert shared.local.get(("widget", "A")) == {"widgetName": "A"}
+
+        shared.invalidate_many([("widget", "A")])
+        assert shared.get(("widget", "A")) is None
+        assert shared.get_or_build(("color", "red"), lambda: ["A"]) == ["A"]
+        assert self.cache.get(("color", "red")) == ["A"]
+
+        shared.invalidate_namespace("color")
+        assert shared.get(("color", "red")) is None
+
+    def test_env_params(self):
+        """
+        SharedCacheBackend puts the shared tier behind the in-process cache
+        """
+        env_setup_for_tests()
+        environ["SharedCacheBackend"] = "memcached"
+        environ["SharedCacheEndpoint"] = self.server.endpoint
+        try:
+            env = EnvParams()
+            assert type(env.cache).__name__ == "TieredCache"
+            assert env.cache.local is None
+            env.cache.put(("widget", "A"), {"widgetName": "A"})
+            assert self.cache.get(("widget", "A")) == {"widgetName": "A"}
+
+            environ["SharedCacheBackend"] = "unknown"
+            with self.assertRaises(Exception) as context:
+                EnvParams()
+            self.assertTrue("SharedCacheBackend" in str(context.exception))
+        finally:
+            del environ["SharedCacheBackend"]
+            del environ["SharedCacheEndpoint"]
+
+
+if __name__ == '__main__':
+    unittest.main()
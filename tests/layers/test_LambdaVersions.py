@@ -0,0 +1,74 @@
+"""
+    Test Suite for /layers/lambdaVersions
+"""
+# Standard Imports
+
+from sys import path
+import unittest
+
+import boto3
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_meta_ddb_table
+
+# Set up lambda layer directories to support imports between layer modules
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+from pylambda.layers.lambdaDdbEnv.python.lambdaVersions import VersionTracker
+from pylambda.layers.lambdaDdbEnv.python.lambdaVersions import etag_matches
+
+
+@mock_dynamodb
+class TestLambdaVersions(unittest.TestCase):
+    """
+    Test Suite for /layers/lambdaVersions
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return: Nothing
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_meta_ddb_table(self.mock_dynamodb)
+        self.versions = VersionTracker(self.mock_table)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_bump_read(self):
+        """
+        Versions start at 0 and move on every bump
+        """
+        assert self.versions.read(["table", "color#red"]) == [0, 0]
+        self.versions.bump(["table", "color#red", "table"])
+        self.versions.bump(["table"])
+        assert self.versions.read(["color#red", "table", "color#blue"]) == [1, 2, 0]
+
+    def test_etag(self):
+        """
+        ETags depend on the versions and the parameters
+        """
+        etag = self.versions.etag(["table"], 10, "")
+        assert etag.startswith('"') and etag.endswith('"')
+        assert etag == self.versions.etag(["table"], 10, "")
+        assert etag != self.versions.etag(["table"], 20, "")
+        self.versions.bump(["table"])
+        assert etag != self.versions.etag(["table"], 10, "")
+
+    def test_etag_matches(self):
+        """
+        If-None-Match forms
+        """
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('W/"abc"', '"abc"')
+        assert etag_matches('"x", "abc"', '"abc"')
+        assert etag_matches('*', '"abc"')
+        assert not etag_matches('', '"abc"')
+        assert not etag_matches('"abd"', '"abc"')
@@ -0,0 +1,103 @@
+"""
+    In-process stand-in of a memcached server for the shared cache tests:
+    get (multi-key), set, add, delete and incr of the text protocol, with expiry
+"""
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Lock, Thread
+from time import monotonic
+
+
+class _Handler(StreamRequestHandler):
+    """
+    One client connection
+    """
+
+    def handle(self):
+        server = self.server
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode("utf-8").split()
+            server.commands.append(parts[0] if parts else "")
+            if parts[0] in ("set", "add"):
+                data = self.rfile.read(int(parts[4]) + 2)[:-2]
+                self.wfile.write(server.store(parts[0], parts[1], data, int(parts[3])))
+            elif parts[0] == "get":
+                self.wfile.write(server.get(parts[1:]))
+            elif parts[0] == "delete":
+                self.wfile.write(server.delete(parts[1]))
+            elif parts[0] == "incr":
+                self.wfile.write(server.incr(parts[1], int(parts[2])))
+            else:
+                self.wfile.write(b"ERROR\r\n")
+
+
+class MemcachedStandIn(ThreadingTCPServer):
+    """
+    Memcached stand-in listening on a free localhost port, start() runs it in
+    a daemon thread
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.data = {}
+        self.lock = Lock()
+        self.commands = []
+        # Item size limit, memcached -I
+        self.item_max = 1024 * 1024
+
+    @property
+    def endpoint(self) -> str:
+        return "%s:%d" % self.server_address
+
+    def start(self) -> "MemcachedStandIn":
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _live(self, key: str):
+        entry = self.data.get(key, None)
+        if entry is not None and entry[0] is not None and entry[0] <= monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def store(self, command: str, key: str, data: bytes, ttl_s: int) -> bytes:
+        with self.lock:
+            if len(data) > self.item_max:
+                return b"SERVER_ERROR object too large for cache\r\n"
+            if command == "add" and self._live(key) is not None:
+                return b"NOT_STORED\r\n"
+            self.data[key] = (monotonic() + ttl_s if ttl_s > 0 else None, data)
+            return b"STORED\r\n"
+
+    def get(self, keys: list) -> bytes:
+        with self.lock:
+            reply = b""
+            for key in keys:
+                entry = self._live(key)
+                if entry is not None:
+                    reply += b"VALUE %s 0 %d\r\n%s\r\n" % (key.encode(), len(entry[1]), entry[1])
+            return reply + b"END\r\n"
+
+    def delete(self, key: str) -> bytes:
+        with self.lock:
+            if self._live(key) is None:
+                return b"NOT_FOUND\r\n"
+            del self.data[key]
+            return b"DELETED\r\n"
+
+    def incr(self, key: str, delta: int) -> bytes:
+        with self.lock:
+            entry = self._live(key)
+            if entry is None:
+                return b"NOT_FOUND\r\n"
+            value = int(entry[1]) + delta
+            self.data[key] = (entry[0], str(value).encode())
+            return b"%d\r\n" % value
@@ -4,6 +4,9 @@
 # Standard Imports
 
 from sys import path
+from gzip import decompress
+from tempfile import TemporaryDirectory
+import json
 from os import environ
 import unittest
 from unittest.mock import patch
@@ -15,6 +18,8 @@ from moto import mock_dynamodb
 # Common test helper utilities for setup
 from tests.env_setup_for_tests import env_setup_for_tests
 from tests.env_setup_for_tests import create_mock_widget_ddb_table
+from tests.env_setup_for_tests import create_mock_color_view_ddb_table
+from tests.env_setup_for_tests import create_mock_meta_ddb_table
 
 # Set up lambda layer directories to support imports, establish mock env
 path.extend(["pylambda/layers/lambdaDdbEnv/python"])
@@ -22,7 +27,15 @@ env_setup_for_tests()
 
 # Class/proc's under test import
 from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbCache import LruTtlCache
+from pylambda.layers.lambdaDdbEnv.python.lambdaColorView import ColorView
+from pylambda.layers.lambdaDdbEnv.python.lambdaVersions import VersionTracker
+from pylambda.layers.lambdaDdbEnv.python.lambdaResponseFormat import from_columnar
+from pylambda.layers.lambdaDdbEnv.python.lambdaReportSpill import LocalSpillStore
+from pylambda.reports.color import app
+from pylambda.reports.color.app import get_ddb_colors
 from pylambda.reports.color.app import get_ddb_data
+from pylambda.reports.color.app import get_ddb_page
 from pylambda.reports.color.app import lambda_handler
 
 @mock_dynamodb
@@ -98,6 +111,316 @@ class TestReportsColor(unittest.TestCase):
             get_ddb_data({}, self.test_env)
             self.assertTrue('Malformed' in str(context.exception))
 
+    def test_get_ddb_data_cached(self):
+        """
+        Full list reads through the in-process cache
+        :return:
+        """
+        self.test_env.cache = LruTtlCache(10, 10000, 60)
+        self.test_env.ddb_limit = 10
+        ret = get_ddb_data({"color": "blue"}, self.test_env)
+        assert len(ret) == 3
+
+        # Served from the cache without a query
+        self.mock_table.delete_item(Key={environ["DynamoPartitionKey"]: 'FOO'})
+        ret = get_ddb_data({"color": "blue"}, self.test_env)
+        assert len(ret) == 3
+        assert self.test_env.cache.stats()["hits"] == 1
+
+        self.test_env.cache.invalidate(("color", "blue"))
+        ret = get_ddb_data({"color": "blue"}, self.test_env)
+        assert len(ret) == 2
+
+    def test_get_ddb_data_spilled(self):
+        """
+        Reports past ReportInlineMaxBytes come back as a download link
+        :return:
+        """
+        with TemporaryDirectory() as directory:
+            self.test_env.report_spill_store = LocalSpillStore(directory)
+            self.test_env.report_inline_max_bytes = 60
+            self.test_env.ddb_limit = 1
+
+            # One widget fits inline
+            assert get_ddb_data({"color": "purple"}, self.test_env) == \
+                [{"widgetName": "TEST004", "color": "purple"}]
+
+            self.test_env.cache = LruTtlCache(10, 10000, 60)
+            ret = get_ddb_data({"color": "blue"}, self.test_env)
+            assert ret["widgetList"] == [] and ret["metadata"]["count"] == 3
+            download = ret["download"]
+            assert download["count"] == 3 and download["contentType"] == "application/x-ndjson"
+            with open(download["url"][len("file://"):], "rb") as source:
+                widgets = [json.loads(line) for line in decompress(source.read()).splitlines()]
+            assert sorted(widget["widgetName"] for widget in widgets) == \
+                ["FOO", "TEST001", "TEST002"]
+
+            # The cached spill gets a fresh link on the same object
+            again = get_ddb_data({"color": "blue"}, self.test_env)
+            assert again["download"]["url"] == download["url"]
+            assert self.test_env.cache.stats()["hits"] == 1
+
+    def test_get_ddb_data_sharded(self):
+        """
+        Scatter-gather over the color shards returns the same widgets in name order
+        :return:
+        """
+        self.test_env.color_shards = 3
+        widgets = [{"widgetName": "SHARD%03d" % idx, "color": "blue"} for idx in range(20)]
+        for data in self.sample_data:
+            self.mock_table.delete_item(Key={environ["DynamoPartitionKey"]:
+                                             data[environ["DynamoPartitionKey"]]})
+            widgets.append(self.test_env.ddb_to_widget(data))
+        # moto applies the query Limit in insertion order, before sorting on the
+        # range key; inserting in name order keeps its index pages sorted
+        for widget in sorted(widgets, key=lambda widget: widget["widgetName"]):
+            self.mock_table.put_item(Item=self.test_env.widget_to_ddb(widget))
+
+        self.test_env.ddb_limit = 4
+        expected = sorted(get_ddb_data({"color": "blue"}, self.test_env),
+                          key=lambda widget: widget["widgetName"])
+        self.test_env.color_shard_reads = True
+        assert get_ddb_data({"color": "blue"}, self.test_env) == expected
+        assert len(expected) == 23
+
+        # Paged mode resumes by name across the shards
+        names = []
+        event = {"color": "blue", "limit": "5", "lastKey": ""}
+        while True:
+            ret = get_ddb_page(event, self.test_env)
+            names.extend(widget["widgetName"] for widget in ret["widgetList"])
+            if ret["metadata"]["next"] == "":
+                break
+            event["lastKey"] = ret["metadata"]["next"]
+        assert names == [widget["widgetName"] for widget in expected]
+
+        # A shard page may be empty without being the last one
+        query_shard_page = app.query_shard_page
+        empty = {"Widgets": [], "ScannedCount": 0, "ConsumedCapacity": {},
+                 "LastEvaluatedKey": {environ["DynamoPartitionKey"]: "A"}}
+        pages = iter([empty, empty])
+
+        def flaky_page(env, shard_key, after, last_key, page_size):
+            if shard_key.endswith("#0"):
+                page = next(pages, None)
+                if page is not None:
+                    return page
+                if last_key == empty["LastEvaluatedKey"]:
+                    last_key = None
+            return query_shard_page(env, shard_key, after, last_key, page_size)
+
+        with patch('pylambda.reports.color.app.query_shard_page', side_effect=flaky_page):
+            assert get_ddb_data({"color": "blue"}, self.test_env) == expected
+
+        with self.assertRaises(Exception) as context:
+            get_ddb_data({"color": "WILLNOTFIND"}, self.test_env)
+        self.assertTrue('NotFound' in str(context.exception))
+
+    def test_get_ddb_data_view(self):
+        """
+        Full list read from the materialized color view
+        :return:
+        """
+        self.test_env.color_view = ColorView(
+            create_mock_color_view_ddb_table(self.mock_dynamodb), 4)
+        for name in ["TEST002", "TEST001"]:
+            self.test_env.color_view.add("blue", name)
+
+        ret = get_ddb_data({"color": "blue"}, self.test_env)
+        assert ret == [{"widgetName": "TEST001", "color": "blue"},
+                       {"widgetName": "TEST002", "color": "blue"}]
+
+        with self.assertRaises(Exception) as context:
+            get_ddb_data({"color": "green"}, self.test_env)
+        self.assertTrue('NotFound' in str(context.exception))
+
+        # A stale view is skipped for the index
+        self.test_env.color_view.mark_stale("blue")
+        assert len(get_ddb_data({"color": "blue"}, self.test_env)) == 3
+
+    def test_get_ddb_page(self):
+        """
+        Paged (streamed) mode of the color report
+        :return:
+        """
+
+        # Caller limit stops part way through a page, token resumes exactly
+        self.test_env.ddb_limit = 10
+        ret = get_ddb_page({"color": "blue", "limit": "2", "lastKey": ""}, self.test_env)
+        assert ret["metadata"]["count"] == 2
+        first_page = [widget["widgetName"] for widget in ret["widgetList"]]
+
+        ret = get_ddb_page({"color": "blue", "limit": "2",
+                            "lastKey": ret["metadata"]["next"]}, self.test_env)
+        assert ret["metadata"]["count"] == 1
+        assert ret["metadata"]["next"] == ""
+        names = first_page + [widget["widgetName"] for widget in ret["widgetList"]]
+        assert sorted(names) == ["FOO", "TEST001", "TEST002"]
+
+        # Server side cap applies when the caller asks for more
+        self.test_env.ddb_limit = 1
+        self.test_env.report_max_items = 1
+        ret = get_ddb_page({"color": "blue", "limit": "50"}, self.test_env)
+        assert ret["metadata"]["count"] == 1
+        assert len(ret["metadata"]["next"]) > 0
+
+        # Pages that end before the index does, on the read-ahead budget, resume
+        page = {"Widgets": [{"widgetName": "FOO"}],
+                "LastEvaluatedKey": {environ["DynamoPartitionKey"]: "FOO"}}
+        with patch('pylambda.reports.color.app.query_color_pages', return_value=iter([page])):
+            ret = get_ddb_page({"color": "blue", "limit": "50"}, self.test_env)
+        assert ret["metadata"]["next"] == "FOO"
+
+        # Exhausted time budget returns what was read with a continuation token
+        self.test_env.report_max_items = 100
+        self.test_env.report_time_budget_ms = 0
+        ret = get_ddb_page({"color": "blue", "limit": "50"}, self.test_env)
+        assert ret["metadata"]["count"] == 1
+        assert len(ret["metadata"]["next"]) > 0
+
+        with self.assertRaises(Exception) as context:
+            get_ddb_page({"color": "WILLNOTFIND", "limit": "5"}, self.test_env)
+        self.assertTrue('NotFound' in str(context.exception))
+
+    def test_get_ddb_colors(self):
+        """
+        Multi-color report, one group per color in request order
+        :return:
+        """
+        self.test_env.ddb_limit = 1
+        ret = get_ddb_colors({"colors": ["green", "blue", "WILLNOTFIND", "blue"]},
+                             self.test_env)
+        assert [group["color"] for group in ret["colors"]] == ["green", "blue", "WILLNOTFIND"]
+        assert [group["count"] for group in ret["colors"]] == [1, 3, 0]
+        assert ret["metadata"] == {"message": "OK", "count": 4, "colors": 3, "complete": True}
+        assert sorted(widget["widgetName"] for widget in ret["colors"][1]["widgetList"]) == \
+            ["FOO", "TEST001", "TEST002"]
+
+        with self.assertRaises(Exception) as context:
+            get_ddb_colors({"colors": ["WILLNOTFIND", "blue,green"]}, self.test_env)
+        self.assertTrue('NotFound' in str(context.exception))
+
+        with self.assertRaises(Exception) as context:
+            get_ddb_colors({"colors": [""]}, self.test_env)
+        self.assertTrue('NotAcceptable' in str(context.exception))
+
+        self.test_env.report_max_colors = 2
+        with self.assertRaises(Exception) as context:
+            get_ddb_colors({"colors": ["red", "green", "blue"]}, self.test_env)
+        self.assertTrue('NotAcceptable' in str(context.exception))
+
+    def test_get_ddb_colors_budget(self):
+        """
+        The item budget is shared, a color cut short resumes on /reports/color
+        :return:
+        """
+        self.test_env.ddb_limit = 10
+        self.test_env.report_max_items = 2
+        self.test_env.scan_workers = 1
+        ret = get_ddb_colors({"colors": ["blue", "green"]}, self.test_env)
+        assert ret["metadata"]["count"] == 2 and not ret["metadata"]["complete"]
+        blue, green = ret["colors"]
+        assert blue["count"] == 2 and not blue["complete"]
+        assert green == {"color": "green", "count": 0, "complete": False, "next": "",
+                         "widgetList": []}
+
+        rest = get_ddb_page({"color": "blue", "lastKey": blue["next"]}, self.test_env)
+        names = [widget["widgetName"] for widget in blue["widgetList"] + rest["widgetList"]]
+        assert sorted(names) == ["FOO", "TEST001", "TEST002"]
+
+        # The byte budget counts the widgets as one JSON list
+        widgets = [{"widgetName": "TEST%03d" % idx, "color": "blue"} for idx in range(4)]
+        budget = app.ColorsBudget(10, len(json.dumps(widgets[:2])), 1000)
+        assert budget.take({"Widgets": widgets}) == 2
+        assert budget.bytes == 0 and budget.items == 8 and budget.exhausted()
+
+    def test_get_ddb_page_fast_path(self):
+        """
+        Paged mode through the low-level client returns the same widgets
+        :return:
+        """
+        self.test_env.ddb_limit = 10
+        expected = get_ddb_page({"color": "blue", "limit": "2", "lastKey": ""}, self.test_env)
+
+        self.test_env.client = boto3.client('dynamodb', region_name='us-east-1')
+        self.test_env.fast_path = True
+        ret = get_ddb_page({"color": "blue", "limit": "2", "lastKey": ""}, self.test_env)
+        assert ret == expected
+
+        ret = get_ddb_page({"color": "blue", "limit": "2",
+                            "lastKey": ret["metadata"]["next"]}, self.test_env)
+        assert ret["metadata"]["count"] == 1
+        assert ret["metadata"]["next"] == ""
+
+    def test_lambda_handler_etag(self):
+        """
+        ETag on the report, 304 while the color is unchanged
+        :return:
+        """
+        self.test_env.ddb_limit = 10
+        self.test_env.versions = VersionTracker(create_mock_meta_ddb_table(self.mock_dynamodb))
+        with patch('pylambda.reports.color.app.GLOBAL_ENV', new=self.test_env):
+            ret = lambda_handler({"color": "blue"}, None)
+            assert len(ret["widgetList"]) == 3
+            etag = ret["etag"]
+
+            with patch('pylambda.reports.color.app.get_ddb_data') as mock_get_ddb_data:
+                with self.assertRaises(Exception) as context:
+                    lambda_handler({"color": "blue", "ifNoneMatch": etag}, None)
+                self.assertTrue('NotModified' in str(context.exception))
+                mock_get_ddb_data.assert_not_called()
+
+            # Paged requests and other colors have their own tags
+            ret = lambda_handler({"color": "blue", "limit": "1", "ifNoneMatch": etag}, None)
+            assert ret["etag"] != etag and ret["metadata"]["count"] == 1
+
+            self.test_env.versions.bump(["color#blue"])
+            ret = lambda_handler({"color": "blue", "ifNoneMatch": etag}, None)
+            assert ret["etag"] != etag
+
+    def test_lambda_handler_etag_cached(self):
+        """
+        A write in another container changes the ETag and the cached body together
+        :return:
+        """
+        self.test_env.ddb_limit = 10
+        self.test_env.cache = LruTtlCache(10, 10000, 60)
+        self.test_env.versions = VersionTracker(create_mock_meta_ddb_table(self.mock_dynamodb))
+        with patch('pylambda.reports.color.app.GLOBAL_ENV', new=self.test_env):
+            ret = lambda_handler({"color": "blue"}, None)
+            assert len(ret["widgetList"]) == 3
+
+            # Written elsewhere: versions bumped, this container's cache not invalidated
+            self.mock_table.delete_item(Key={environ["DynamoPartitionKey"]: 'FOO'})
+            self.test_env.versions.bump(["color#blue"])
+            again = lambda_handler({"color": "blue", "ifNoneMatch": ret["etag"]}, None)
+            assert len(again["widgetList"]) == 2 and again["etag"] != ret["etag"]
+
+            assert lambda_handler({"color": "blue"}, None) == again
+            assert self.test_env.cache.stats()["hits"] == 1
+
+    def test_lambda_handler_columnar(self):
+        """
+        Columnar format on request, with its own ETag
+        :return:
+        """
+        self.test_env.ddb_limit = 10
+        accept = "application/vnd.widgets.columnar+json"
+        with patch('pylambda.reports.color.app.GLOBAL_ENV', new=self.test_env):
+            expected = lambda_handler({"color": "blue"}, None)
+            ret = lambda_handler({"color": "blue", "accept": accept}, None)
+            assert ret["dictionary"]["color"] == ["blue"]
+            assert from_columnar(ret) == expected
+
+            ret = lambda_handler({"color": "blue", "limit": "2", "accept": accept}, None)
+            assert ret["metadata"]["count"] == 2 and len(ret["columns"]["widgetName"]) == 2
+
+            self.test_env.versions = VersionTracker(
+                create_mock_meta_ddb_table(self.mock_dynamodb))
+            etag = lambda_handler({"color": "blue"}, None)["etag"]
+            ret = lambda_handler({"color": "blue", "accept": accept, "ifNoneMatch": etag}, None)
+            assert ret["etag"] != etag and "widgetList" not in ret
+
     @patch('pylambda.reports.color.app.logging')
     @patch('pylambda.reports.color.app.get_ddb_data')
     @patch('pylambda.reports.color.app.GLOBAL_ENV')
@@ -113,6 +436,7 @@ class TestReportsColor(unittest.TestCase):
 
         # Intercept the environment and logger
         mock_env.return_value = self.test_env
+        mock_env.versions = None
         mock_get_ddb_data.return_value = [{"TEST": "OK"}]
         mock_log.return_value = None
 
@@ -5,6 +5,7 @@
 # Standard Imports
 from sys import path
 from os import environ
+from zlib import crc32
 import unittest
 from unittest.mock import patch
 
@@ -15,6 +16,8 @@ from moto import mock_dynamodb
 # Common test helper utilities for setup
 from tests.env_setup_for_tests import env_setup_for_tests
 from tests.env_setup_for_tests import create_mock_widget_ddb_table
+from tests.env_setup_for_tests import create_mock_ngram_ddb_table
+from tests.env_setup_for_tests import create_mock_meta_ddb_table
 
 # Set up lambda layer directories to support imports, establish mock env
 path.extend(["pylambda/layers/lambdaDdbEnv/python"])
@@ -22,8 +25,37 @@ env_setup_for_tests()
 
 # Class/proc's under test import
 from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import ReadBudget
+from pylambda.layers.lambdaDdbEnv.python.lambdaVersions import VersionTracker
+from pylambda.layers.lambdaDdbEnv.python.lambdaResponseFormat import from_columnar
 from pylambda.reports.filterPage.app import lambda_handler
 from pylambda.reports.filterPage.app import widget_get
+from pylambda.reports.filterPage.app import sequential_scan
+from pylambda.reports.filterPage.app import prefix_successor
+from pylambda.reports.filterPage.app import SEGMENT_CURSOR_PREFIX
+from pylambda.reports.filterPage.app import encode_segment_cursor
+
+
+class SegmentEmulatingTable:
+    """
+    moto ignores Segment/TotalSegments, emulate the partitioning with a key hash
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def scan(self, **kwargs):
+        """
+        Scan the whole table, keep only the items hashed to the requested segment
+        """
+        segment = kwargs.pop("Segment", None)
+        total_segments = kwargs.pop("TotalSegments", None)
+        response = self.table.scan(**kwargs)
+        if segment is not None:
+            pk_name = environ["DynamoPartitionKey"]
+            response["Items"] = [item for item in response["Items"]
+                                 if crc32(item[pk_name].encode()) % total_segments == segment]
+        return response
 
 
 @mock_dynamodb
@@ -108,6 +140,324 @@ class TestReportsFilterPage(unittest.TestCase):
             lambda_handler(test_context, None)
             self.assertTrue('NotFound' in str(context.exception))
 
+    def test_widget_get_fill_page(self):
+        """
+        Filtered pages keep reading until full, within the read budget
+        :return:
+        """
+
+        # One item per scan page, the page is still filled
+        test_context = {"filter": "TEST", "limit": "3", "lastKey": ""}
+        self.test_env.ddb_limit = 1
+        names = []
+        ret = widget_get(test_context, self.test_env)
+        assert ret["metadata"]["count"] == 3
+        assert ret["metadata"]["scanned"] >= 3
+        names.extend(widget["widgetName"] for widget in ret["widgetList"])
+
+        test_context["lastKey"] = ret["metadata"]["next"]
+        ret = widget_get(test_context, self.test_env)
+        names.extend(widget["widgetName"] for widget in ret["widgetList"])
+        assert sorted(names) == ["TEST001", "TEST002", "TEST003", "TEST004"]
+
+        # A spent budget returns short or empty pages with a resume key instead
+        # of NotFound, following the keys still finds every match exactly once
+        self.test_env.scan_time_budget_ms = 0
+        test_context = {"filter": "FOO", "limit": "1", "lastKey": ""}
+        names = []
+        while True:
+            ret = widget_get(test_context, self.test_env)
+            assert ret["metadata"]["scanned"] == 1
+            names.extend(widget["widgetName"] for widget in ret["widgetList"])
+            if ret["metadata"]["next"] == "":
+                break
+            test_context["lastKey"] = ret["metadata"]["next"]
+        assert names == ["FOO"]
+
+    def test_widget_get_fast_path(self):
+        """
+        Sequential scan through the low-level client returns the same pages
+        :return:
+        """
+        test_context = {"filter": "TEST", "limit": "3", "lastKey": ""}
+        self.test_env.ddb_limit = 1
+        expected = widget_get(dict(test_context), self.test_env)
+
+        self.test_env.client = boto3.client('dynamodb', region_name='us-east-1')
+        self.test_env.fast_path = True
+        ret = widget_get(dict(test_context), self.test_env)
+        assert ret == expected
+
+        test_context["lastKey"] = ret["metadata"]["next"]
+        ret = widget_get(test_context, self.test_env)
+        names = [widget["widgetName"] for widget in expected["widgetList"] + ret["widgetList"]]
+        assert sorted(names) == ["TEST001", "TEST002", "TEST003", "TEST004"]
+
+    def test_widget_get_etag(self):
+        """
+        ETag per page, 304 without a scan while the table is unchanged
+        :return:
+        """
+        self.test_env.versions = VersionTracker(create_mock_meta_ddb_table(self.mock_dynamodb))
+        test_context = {"filter": "TEST", "limit": "2", "lastKey": ""}
+        ret = widget_get(dict(test_context), self.test_env)
+        etag = ret["etag"]
+
+        test_context["ifNoneMatch"] = etag
+        with patch('pylambda.reports.filterPage.app.sequential_scan') as mock_scan:
+            with self.assertRaises(Exception) as context:
+                widget_get(dict(test_context), self.test_env)
+            self.assertTrue('NotModified' in str(context.exception))
+            mock_scan.assert_not_called()
+
+        self.test_env.versions.bump(["table"])
+        ret = widget_get(dict(test_context), self.test_env)
+        assert ret["etag"] != etag and ret["metadata"]["count"] == 2
+
+    def test_widget_get_page(self):
+        """
+        Page numbers: walked once, then one indexed lookup and one scan page,
+        previous links, a new index after a write
+        :return:
+        """
+        self.test_env.versions = VersionTracker(create_mock_meta_ddb_table(self.mock_dynamodb))
+        self.test_env.ddb_limit = 1
+        cursor_pages = []
+        test_context = {"limit": "1", "lastKey": ""}
+        while True:
+            ret = widget_get(dict(test_context), self.test_env)
+            cursor_pages.append(ret["widgetList"])
+            if ret["metadata"]["next"] == "":
+                break
+            test_context["lastKey"] = ret["metadata"]["next"]
+
+        ret = widget_get({"limit": "1", "page": "4"}, self.test_env)
+        assert ret["widgetList"] == cursor_pages[3] and ret["metadata"]["page"] == 4
+        assert ret["metadata"]["scanned"] == 4
+
+        with patch('pylambda.reports.filterPage.app.sequential_scan',
+                   wraps=sequential_scan) as mock_scan:
+            ret = widget_get({"limit": "1", "page": "3"}, self.test_env)
+            assert ret["widgetList"] == cursor_pages[2]
+            assert mock_scan.call_count == 1
+            previous = widget_get({"limit": "1", "lastKey": ret["metadata"]["previous"]},
+                                  self.test_env)
+            assert previous["widgetList"] == cursor_pages[1]
+            ret = widget_get({"limit": "1", "page": "2"}, self.test_env)
+            assert ret["metadata"]["previous"] == ""
+            assert widget_get({"limit": "1", "page": "1"}, self.test_env)["widgetList"] == \
+                cursor_pages[0]
+
+        with self.assertRaises(Exception) as context:
+            widget_get({"limit": "1", "page": "9"}, self.test_env)
+        self.assertTrue('NotFound' in str(context.exception))
+        for event in ({"page": "0"}, {"page": "x"}, {"page": "2", "lastKey": "TEST001"}):
+            with self.assertRaises(Exception) as context:
+                widget_get(event, self.test_env)
+            self.assertTrue('NotAcceptable' in str(context.exception))
+
+        # A write starts a new index, the last page is walked to again
+        self.test_env.versions.bump(["table"])
+        with patch('pylambda.reports.filterPage.app.sequential_scan',
+                   wraps=sequential_scan) as mock_scan:
+            ret = widget_get({"limit": "1", "page": "5"}, self.test_env)
+            assert ret["widgetList"] == cursor_pages[4] and ret["metadata"]["next"] == ""
+            assert mock_scan.call_count == 5
+
+    def test_widget_get_prefix(self):
+        """
+        Prefix filters: name index queries over every bucket in name order with
+        exact cursors, the same widgets as the scan fallback
+        :return:
+        """
+        pk_name = environ["DynamoPartitionKey"]
+        self.test_env.name_buckets = 3
+        for idx in range(30):
+            self.mock_table.put_item(Item=self.test_env.widget_to_ddb(
+                {"widgetName": "NAME%03d" % idx, "color": "blue"}))
+            self.mock_table.put_item(Item=self.test_env.widget_to_ddb(
+                {"widgetName": "OTHER%03d" % idx, "color": "blue"}))
+        expected = ["NAME%03d" % idx for idx in range(10, 30)]
+
+        # Without the name index reads the prefix is a scan filter
+        self.test_env.ddb_limit = 100
+        ret = widget_get({"prefix": "NAME01", "limit": "100"}, self.test_env)
+        assert sorted(widget["widgetName"] for widget in ret["widgetList"]) == \
+            ["NAME%03d" % idx for idx in range(10, 20)]
+
+        self.test_env.name_prefix_reads = True
+        with patch.object(self.mock_table, "scan") as mock_scan:
+            names = []
+            test_context = {"prefix": "NAME", "limit": "7", "lastKey": ""}
+            while True:
+                ret = widget_get(dict(test_context), self.test_env)
+                names.extend(widget["widgetName"] for widget in ret["widgetList"])
+                if ret["metadata"]["next"] == "":
+                    break
+                test_context["lastKey"] = ret["metadata"]["next"]
+            mock_scan.assert_not_called()
+        assert names[10:] == expected and names == sorted(names) and len(names) == 30
+
+        # With a substring filter, and resuming within the prefix range.  The key
+        # of the index cannot be filtered on, DynamoDB rejects such a query
+        with patch.object(self.test_env, "read_widgets",
+                          wraps=self.test_env.read_widgets) as mock_read:
+            ret = widget_get({"prefix": "NAME", "filter": "2", "limit": "5",
+                              "lastKey": "NAME019"}, self.test_env)
+        assert all("FilterExpression" not in call.kwargs for call in mock_read.call_args_list)
+        assert [widget["widgetName"] for widget in ret["widgetList"]] == \
+            ["NAME020", "NAME021", "NAME022", "NAME023", "NAME024"]
+        assert ret["metadata"]["next"] == "NAME024"
+
+        # A spent budget stops at the lowest bucket position, nothing is skipped
+        self.test_env.scan_time_budget_ms = 0
+        self.test_env.ddb_limit = 2
+        names = []
+        test_context = {"prefix": "OTHER", "limit": "50", "lastKey": ""}
+        while True:
+            ret = widget_get(dict(test_context), self.test_env)
+            names.extend(widget["widgetName"] for widget in ret["widgetList"])
+            if ret["metadata"]["next"] == "":
+                break
+            test_context["lastKey"] = ret["metadata"]["next"]
+        assert names == ["OTHER%03d" % idx for idx in range(30)]
+        assert self.mock_table.get_item(Key={pk_name: "OTHER001"})["Item"]["nameBucket"] == \
+            self.test_env.name_bucket("OTHER001")
+
+    def test_prefix_successor(self):
+        """
+        Upper bounds of prefix ranges
+        :return:
+        """
+        assert prefix_successor("TEST0") == "TEST1"
+        assert prefix_successor("a\U0010ffff") == "b"
+        assert prefix_successor("\ud7ff") == "\ue000"
+        assert prefix_successor("\U0010ffff") is None
+
+    def test_widget_get_columnar(self):
+        """
+        Columnar page with the same widgets and metadata as the JSON page
+        :return:
+        """
+        test_context = {"filter": "TEST", "limit": "3", "lastKey": ""}
+        expected = widget_get(dict(test_context), self.test_env)
+        test_context["accept"] = "application/json;q=0.5, application/vnd.widgets.columnar+json"
+        ret = widget_get(dict(test_context), self.test_env)
+        assert "widgetList" not in ret
+        assert ret["metadata"] == expected["metadata"]
+        assert from_columnar(ret) == expected["widgetList"]
+
+    def test_widget_get_ngram(self):
+        """
+        Substring filters through the n-gram postings index
+        :return:
+        """
+        self.test_env.ngram_table = create_mock_ngram_ddb_table(self.mock_dynamodb)
+        self.test_env.ngram_reads = True
+        with self.test_env.ngram_table.batch_writer() as batch:
+            for data in self.sample_data:
+                name = data[environ["DynamoPartitionKey"]]
+                for gram in self.test_env.widget_ngrams(name):
+                    batch.put_item(Item={"gram": gram, "widgetName": name})
+
+        # Widgets come back in name order, paged by name
+        test_context = {"filter": "EST00", "limit": "3", "lastKey": ""}
+        ret = widget_get(test_context, self.test_env)
+        assert [widget["widgetName"] for widget in ret["widgetList"]] == \
+               ["TEST001", "TEST002", "TEST003"]
+        assert ret["widgetList"][1]["color"] == "blue"
+        assert ret["metadata"]["next"] == "TEST003"
+
+        test_context["lastKey"] = ret["metadata"]["next"]
+        ret = widget_get(test_context, self.test_env)
+        assert [widget["widgetName"] for widget in ret["widgetList"]] == ["TEST004"]
+        assert ret["metadata"]["next"] == ""
+
+        # No widget holds every n-gram of the filter
+        with self.assertRaises(Exception) as context:
+            widget_get({"filter": "TEST003TES"}, self.test_env)
+        self.assertTrue('NotFound' in str(context.exception))
+
+        # One posting page per query, the budget stops the search part way with
+        # an exact cursor
+        self.test_env.ddb_limit = 1
+        names = []
+        test_context = {"filter": "EST00", "limit": "10", "lastKey": ""}
+        with patch('pylambda.reports.filterPage.app.ReadBudget.exhausted', return_value=True):
+            while True:
+                ret = widget_get(test_context, self.test_env)
+                names.extend(widget["widgetName"] for widget in ret["widgetList"])
+                assert ret["metadata"]["count"] <= 1
+                if ret["metadata"]["next"] == "":
+                    break
+                test_context["lastKey"] = ret["metadata"]["next"]
+        assert names == ["TEST001", "TEST002", "TEST003", "TEST004"]
+        self.test_env.ddb_limit = 10
+
+        # Reads stay on the scan until DynamoNgramReads
+        self.test_env.ngram_reads = False
+        with patch('pylambda.reports.filterPage.app.ngram_search') as mock_search:
+            ret = widget_get({"filter": "EST00", "limit": "5"}, self.test_env)
+            mock_search.assert_not_called()
+        assert ret["metadata"]["count"] == 4
+        self.test_env.ngram_reads = True
+
+        # Filters shorter than the n-gram fall back to the scan
+        with patch('pylambda.reports.filterPage.app.ngram_search') as mock_search:
+            ret = widget_get({"filter": "FO", "limit": "5"}, self.test_env)
+            mock_search.assert_not_called()
+        assert ret["widgetList"] == [{"widgetName": "FOO", "color": "yellow"}]
+
+    def test_widget_get_parallel(self):
+        """
+        Filtered pages through the parallel segmented scan
+        :return:
+        """
+        self.test_env.ddb_table = SegmentEmulatingTable(self.mock_table)
+        self.test_env.scan_segments = 3
+        self.test_env.scan_workers = 3
+
+        names = []
+        test_context = {"filter": "TEST", "limit": "3", "lastKey": ""}
+        ret = widget_get(test_context, self.test_env)
+        assert ret["metadata"]["count"] == 3
+        assert ret["metadata"]["next"].startswith(SEGMENT_CURSOR_PREFIX)
+        names.extend(widget["widgetName"] for widget in ret["widgetList"])
+
+        # Same cursor, same page
+        test_context["lastKey"] = ret["metadata"]["next"]
+        ret = widget_get(test_context, self.test_env)
+        assert ret == widget_get(test_context, self.test_env)
+        assert ret["metadata"]["next"] == ""
+        names.extend(widget["widgetName"] for widget in ret["widgetList"])
+        assert sorted(names) == ["TEST001", "TEST002", "TEST003", "TEST004"]
+
+        # A plain widget name resumes the sequential scan after it
+        ret = widget_get({"filter": "TEST", "limit": "3", "lastKey": "TEST002"}, self.test_env)
+        assert [widget["widgetName"] for widget in ret["widgetList"]] == \
+            [widget["widgetName"] for widget in sequential_scan(
+                {"FilterExpression": "contains(#S, :s)",
+                 "ExpressionAttributeNames": {"#S": environ["DynamoPartitionKey"]},
+                 "ExpressionAttributeValues": {":s": "TEST"}},
+                self.test_env, 3, "TEST002", ReadBudget(10000))[0]]
+        assert not ret["metadata"]["next"].startswith(SEGMENT_CURSOR_PREFIX)
+
+        # Pages that end before the table does, on the read-ahead budget, resume
+        page = {"Widgets": [{"widgetName": "TEST001"}],
+                "LastEvaluatedKey": {environ["DynamoPartitionKey"]: "TEST001"}}
+        with patch.object(self.test_env, 'paginate_widgets', return_value=iter([page])):
+            assert sequential_scan({"FilterExpression": "contains(#S, :s)"}, self.test_env,
+                                   3, "", ReadBudget(10000)) == \
+                ([{"widgetName": "TEST001"}], "TEST001")
+
+        # Corrupt and crafted cursors
+        for cursor in [SEGMENT_CURSOR_PREFIX + "!!", encode_segment_cursor([1]),
+                       encode_segment_cursor([{}]), encode_segment_cursor([""] * 65),
+                       SEGMENT_CURSOR_PREFIX + "e30="]:
+            with self.assertRaises(Exception) as context:
+                widget_get({"filter": "TEST", "lastKey": cursor}, self.test_env)
+            self.assertTrue('NotAcceptable' in str(context.exception))
+
     @patch('pylambda.reports.filterPage.app.logging')
     @patch('pylambda.reports.filterPage.app.GLOBAL_ENV')
     def test_lambda_handler(self, mock_env, mock_log):
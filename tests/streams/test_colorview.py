@@ -0,0 +1,125 @@
+"""
+    Test Suite for the widget table stream consumer
+"""
+
+# Standard Imports
+from sys import path
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_color_view_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaColorView import ColorView
+from pylambda.streams.colorView.app import apply_records
+
+
+def stream_record(event_name: str, widget_name: str, old_color: str = None,
+                  new_color: str = None, sequence: str = "1") -> dict:
+    """
+    DynamoDB stream record of the widget table
+    """
+    change = {"Keys": {"testing_ddb_pk": {"S": widget_name}}, "SequenceNumber": sequence}
+    if old_color is not None:
+        change["OldImage"] = {"testing_ddb_pk": {"S": widget_name}, "color": {"S": old_color}}
+    if new_color is not None:
+        change["NewImage"] = {"testing_ddb_pk": {"S": widget_name}, "color": {"S": new_color}}
+    return {"eventName": event_name, "dynamodb": change}
+
+
+@mock_dynamodb
+class TestColorViewStream(unittest.TestCase):
+    """
+    Test Suite for the widget table stream consumer
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_color_view_ddb_table(self.mock_dynamodb)
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.color_view = ColorView(self.mock_table, 4)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_apply_records(self):
+        """
+        Insert, color change, same color update and delete, replayed batch
+        :return:
+        """
+        batch = {"Records": [
+            stream_record("INSERT", "TEST001", new_color="blue", sequence="1"),
+            stream_record("INSERT", "TEST002", new_color="blue", sequence="2"),
+            stream_record("MODIFY", "TEST001", "blue", "red", sequence="3"),
+            stream_record("MODIFY", "TEST002", "blue", "blue", sequence="4"),
+            stream_record("REMOVE", "TEST002", old_color="blue", sequence="5")
+        ]}
+        view = self.test_env.color_view
+        for _ in range(2):
+            assert apply_records(batch, self.test_env) == {"batchItemFailures": []}
+            assert view.members("blue") == []
+            assert view.members("red") == ["TEST001"]
+            assert view.counts() == {"red": 1}
+
+    @patch('pylambda.streams.colorView.app.logging')
+    def test_apply_records_failure(self, mock_log):
+        """
+        A failed record is reported so the batch is retried from it
+        :param mock_log: mocked object pylambda.streams.colorView.app.logging
+        :return:
+        """
+        batch = {"Records": [
+            stream_record("INSERT", "TEST001", new_color="blue", sequence="1"),
+            stream_record("INSERT", "TEST002", new_color="blue", sequence="2")
+        ]}
+        view = self.test_env.color_view
+        with patch.object(view, 'add', side_effect=[True, ClientError(
+                {"Error": {"Code": "ProvisionedThroughputExceededException",
+                           "Message": "Error"}}, "TransactWriteItems")]):
+            ret = apply_records(batch, self.test_env)
+        assert ret == {"batchItemFailures": [{"itemIdentifier": "2"}]}
+        mock_log.error.assert_called_once()
+
+    @patch('pylambda.streams.colorView.app.logging')
+    def test_apply_records_permanent(self, mock_log):
+        """
+        A change that can never succeed marks its color stale, the batch goes on
+        :param mock_log: mocked object pylambda.streams.colorView.app.logging
+        :return:
+        """
+        batch = {"Records": [
+            stream_record("INSERT", "TEST001", new_color="blue", sequence="1"),
+            stream_record("INSERT", "TEST002", new_color="red", sequence="2")
+        ]}
+        view = self.test_env.color_view
+        add = view.add
+        with patch.object(view, 'add', side_effect=[ClientError(
+                {"Error": {"Code": "TransactionCanceledException", "Message": "Error"},
+                 "CancellationReasons": [{"Code": "ValidationError"}, {"Code": "None"}]},
+                "TransactWriteItems"), add("red", "TEST002")]):
+            ret = apply_records(batch, self.test_env)
+        assert ret == {"batchItemFailures": []}
+        mock_log.error.assert_called_once()
+        assert view.members("blue") is None
+        assert view.members("red") == ["TEST002"]
@@ -0,0 +1,80 @@
+"""
+    Test Suite for tools/color_view
+"""
+
+# Standard Imports
+from sys import path
+from os import environ
+import unittest
+
+import boto3
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+from tests.env_setup_for_tests import create_mock_color_view_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaColorView import ColorView
+from tools.color_view import check
+from tools.color_view import rebuild
+
+
+@mock_dynamodb
+class TestColorViewTool(unittest.TestCase):
+    """
+    Test Suite for tools/color_view
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+        for name, color in [("TEST001", "blue"), ("TEST002", "blue"), ("TEST003", "red")]:
+            self.mock_table.put_item(Item={environ["DynamoPartitionKey"]: name, "color": color})
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.ddb_table = self.mock_table
+        self.test_env.color_view = ColorView(
+            create_mock_color_view_ddb_table(self.mock_dynamodb), 4)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_rebuild_check(self):
+        """
+        Rebuild from the index, detect and repair drift
+        :return:
+        """
+        view = self.test_env.color_view
+        view.add("green", "GONE")
+        assert rebuild(self.test_env) == {"blue": 2, "green": 0, "red": 1}
+        assert check(self.test_env) == []
+
+        view.remove("blue", "TEST001")
+        view.add("red", "EXTRA")
+        problems = check(self.test_env, repair=True)
+        assert [(problem["color"], problem["missing"], problem["extra"])
+                for problem in problems] == [("blue", ["TEST001"], []), ("red", [], ["EXTRA"])]
+        assert check(self.test_env) == []
+        assert view.counts() == {"blue": 2, "red": 1}
+
+        # A stale color is reported until repaired
+        view.mark_stale("red")
+        assert [problem["stale"] for problem in check(self.test_env)] == [True]
+        check(self.test_env, repair=True)
+        assert check(self.test_env) == []
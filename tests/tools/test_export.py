@@ -0,0 +1,131 @@
+"""
+    Test Suite for tools/export
+"""
+
+# Standard Imports
+from sys import path
+from os import environ
+from gzip import decompress
+from tempfile import TemporaryDirectory
+import json
+import unittest
+from unittest.mock import patch
+
+import boto3
+from moto import mock_dynamodb, mock_s3
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from tools.export import LocalStore, S3Store, export, verify
+
+
+@mock_dynamodb
+class TestExportTool(unittest.TestCase):
+    """
+    Test Suite for tools/export
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+        pk_name = environ["DynamoPartitionKey"]
+        for idx in range(25):
+            self.mock_table.put_item(Item={pk_name: "TEST%03d" % idx, "color": "blue"})
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.ddb_table = self.mock_table
+        self.directory = TemporaryDirectory()
+        self.store = LocalStore(self.directory.name)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+        self.directory.cleanup()
+
+    def exported_names(self, manifest: dict) -> list:
+        """
+        :param manifest: export manifest
+        :return: widget names of every part, in part order
+        """
+        names = []
+        for part in manifest["parts"]:
+            for line in decompress(self.store.read(part["name"])).splitlines():
+                names.append(json.loads(line)["widgetName"])
+        return names
+
+    def test_export(self):
+        """
+        Parts on page boundaries, manifest counts and checksums, verify
+        :return:
+        """
+        manifest = export(self.test_env, self.store, page_size=4, part_rows=10)
+        assert manifest["rows"] == 25 and manifest["totalSegments"] == 1
+        assert [part["rows"] for part in manifest["parts"]] == [12, 12, 1]
+        assert sorted(self.exported_names(manifest)) == ["TEST%03d" % idx for idx in range(25)]
+        assert verify(self.store) == []
+
+        # A finished export is not repeated
+        assert export(self.test_env, self.store) == manifest
+
+        self.store.write(manifest["parts"][1]["name"], b"")
+        assert verify(self.store) == ["%s: checksum mismatch" % manifest["parts"][1]["name"]]
+
+    def test_resume(self):
+        """
+        An export interrupted after a part resumes after the checkpointed position
+        :return:
+        """
+        write = self.store.write
+        calls = []
+
+        def failing_write(name: str, data: bytes):
+            calls.append(name)
+            if len(calls) == 3:
+                raise OSError("disk full")
+            write(name, data)
+
+        with patch.object(self.store, "write", side_effect=failing_write):
+            with self.assertRaises(OSError):
+                export(self.test_env, self.store, page_size=5, part_rows=5)
+        assert verify(self.store) == ["no manifest, the export is not complete"]
+        checkpoint = json.loads(self.store.read("checkpoints/segment-0000.json"))
+        assert len(checkpoint["parts"]) == 1 and not checkpoint["done"]
+
+        # Resuming needs the same segmentation
+        with self.assertRaises(ValueError):
+            export(self.test_env, self.store, segments=2, page_size=5, part_rows=5)
+
+        manifest = export(self.test_env, self.store, page_size=5, part_rows=5)
+        names = self.exported_names(manifest)
+        assert sorted(names) == ["TEST%03d" % idx for idx in range(25)]
+        assert verify(self.store) == []
+
+    @mock_s3
+    def test_s3_store(self):
+        """
+        The same export into an S3 bucket
+        :return:
+        """
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="exports")
+        store = S3Store("exports", "widgets/run1", client)
+        manifest = export(self.test_env, store, page_size=10, part_rows=100)
+        assert manifest["rows"] == 25 and verify(store) == []
+        assert client.head_object(Bucket="exports", Key="widgets/run1/manifest.json")
+        assert store.read("missing.json") is None
@@ -0,0 +1,80 @@
+"""
+    Test Suite for tools/index_keys and the backfill tools built on it
+"""
+
+# Standard Imports
+from sys import path
+from os import environ
+import unittest
+
+import boto3
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from tools import color_shards
+from tools import name_buckets
+
+
+@mock_dynamodb
+class TestIndexKeysTools(unittest.TestCase):
+    """
+    Test Suite for tools/color_shards and tools/name_buckets
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.ddb_table = self.mock_table
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_backfill(self):
+        """
+        Widgets without the key or with the key of another count get the current one
+        :return:
+        """
+        pk_name = environ["DynamoPartitionKey"]
+        tools = [(color_shards, "color_shards", "colorShard",
+                  lambda item: self.test_env.color_shard(item[pk_name], "blue")),
+                 (name_buckets, "name_buckets", "nameBucket",
+                  lambda item: self.test_env.name_bucket(item[pk_name]))]
+        for tool, count, attribute, key in tools:
+            with self.subTest(tool=tool.__name__):
+                for idx in range(10):
+                    self.mock_table.put_item(Item={pk_name: "TEST%03d" % idx, "color": "blue"})
+                setattr(self.test_env, count, 2)
+                self.mock_table.put_item(Item=self.test_env.widget_to_ddb(
+                    {"widgetName": "TEST000", "color": "blue"}))
+
+                assert tool.backfill(self.test_env, dry_run=True)["updated"] == 9
+                assert tool.backfill(self.test_env) == {"scanned": 10, "updated": 9,
+                                                        "skipped": 0}
+                assert tool.backfill(self.test_env)["updated"] == 0
+
+                setattr(self.test_env, count, 3)
+                tool.backfill(self.test_env)
+                for item in self.mock_table.scan()["Items"]:
+                    assert item[attribute] == key(item)
+                    assert item["color"] == "blue"
+                setattr(self.test_env, count, 0)
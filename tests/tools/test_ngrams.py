@@ -0,0 +1,70 @@
+"""
+    Test Suite for tools/ngrams
+"""
+
+# Standard Imports
+from sys import path
+from os import environ
+import unittest
+
+import boto3
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+from tests.env_setup_for_tests import create_mock_ngram_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from tools.ngrams import backfill
+
+
+@mock_dynamodb
+class TestNgramsTool(unittest.TestCase):
+    """
+    Test Suite for tools/ngrams
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.ddb_table = self.mock_table
+        self.test_env.ngram_table = create_mock_ngram_ddb_table(self.mock_dynamodb)
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_backfill(self):
+        """
+        Every existing widget gets the postings of its name, re-runs change nothing
+        :return:
+        """
+        pk_name = environ["DynamoPartitionKey"]
+        for idx in range(10):
+            self.mock_table.put_item(Item={pk_name: "TEST%03d" % idx, "color": "blue"})
+        self.mock_table.put_item(Item={pk_name: "AB", "color": "red"})
+
+        assert backfill(self.test_env, dry_run=True) == {"scanned": 11, "postings": 50}
+        assert self.test_env.ngram_table.scan()["Count"] == 0
+
+        assert backfill(self.test_env)["postings"] == 50
+        assert backfill(self.test_env)["postings"] == 50
+        postings = self.test_env.ngram_table.scan()["Items"]
+        assert len(postings) == 50
+        assert {"gram": "005", "widgetName": "TEST005"} in postings
@@ -0,0 +1,60 @@
+"""
+    Test Suite for tools/profiles
+"""
+
+# Standard Imports
+from sys import path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+import unittest
+
+# Set up lambda layer directories to support imports
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaProfiler import DirectorySink
+from pylambda.layers.lambdaDdbEnv.python.lambdaProfiler import HandlerProfiler
+from tools.profiles import load_summaries, report
+
+
+def sort_handler(event: dict, context: object) -> list:
+    """
+    Handler with a recognizable hot spot
+    """
+    return sorted(str(number) for number in range(event["size"]))
+
+
+class TestProfilesTool(unittest.TestCase):
+    """
+    Test Suite for tools/profiles
+    """
+
+    def test_report(self):
+        """
+        Profiles of several invocations and functions aggregate into one report
+        """
+        with TemporaryDirectory() as directory:
+            sink = DirectorySink(directory)
+            for function in ["widgetGet", "colorReport"]:
+                handler = HandlerProfiler(function, 1, sink, memory=True).wrap(sort_handler)
+                for number in range(3):
+                    handler({"size": 2000}, SimpleNamespace(aws_request_id="%s-%d"
+                                                           % (function, number)))
+
+            summaries = load_summaries(directory)
+            assert len(summaries) == 6
+            assert len(load_summaries(directory, "widgetGet")) == 3
+            assert len(load_summaries(directory, cold=True)) == 2
+            assert len(load_summaries(directory, cold=False)) == 4
+
+            text = report(summaries, top=10, sort="tottime")
+            assert text.startswith("6 invocations (2 cold, 0 failed)")
+            assert "cold start init CPU ms" in text
+            assert "sort_handler" in text
+            assert "memory still allocated at return, by site (6 traced invocations)" in text
+
+        assert report([]) == "no profiles\n"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+    Test Suite for /widgets/batch PUT
+"""
+
+# Standard Imports
+from sys import path
+from os import environ
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+from tests.env_setup_for_tests import create_mock_ngram_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.widget.batchPut.app import lambda_handler
+from pylambda.widget.batchPut.app import widget_batch_put
+
+
+@mock_dynamodb
+class TestWidgetBatchPut(unittest.TestCase):
+    """
+    Test Suite for /widgets/batch PUT
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.ddb_table = self.mock_table
+        self.test_env.batch_backoff_ms = 0
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_widget_batch_put(self):
+        """
+        Validation, deduplication and chunked writes
+        :return:
+        """
+        widgets = [{"widgetName": "W%03d" % idx, "color": "blue"} for idx in range(60)]
+        widgets.append({"widgetName": "W000", "color": "red"})
+        widgets.append({"widgetName": "", "color": "red"})
+        widgets.append("not a widget")
+
+        ret = widget_batch_put({"widgets": widgets}, self.test_env)
+        statuses = [result["status"] for result in ret["results"]]
+        assert statuses[0] == "duplicate"
+        assert statuses[1:61] == ["written"] * 60
+        assert statuses[61:] == ["invalid", "invalid"]
+        assert ret["metadata"]["written"] == 60
+        assert ret["metadata"]["failed"] == 0
+
+        assert self.mock_table.scan(Select="COUNT")["Count"] == 60
+        item = self.mock_table.get_item(Key={environ["DynamoPartitionKey"]: "W000"})["Item"]
+        assert item["color"] == "red"
+
+        with self.assertRaises(Exception) as context:
+            widget_batch_put({"widgets": []}, self.test_env)
+        self.assertTrue('NotAcceptable' in str(context.exception))
+
+        self.test_env.batch_max_items = 2
+        with self.assertRaises(Exception) as context:
+            widget_batch_put({"widgets": widgets}, self.test_env)
+        self.assertTrue('NotAcceptable' in str(context.exception))
+
+    @patch('pylambda.widget.batchPut.app.logging')
+    def test_widget_batch_put_unprocessed(self, mock_log):
+        """
+        Unprocessed items are retried, then reported as failed
+        :param mock_log: mocked object pylambda.widget.batchPut.app.logging
+        :return:
+        """
+        table_name = environ["DynamoName"]
+        client = self.mock_dynamodb.meta.client
+        real_batch_write = client.batch_write_item
+        calls = []
+
+        def throttled_once(RequestItems):
+            # First call leaves the last item unprocessed
+            calls.append(RequestItems)
+            if len(calls) == 1:
+                unprocessed = RequestItems[table_name][-1:]
+                real_batch_write(RequestItems={table_name: RequestItems[table_name][:-1]})
+                return {"UnprocessedItems": {table_name: unprocessed}}
+            return real_batch_write(RequestItems=RequestItems)
+
+        widgets = [{"widgetName": "W%03d" % idx, "color": "blue"} for idx in range(3)]
+        with patch.object(client, 'batch_write_item', side_effect=throttled_once):
+            ret = widget_batch_put({"widgets": widgets}, self.test_env)
+        assert len(calls) == 2
+        assert ret["metadata"]["written"] == 3
+
+        # Never processed
+        self.test_env.batch_max_retries = 2
+        with patch.object(client, 'batch_write_item',
+                          side_effect=lambda RequestItems: {"UnprocessedItems": RequestItems}):
+            ret = widget_batch_put({"widgets": widgets}, self.test_env)
+        assert ret["metadata"]["failed"] == 3
+        assert ret["results"][0]["status"] == "failed"
+
+        # Service error fails the chunk, not the call
+        with patch.object(client, 'batch_write_item',
+                          side_effect=ClientError({"Error": {"Code": "ValidationException",
+                                                             "Message": "Error"}},
+                                                  "BatchWriteItem")):
+            ret = widget_batch_put({"widgets": widgets}, self.test_env)
+        assert ret["results"][0] == {"widgetName": "W000", "status": "failed",
+                                     "message": "ValidationException"}
+
+    def test_widget_batch_put_ngram_postings(self):
+        """
+        Only widgets not stored yet get postings
+        :return:
+        """
+        self.test_env.ngram_table = create_mock_ngram_ddb_table(self.mock_dynamodb)
+        self.mock_table.put_item(Item={environ["DynamoPartitionKey"]: "OLD1", "color": "red"})
+
+        widget_batch_put({"widgets": [{"widgetName": "OLD1", "color": "blue"},
+                                      {"widgetName": "NEW1", "color": "blue"}]},
+                         self.test_env)
+        postings = self.test_env.ngram_table.scan()["Items"]
+        assert {posting["widgetName"] for posting in postings} == {"NEW1"}
+
+    @patch('pylambda.widget.batchPut.app.logging')
+    @patch('pylambda.widget.batchPut.app.widget_batch_put')
+    def test_lambda_handler(self, mock_widget_batch_put, mock_log):
+        """
+        Full test of lambda_handler
+        :param mock_widget_batch_put: mocked object pylambda.widget.batchPut.app.widget_batch_put
+        :param mock_log: mocked object pylambda.widget.batchPut.app.logging
+        :return:
+        """
+        mock_widget_batch_put.side_effect = ClientError({"Error": {"Code": "500",
+                                                                   "Message": "Error"}},
+                                                        "Operation", )
+        with self.assertRaises(Exception) as context:
+            lambda_handler({"widgets": []}, None)
+        mock_log.error.assert_called_once()
+        self.assertTrue('error' in str(context.exception))
@@ -0,0 +1,106 @@
+"""
+    Test Suite for /widget/{widgetName} GET
+"""
+
+# Standard Imports
+from sys import path
+from os import environ
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbCache import LruTtlCache
+from pylambda.widget.get.app import lambda_handler
+from pylambda.widget.get.app import widget_get
+
+
+@mock_dynamodb
+class TestWidgetGet(unittest.TestCase):
+    """
+    Test Suite for /widget/{widgetName} GET
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+        self.mock_table.put_item(Item={environ["DynamoPartitionKey"]: "TEST001",
+                                       "color": "blue"})
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.ddb_table = self.mock_table
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_widget_get(self):
+        """
+        Test handler for widget_get
+        :return:
+        """
+        ret = widget_get({"widgetName": "TEST001"}, self.test_env)
+        assert ret == {"widgetName": "TEST001", "color": "blue"}
+
+        with self.assertRaises(Exception) as context:
+            widget_get({"widgetName": "WILLNOTBEFOUND"}, self.test_env)
+        self.assertTrue('NotFound' in str(context.exception))
+
+        with self.assertRaises(Exception) as context:
+            widget_get({"widgetName": " "}, self.test_env)
+        self.assertTrue('NotAcceptable' in str(context.exception))
+
+    def test_widget_get_cached(self):
+        """
+        Reads through the in-process cache
+        :return:
+        """
+        self.test_env.cache = LruTtlCache(10, 10000, 60)
+        widget_get({"widgetName": "TEST001"}, self.test_env)
+        self.mock_table.delete_item(Key={environ["DynamoPartitionKey"]: "TEST001"})
+        ret = widget_get({"widgetName": "TEST001"}, self.test_env)
+        assert ret == {"widgetName": "TEST001", "color": "blue"}
+        assert self.test_env.cache.stats()["hits"] == 1
+
+    @patch('pylambda.widget.get.app.logging')
+    @patch('pylambda.widget.get.app.widget_get')
+    def test_lambda_handler(self, mock_widget_get, mock_log):
+        """
+        Full test of lambda_handler
+        :param mock_widget_get: mocked object pylambda.widget.get.app.widget_get
+        :param mock_log: mocked object pylambda.widget.get.app.logging
+        :return:
+        """
+        mock_widget_get.side_effect = ClientError({"Error": {"Code": "500", "Message": "Error"}},
+                                                  "Operation", )
+        with self.assertRaises(Exception) as context:
+            lambda_handler({"widgetName": "TEST001"}, None)
+        mock_log.error.assert_called_once()
+        self.assertTrue('error' in str(context.exception))
+
+        mock_widget_get.side_effect = ClientError(
+            {"Error": {"Code": "ProvisionedThroughputExceededException", "Message": "Rate"}},
+            "GetItem")
+        with self.assertRaises(Exception) as context:
+            lambda_handler({"widgetName": "TEST001"}, None)
+        self.assertTrue(str(context.exception).startswith("Throttled"))
@@ -0,0 +1,138 @@
+"""
+    Test Suite for /widgets/lookup POST
+"""
+
+# Standard Imports
+from sys import path
+from os import environ
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbCache import LruTtlCache
+from pylambda.widget.lookup.app import lambda_handler
+from pylambda.widget.lookup.app import widget_lookup
+
+
+@mock_dynamodb
+class TestWidgetLookup(unittest.TestCase):
+    """
+    Test Suite for /widgets/lookup POST
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+        with self.mock_table.batch_writer() as batch:
+            for idx in range(250):
+                batch.put_item(Item={environ["DynamoPartitionKey"]: "W%03d" % idx,
+                                     "color": "blue" if idx % 2 else "red"})
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.ddb_table = self.mock_table
+        self.test_env.batch_backoff_ms = 0
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_widget_lookup(self):
+        """
+        Results in request order across 100 key chunks, missing names marked
+        :return:
+        """
+        names = ["W%03d" % idx for idx in reversed(range(250))] + ["MISSING", "W001"]
+        ret = widget_lookup({"widgetNames": names}, self.test_env)
+
+        assert [result["widgetName"] for result in ret["results"]] == names
+        assert ret["results"][0] == {"widgetName": "W249", "color": "blue", "status": "found"}
+        assert ret["results"][250] == {"widgetName": "MISSING", "status": "notFound"}
+        assert ret["results"][251]["color"] == "blue"
+        assert ret["metadata"]["found"] == 251
+
+        for bad_input in [{}, {"widgetNames": []}, {"widgetNames": ["W001", " "]}]:
+            with self.assertRaises(Exception) as context:
+                widget_lookup(bad_input, self.test_env)
+            self.assertTrue('NotAcceptable' in str(context.exception))
+
+        self.test_env.lookup_max_names = 10
+        with self.assertRaises(Exception) as context:
+            widget_lookup({"widgetNames": names}, self.test_env)
+        self.assertTrue('NotAcceptable' in str(context.exception))
+
+    def test_widget_lookup_unprocessed(self):
+        """
+        UnprocessedKeys are retried
+        :return:
+        """
+        table_name = environ["DynamoName"]
+        client = self.mock_dynamodb.meta.client
+        real_batch_get = client.batch_get_item
+        calls = []
+
+        def throttled_once(RequestItems):
+            # First call leaves the last key unprocessed
+            calls.append(RequestItems)
+            if len(calls) == 1:
+                request = dict(RequestItems[table_name])
+                unprocessed = dict(request, Keys=request["Keys"][-1:])
+                request["Keys"] = request["Keys"][:-1]
+                response = real_batch_get(RequestItems={table_name: request})
+                response["UnprocessedKeys"] = {table_name: unprocessed}
+                return response
+            return real_batch_get(RequestItems=RequestItems)
+
+        with patch.object(client, 'batch_get_item', side_effect=throttled_once):
+            ret = widget_lookup({"widgetNames": ["W001", "W002"]}, self.test_env)
+        assert len(calls) == 2
+        assert ret["metadata"]["found"] == 2
+
+    def test_widget_lookup_cached(self):
+        """
+        Cached widgets are not fetched
+        :return:
+        """
+        self.test_env.cache = LruTtlCache(10, 10000, 60)
+        self.test_env.cache.put(("widget", "CACHED"), {"widgetName": "CACHED", "color": "gold"})
+        ret = widget_lookup({"widgetNames": ["CACHED", "W001"]}, self.test_env)
+        assert ret["results"][0]["color"] == "gold"
+        assert self.test_env.cache.get(("widget", "W001")) == {"widgetName": "W001",
+                                                               "color": "blue"}
+
+    @patch('pylambda.widget.lookup.app.logging')
+    @patch('pylambda.widget.lookup.app.widget_lookup')
+    def test_lambda_handler(self, mock_widget_lookup, mock_log):
+        """
+        Full test of lambda_handler
+        :param mock_widget_lookup: mocked object pylambda.widget.lookup.app.widget_lookup
+        :param mock_log: mocked object pylambda.widget.lookup.app.logging
+        :return:
+        """
+        mock_widget_lookup.side_effect = ClientError({"Error": {"Code": "500",
+                                                                "Message": "Error"}},
+                                                     "Operation", )
+        with self.assertRaises(Exception) as context:
+            lambda_handler({"widgetNames": ["W001"]}, None)
+        mock_log.error.assert_called_once()
+        self.assertTrue('error' in str(context.exception))
@@ -0,0 +1,150 @@
+"""
+    Test Suite for /widget PUT
+"""
+
+# Standard Imports
+from sys import path
+from os import environ
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb
+
+# Common test helper utilities for setup
+from tests.env_setup_for_tests import env_setup_for_tests
+from tests.env_setup_for_tests import create_mock_widget_ddb_table
+from tests.env_setup_for_tests import create_mock_ngram_ddb_table
+from tests.env_setup_for_tests import create_mock_meta_ddb_table
+
+# Set up lambda layer directories to support imports, establish mock env
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+env_setup_for_tests()
+
+# Class/proc's under test import
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbEnvLayer import EnvParams
+from pylambda.layers.lambdaDdbEnv.python.lambdaDdbCache import LruTtlCache
+from pylambda.layers.lambdaDdbEnv.python.lambdaVersions import VersionTracker
+from pylambda.widget.put.app import lambda_handler
+from pylambda.widget.put.app import widget_put
+
+
+@mock_dynamodb
+class TestWidgetPut(unittest.TestCase):
+    """
+    Test Suite for /widget PUT
+    """
+
+    def setUp(self):
+        """
+        Establish test configuration
+        :return:
+        """
+        env_setup_for_tests()
+        self.mock_dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        self.mock_table = create_mock_widget_ddb_table(self.mock_dynamodb)
+
+        self.test_env = EnvParams()
+        self.test_env.dynamodb = self.mock_dynamodb
+        self.test_env.ddb_table = self.mock_table
+
+    def tearDown(self):
+        """
+        Delete database resource and mock table
+        """
+        self.mock_table.delete()
+
+    def test_widget_put(self):
+        """
+        Test handler for widget_put
+        :return:
+        """
+        ret = widget_put({"widgetName": "TEST001", "color": "blue"}, self.test_env)
+        assert ret == {"widgetName": "TEST001", "color": "blue"}
+
+        ret = widget_put({"widgetName": "TEST001", "color": "red"}, self.test_env)
+        item = self.mock_table.get_item(Key={environ["DynamoPartitionKey"]: "TEST001"})["Item"]
+        assert item["color"] == "red"
+
+        with self.assertRaises(Exception) as context:
+            widget_put({"widgetName": " ", "color": "red"}, self.test_env)
+        self.assertTrue('NotAcceptable' in str(context.exception))
+
+        with self.assertRaises(Exception) as context:
+            widget_put({"widgetName": "TEST001"}, self.test_env)
+        self.assertTrue('NotAcceptable' in str(context.exception))
+
+    def test_widget_put_sharded(self):
+        """
+        The sharded color key follows the color
+        :return:
+        """
+        self.test_env.color_shards = 4
+        widget_put({"widgetName": "TEST001", "color": "blue"}, self.test_env)
+        widget_put({"widgetName": "TEST001", "color": "red"}, self.test_env)
+        item = self.mock_table.get_item(Key={environ["DynamoPartitionKey"]: "TEST001"})["Item"]
+        assert item["colorShard"] == self.test_env.color_shard("TEST001", "red")
+
+    def test_widget_put_ngram_postings(self):
+        """
+        New widgets get their n-gram postings written once
+        :return:
+        """
+        self.test_env.ngram_table = create_mock_ngram_ddb_table(self.mock_dynamodb)
+
+        widget_put({"widgetName": "TEST001", "color": "blue"}, self.test_env)
+        postings = self.test_env.ngram_table.scan()["Items"]
+        assert sorted(posting["gram"] for posting in postings) == \
+               ["001", "EST", "ST0", "T00", "TES"]
+
+        # Existing widget, postings are not rewritten
+        with patch('pylambda.widget.put.app.put_ngram_postings') as mock_postings:
+            widget_put({"widgetName": "TEST001", "color": "red"}, self.test_env)
+            mock_postings.assert_not_called()
+
+    def test_widget_put_cache_invalidation(self):
+        """
+        A put drops the cached widget and both color reports
+        :return:
+        """
+        self.test_env.cache = LruTtlCache(10, 10000, 60)
+        widget_put({"widgetName": "TEST001", "color": "blue"}, self.test_env)
+        for key in [("widget", "TEST001"), ("color", "blue"), ("color", "red"),
+                    ("color", "green")]:
+            self.test_env.cache.put(key, [])
+
+        widget_put({"widgetName": "TEST001", "color": "red"}, self.test_env)
+        assert self.test_env.cache.get(("widget", "TEST001")) is None
+        assert self.test_env.cache.get(("color", "blue")) is None
+        assert self.test_env.cache.get(("color", "red")) is None
+        assert self.test_env.cache.get(("color", "green")) == []
+
+    def test_widget_put_versions(self):
+        """
+        A put moves the table and both color versions on
+        :return:
+        """
+        versions = VersionTracker(create_mock_meta_ddb_table(self.mock_dynamodb))
+        self.test_env.versions = versions
+        widget_put({"widgetName": "TEST001", "color": "blue"}, self.test_env)
+        assert versions.read(["table", "color#blue", "color#red"]) == [1, 1, 0]
+
+        widget_put({"widgetName": "TEST001", "color": "red"}, self.test_env)
+        assert versions.read(["table", "color#blue", "color#red"]) == [2, 2, 1]
+
+    @patch('pylambda.widget.put.app.logging')
+    @patch('pylambda.widget.put.app.widget_put')
+    def test_lambda_handler(self, mock_widget_put, mock_log):
+        """
+        Full test of lambda_handler
+        :param mock_widget_put: mocked object pylambda.widget.put.app.widget_put
+        :param mock_log: mocked object pylambda.widget.put.app.logging
+        :return:
+        """
+        mock_widget_put.side_effect = ClientError({"Error": {"Code": "500", "Message": "Error"}},
+                                                  "Operation", )
+        with self.assertRaises(Exception) as context:
+            lambda_handler({"widgetName": "TEST001", "color": "blue"}, None)
+        mock_log.error.assert_called_once()
+        self.assertTrue('error' in str(context.exception))
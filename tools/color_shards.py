@@ -0,0 +1,48 @@
+"""
+    Backfill the sharded color index key (colorShard) of existing widgets
+
+    Uses the same environment variables as the Lambda functions, DynamoColorShards
+    sets the shard count.  Every widget whose colorShard is missing or was computed
+    for another shard count is updated, conditional on its color being unchanged
+    (a concurrent widget_put already wrote the right key).  Safe to re-run.
+
+    Migration:
+        1. deploy with ColorShardIndexEnabled=true and DynamoColorShards > 0,
+           writers start adding colorShard, reports still read Widget-by-Color.
+           A table update adds one GSI, so not in the same deploy as another index
+        2. python -m tools.color_shards backfill
+        3. DynamoColorShardReads=true, reports scatter-gather over the shards
+    Changing the shard count later is the same procedure with the new count.
+
+    Usage:
+        python -m tools.color_shards backfill [--segments 4] [--dry-run]
+"""
+from typing import ClassVar
+
+from tools import index_keys
+
+
+def backfill(env: ClassVar, segments: int = 1, dry_run: bool = False) -> dict:
+    """
+    Backfill colorShard with a parallel scan, see tools.index_keys
+    :param env: EnvParams
+    :param segments: scan segments, scanned concurrently
+    :param dry_run: only count
+    :return: {scanned, updated, skipped}
+    """
+    return index_keys.backfill(env, env.ddb_idx_color_shard_pk,
+                               lambda item: env.color_shard(item[env.ddb_pk], item["color"]),
+                               ("color",), segments, dry_run)
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    index_keys.main("Backfill the sharded color index key", backfill, lambda env: env.color_shards > 0,
+                    "DynamoColorShards")
+
+
+if __name__ == "__main__":
+    main()
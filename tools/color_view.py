@@ -0,0 +1,144 @@
+"""
+    Rebuild and check the materialized per-color widget view
+
+    Uses the same environment variables as the Lambda functions (DynamoName,
+    DynamoPartitionKey, DynamoIndexColor, ColorViewName, ...).
+
+        rebuild - backfill: read the Widget-by-Color index and overwrite the view
+                  partition of every color, empty colors are cleared.  The stream
+                  consumer may race with it, run check --repair afterwards.
+        check   - compare every color of the view with the index and report
+                  missing and extra members, wrong counts and stale colors (a
+                  change the stream consumer could not apply).  --repair applies
+                  the same idempotent add/remove as the stream consumer and fixes
+                  the counts, which clears the stale mark.  Exits 1 while the view
+                  is inconsistent.
+
+    Usage:
+        python -m tools.color_view rebuild [--color blue]
+        python -m tools.color_view check [--color blue] [--repair]
+"""
+from argparse import ArgumentParser
+from sys import exit as sys_exit, path
+from typing import ClassVar
+
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+
+def index_members(env: ClassVar, color: str = None) -> dict:
+    """
+    Widget names per color, read from the Widget-by-Color index
+    :param env: EnvParams
+    :param color: only this color, default every color (index scan)
+    :return: {color: set of widget names}
+    """
+    read_kwargs = {
+        "IndexName": env.ddb_idx_color,
+        "ProjectionExpression": "#pk, #c",
+        "ExpressionAttributeNames": {"#pk": env.ddb_pk, "#c": env.ddb_idx_color_pk}
+    }
+    operation = "scan"
+    if color is not None:
+        operation = "query"
+        read_kwargs["KeyConditionExpression"] = "#c = :c"
+        read_kwargs["ExpressionAttributeValues"] = {":c": color}
+
+    members = {}
+    while True:
+        page = env.read_widgets(operation, **read_kwargs)
+        for widget in page["Widgets"]:
+            members.setdefault(widget["color"], set()).add(widget["widgetName"])
+        if "LastEvaluatedKey" not in page:
+            return members
+        read_kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def rebuild(env: ClassVar, color: str = None) -> dict:
+    """
+    Overwrite the view from the index
+    :param env: EnvParams
+    :param color: only this color, default every color
+    :return: {color: widget count} written
+    """
+    members = index_members(env, color)
+    colors = {color} if color is not None else set(members) | env.color_view.colors()
+    written = {}
+    for view_color in sorted(colors):
+        names = members.get(view_color, set())
+        env.color_view.replace(view_color, sorted(names))
+        written[view_color] = len(names)
+    return written
+
+
+def check(env: ClassVar, color: str = None, repair: bool = False) -> list:
+    """
+    Compare the view with the index
+    :param env: EnvParams
+    :param color: only this color, default every color
+    :param repair: fix the differences found
+    :return: [{color, missing, extra, count, expected, stale}] of the inconsistent colors
+    """
+    members = index_members(env, color)
+    colors = {color} if color is not None else set(members) | env.color_view.colors()
+    counts = env.color_view.counts()
+
+    problems = []
+    for view_color in sorted(colors):
+        expected = members.get(view_color, set())
+        stale = env.color_view.members(view_color) is None
+        actual = set(env.color_view.members(view_color, stale_ok=True))
+        missing = sorted(expected - actual)
+        extra = sorted(actual - expected)
+        count = counts.get(view_color, 0)
+        if len(missing) == 0 and len(extra) == 0 and count == len(expected) and not stale:
+            continue
+
+        problems.append({"color": view_color, "missing": missing, "extra": extra,
+                         "count": count, "expected": len(expected), "stale": stale})
+        if repair:
+            for name in missing:
+                env.color_view.add(view_color, name)
+            for name in extra:
+                env.color_view.remove(view_color, name)
+            env.color_view.set_count(view_color, len(expected))
+    return problems
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    parser = ArgumentParser(description="Rebuild or check the materialized color view")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--color", help="only this color")
+    parser.add_argument("--repair", action="store_true", help="check: fix the differences")
+    args = parser.parse_args()
+
+    from lambdaDdbEnvLayer import EnvParams
+    env = EnvParams()
+    if env.color_view is None:
+        parser.error("ColorViewName is not set")
+
+    if args.command == "rebuild":
+        for view_color, count in rebuild(env, args.color).items():
+            print("%-20s %d" % (view_color, count))
+        return
+
+    problems = check(env, args.color, args.repair)
+    for problem in problems:
+        print("%-20s %scount %d expected %d, missing %d %s, extra %d %s" % (
+            problem["color"], "stale, " if problem["stale"] else "",
+            problem["count"], problem["expected"],
+            len(problem["missing"]), problem["missing"][:5],
+            len(problem["extra"]), problem["extra"][:5]))
+    if len(problems) == 0:
+        print("color view consistent")
+    elif args.repair:
+        print("repaired %d colors" % len(problems))
+    else:
+        sys_exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+    Export every widget to gzip-compressed NDJSON, one widget object per line
+
+    Uses the same environment variables as the Lambda functions.  The table is
+    read with a segmented parallel scan, each segment in its own worker process,
+    and written as parts of at most --part-rows widgets:
+
+        <destination>/segment-0003/part-00000.ndjson.gz
+        <destination>/checkpoints/segment-0003.json
+        <destination>/manifest.json
+
+    A part is written first and then recorded in the segment checkpoint with
+    its row count, SHA-256 and the scan position after its last page, so an
+    interrupted export resumes at the first part not recorded: re-run the same
+    command.  The manifest lists every part once all segments are done, verify
+    re-reads the parts and compares them with it.
+
+    The destination is a directory or s3://bucket/prefix; the S3 endpoint
+    follows the usual AWS settings (AWS_ENDPOINT_URL_S3 for a local stand-in).
+
+    Usage:
+        python -m tools.export run <destination> [--segments 8] [--workers 8]
+                                                 [--page-size 1000] [--part-rows 100000]
+        python -m tools.export verify <destination>
+"""
+from argparse import ArgumentParser
+from gzip import GzipFile, decompress
+from hashlib import sha256
+from io import BytesIO
+from multiprocessing import get_context
+from os import makedirs, replace
+from os.path import dirname, exists, join
+from sys import exit as sys_exit, path
+from time import time
+from typing import Any, ClassVar
+import json
+
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+MANIFEST = "manifest.json"
+
+
+class LocalStore:
+    """
+    Export files in a local directory, written atomically
+    """
+
+    def __init__(self, root: str):
+        """
+        Init
+        :param root: destination directory
+        """
+        self.root = root
+
+    def write(self, name: str, data: bytes):
+        """
+        :param name: relative file name
+        :param data: content
+        :return: Nothing
+        """
+        file_name = join(self.root, name)
+        makedirs(dirname(file_name), exist_ok=True)
+        with open(file_name + ".tmp", "wb") as output:
+            output.write(data)
+        replace(file_name + ".tmp", file_name)
+
+    def read(self, name: str) -> Any:
+        """
+        :param name: relative file name
+        :return: content, None if missing
+        """
+        file_name = join(self.root, name)
+        if not exists(file_name):
+            return None
+        with open(file_name, "rb") as source:
+            return source.read()
+
+
+class S3Store:
+    """
+    Export objects under an S3 prefix
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", client: Any = None):
+        """
+        Init
+        :param bucket: bucket name
+        :param prefix: key prefix, without trailing slash
+        :param client: S3 client, default one from the environment
+        """
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = client or boto3.client("s3")
+
+    def key(self, name: str) -> str:
+        """
+        :param name: relative file name
+        :return: object key
+        """
+        return "%s/%s" % (self.prefix, name) if len(self.prefix) > 0 else name
+
+    def write(self, name: str, data: bytes):
+        """
+        :param name: relative file name
+        :param data: content
+        :return: Nothing
+        """
+        self.client.put_object(Bucket=self.bucket, Key=self.key(name), Body=data)
+
+    def read(self, name: str) -> Any:
+        """
+        :param name: relative file name
+        :return: content, None if missing
+        """
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.key(name))["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+
+def open_store(destination: str) -> Any:
+    """
+    :param destination: directory or s3://bucket/prefix
+    :return: LocalStore or S3Store
+    """
+    if destination.startswith("s3://"):
+        bucket, _, prefix = destination[len("s3://"):].partition("/")
+        return S3Store(bucket, prefix)
+    return LocalStore(destination)
+
+
+def checkpoint_name(segment: int) -> str:
+    """
+    :param segment: segment number
+    :return: checkpoint file of the segment
+    """
+    return "checkpoints/segment-%04d.json" % segment
+
+
+def read_json(store: Any, name: str) -> Any:
+    """
+    :param store: LocalStore or S3Store
+    :param name: relative file name
+    :return: parsed document, None if missing
+    """
+    data = store.read(name)
+    return None if data is None else json.loads(data)
+
+
+def compress_part(widgets: list) -> bytes:
+    """
+    One part file, the same widgets always give the same bytes (no gzip mtime)
+    :param widgets: widget dictionaries
+    :return: gzip-compressed NDJSON
+    """
+    buffer = BytesIO()
+    with GzipFile(fileobj=buffer, mode="wb", mtime=0) as output:
+        for widget in widgets:
+            output.write(json.dumps(widget, separators=(",", ":")).encode("utf-8") + b"\n")
+    return buffer.getvalue()
+
+
+def export_segment(env: ClassVar, store: Any, segment: int, total_segments: int,
+                   page_size: int, part_rows: int) -> dict:
+    """
+    Export one scan segment, resuming from its checkpoint
+    :param env: EnvParams
+    :param store: LocalStore or S3Store
+    :param segment: segment number
+    :param total_segments: TotalSegments of the scan
+    :param page_size: scan Limit
+    :param part_rows: widgets per part, a part ends on a page boundary after that
+    :return: checkpoint {segment, totalSegments, parts, lastKey, done}
+    """
+    checkpoint = read_json(store, checkpoint_name(segment))
+    if checkpoint is None:
+        checkpoint = {"segment": segment, "totalSegments": total_segments, "parts": [],
+                      "lastKey": None, "done": False}
+    elif checkpoint["totalSegments"] != total_segments:
+        raise ValueError("segment %d was exported with %d segments, not %d"
+                         % (segment, checkpoint["totalSegments"], total_segments))
+    if checkpoint["done"]:
+        return checkpoint
+
+    scan_kwargs = {"Segment": segment, "TotalSegments": total_segments, "Limit": page_size}
+    if checkpoint["lastKey"] is not None:
+        scan_kwargs["ExclusiveStartKey"] = checkpoint["lastKey"]
+
+    widgets = []
+    last_key = None
+    for page in env.paginate_widgets("scan", **scan_kwargs):
+        widgets.extend(page["Widgets"])
+        last_key = page.get("LastEvaluatedKey", None)
+        if len(widgets) >= part_rows or last_key is None:
+            checkpoint = save_part(store, checkpoint, widgets, last_key)
+            widgets = []
+    return checkpoint
+
+
+def save_part(store: Any, checkpoint: dict, widgets: list, last_key: Any) -> dict:
+    """
+    Write a part, then record it in the checkpoint.  A crash in between
+    rewrites the same part name on resume.
+    :param store: LocalStore or S3Store
+    :param checkpoint: segment checkpoint
+    :param widgets: widgets of the part, may be empty for the last one
+    :param last_key: scan position after the part, None after the last page
+    :return: updated checkpoint
+    """
+    parts = checkpoint["parts"]
+    if len(widgets) > 0:
+        data = compress_part(widgets)
+        name = "segment-%04d/part-%05d.ndjson.gz" % (checkpoint["segment"], len(parts))
+        store.write(name, data)
+        parts = parts + [{"name": name, "rows": len(widgets), "bytes": len(data),
+                          "sha256": sha256(data).hexdigest()}]
+    checkpoint = dict(checkpoint, parts=parts, lastKey=last_key, done=last_key is None)
+    store.write(checkpoint_name(checkpoint["segment"]), json.dumps(checkpoint).encode("utf-8"))
+    return checkpoint
+
+
+def segment_worker(task: tuple) -> dict:
+    """
+    Worker process: export one segment with its own EnvParams and store
+    :param task: (destination, segment, total_segments, page_size, part_rows)
+    :return: checkpoint of the segment
+    """
+    from lambdaDdbEnvLayer import EnvParams
+    destination, segment, total_segments, page_size, part_rows = task
+    return export_segment(EnvParams(), open_store(destination), segment, total_segments,
+                          page_size, part_rows)
+
+
+def write_manifest(store: Any, checkpoints: list, env: ClassVar, started: float) -> dict:
+    """
+    Manifest of a complete export
+    :param store: LocalStore or S3Store
+    :param checkpoints: checkpoint of every segment, all done
+    :param env: EnvParams, for the table name
+    :param started: export start, epoch seconds
+    :return: manifest
+    """
+    parts = [dict(part, segment=checkpoint["segment"])
+             for checkpoint in checkpoints for part in checkpoint["parts"]]
+    manifest = {
+        "format": "ndjson+gzip",
+        "table": env.ddb_name,
+        "totalSegments": len(checkpoints),
+        "started": int(started),
+        "finished": int(time()),
+        "rows": sum(part["rows"] for part in parts),
+        "bytes": sum(part["bytes"] for part in parts),
+        "segments": [{"segment": checkpoint["segment"],
+                      "rows": sum(part["rows"] for part in checkpoint["parts"]),
+                      "parts": len(checkpoint["parts"])} for checkpoint in checkpoints],
+        "parts": parts
+    }
+    store.write(MANIFEST, json.dumps(manifest, indent=1).encode("utf-8"))
+    return manifest
+
+
+def export(env: ClassVar, store: Any, segments: int = 1, workers: int = 0,
+           page_size: int = None, part_rows: int = 100000, destination: str = None) -> dict:
+    """
+    Export the widget table, resuming the segments already checkpointed
+    :param env: EnvParams, used by the segments run in this process
+    :param store: LocalStore or S3Store
+    :param segments: TotalSegments of the scan, must match an export being resumed
+    :param workers: worker processes, 0 exports the segments one after the other here
+    :param page_size: scan Limit, default DynamoDefaultLimit
+    :param part_rows: widgets per part
+    :param destination: destination the worker processes open, required with workers
+    :return: manifest
+    """
+    started = time()
+    manifest = read_json(store, MANIFEST)
+    if manifest is not None:
+        return manifest
+
+    page_size = page_size or int(env.ddb_limit)
+    if workers <= 0:
+        checkpoints = [export_segment(env, store, segment, segments, page_size, part_rows)
+                       for segment in range(segments)]
+    else:
+        tasks = [(destination, segment, segments, page_size, part_rows)
+                 for segment in range(segments)]
+        with get_context("spawn").Pool(min(workers, segments)) as pool:
+            checkpoints = pool.map(segment_worker, tasks, chunksize=1)
+    return write_manifest(store, checkpoints, env, started)
+
+
+def verify(store: Any) -> list:
+    """
+    Compare the parts with the manifest
+    :param store: LocalStore or S3Store
+    :return: problems found, empty when every part matches
+    """
+    manifest = read_json(store, MANIFEST)
+    if manifest is None:
+        return ["no manifest, the export is not complete"]
+    problems = []
+    for part in manifest["parts"]:
+        data = store.read(part["name"])
+        if data is None:
+            problems.append("%s: missing" % part["name"])
+        elif sha256(data).hexdigest() != part["sha256"]:
+            problems.append("%s: checksum mismatch" % part["name"])
+        elif decompress(data).count(b"\n") != part["rows"]:
+            problems.append("%s: row count mismatch" % part["name"])
+    return problems
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    parser = ArgumentParser(description="Export every widget to gzip-compressed NDJSON")
+    parser.add_argument("command", choices=["run", "verify"])
+    parser.add_argument("destination", help="directory or s3://bucket/prefix")
+    parser.add_argument("--segments", type=int, default=8, help="parallel scan segments")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="worker processes, 0 runs the segments in this process")
+    parser.add_argument("--page-size", type=int, default=None,
+                        help="scan Limit, default DynamoDefaultLimit")
+    parser.add_argument("--part-rows", type=int, default=100000, help="widgets per part file")
+    args = parser.parse_args()
+
+    store = open_store(args.destination)
+    if args.command == "verify":
+        problems = verify(store)
+        for problem in problems:
+            print(problem)
+        sys_exit(1 if problems else 0)
+
+    from lambdaDdbEnvLayer import EnvParams
+    manifest = export(EnvParams(), store, args.segments, args.workers, args.page_size,
+                      args.part_rows, args.destination)
+    print("exported %(rows)d widgets in %(totalSegments)d segments, %(bytes)d bytes" % manifest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+    Backfill of a derived index key attribute of existing widgets, shared by
+    tools/color_shards (colorShard) and tools/name_buckets (nameBucket)
+
+    Every widget whose key attribute is missing or differs from the key computed
+    from its name and source attributes is updated, conditional on the widget
+    still existing with the same source attributes: a concurrent write already
+    stored the right key, a concurrent delete is not undone.  Safe to re-run.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from sys import path
+from typing import Callable, ClassVar
+
+from botocore.exceptions import ClientError
+
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+
+def backfill_segment(env: ClassVar, attribute: str, key: Callable, sources: tuple,
+                     segment: int, total_segments: int, dry_run: bool = False) -> dict:
+    """
+    Backfill one scan segment
+    :param env: EnvParams
+    :param attribute: index key attribute to write
+    :param key: computes the key of an item {pk, sources..., attribute}
+    :param sources: attributes the key is derived from besides the widget name
+    :param segment: segment number
+    :param total_segments: TotalSegments of the scan
+    :param dry_run: only count
+    :return: {scanned, updated, skipped}
+    """
+    names = {"#pk": env.ddb_pk, "#a": attribute}
+    names.update({"#s%d" % idx: source for idx, source in enumerate(sources)})
+    scan_kwargs = {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+        "Segment": segment,
+        "TotalSegments": total_segments
+    }
+    condition = " AND ".join(["attribute_exists(#pk)"] +
+                             ["#s%d = :s%d" % (idx, idx) for idx in range(len(sources))])
+    counts = {"scanned": 0, "updated": 0, "skipped": 0}
+    while True:
+        response = env.ddb_table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            counts["scanned"] += 1
+            expected = key(item)
+            if item.get(attribute, None) == expected:
+                continue
+            if dry_run:
+                counts["updated"] += 1
+                continue
+            values = {":a": expected}
+            values.update({":s%d" % idx: item[source] for idx, source in enumerate(sources)})
+            try:
+                env.ddb_table.update_item(
+                    Key={env.ddb_pk: item[env.ddb_pk]},
+                    UpdateExpression="SET #a = :a",
+                    ConditionExpression=condition,
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values)
+                counts["updated"] += 1
+            except ClientError as client_error:
+                if client_error.response.get("Error", {}).get("Code") != \
+                        "ConditionalCheckFailedException":
+                    raise
+                counts["skipped"] += 1
+
+        if response.get("LastEvaluatedKey", None) is None:
+            return counts
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def backfill(env: ClassVar, attribute: str, key: Callable, sources: tuple = (),
+             segments: int = 1, dry_run: bool = False) -> dict:
+    """
+    Backfill the whole table with a parallel scan
+    :param env: EnvParams
+    :param attribute: index key attribute to write
+    :param key: computes the key of an item {pk, sources..., attribute}
+    :param sources: attributes the key is derived from besides the widget name
+    :param segments: scan segments, scanned concurrently
+    :param dry_run: only count
+    :return: {scanned, updated, skipped}
+    """
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        results = list(pool.map(lambda segment: backfill_segment(
+            env, attribute, key, sources, segment, segments, dry_run), range(segments)))
+    return {name: sum(result[name] for result in results) for name in results[0]}
+
+
+def main(description: str, table_backfill: Callable, enabled: Callable, setting: str):
+    """
+    Command line entry point of a backfill tool
+    :param description: what the tool backfills
+    :param table_backfill: backfill(env, segments, dry_run) of the tool
+    :param enabled: tells from the EnvParams whether the key is configured
+    :param setting: environment variable configuring the key
+    :return: Nothing
+    """
+    parser = ArgumentParser(description=description)
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    parser.add_argument("--dry-run", action="store_true", help="only count the widgets to update")
+    args = parser.parse_args()
+
+    from lambdaDdbEnvLayer import EnvParams
+    env = EnvParams()
+    if not enabled(env):
+        parser.error("%s is not set" % setting)
+
+    counts = table_backfill(env, args.segments, args.dry_run)
+    print("scanned %(scanned)d, updated %(updated)d, skipped %(skipped)d" % counts)
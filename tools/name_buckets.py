@@ -0,0 +1,48 @@
+"""
+    Backfill the name index key (nameBucket) of existing widgets
+
+    Uses the same environment variables as the Lambda functions, DynamoNameBuckets
+    sets the bucket count.  Every widget whose nameBucket is missing or was computed
+    for another bucket count is updated, conditional on the widget still existing
+    (a concurrent delete is not undone).  Safe to re-run.
+
+    Migration:
+        1. deploy with NameIndexEnabled=true and DynamoNameBuckets > 0, writers
+           start adding nameBucket, prefix filters still scan.  A table
+           update adds one GSI, so not in the same deploy as another index
+        2. python -m tools.name_buckets backfill
+        3. DynamoNamePrefixReads=true, prefix filters query the name index
+    Changing the bucket count later is the same procedure with the new count.
+
+    Usage:
+        python -m tools.name_buckets backfill [--segments 4] [--dry-run]
+"""
+from typing import ClassVar
+
+from tools import index_keys
+
+
+def backfill(env: ClassVar, segments: int = 1, dry_run: bool = False) -> dict:
+    """
+    Backfill nameBucket with a parallel scan, see tools.index_keys
+    :param env: EnvParams
+    :param segments: scan segments, scanned concurrently
+    :param dry_run: only count
+    :return: {scanned, updated, skipped}
+    """
+    return index_keys.backfill(env, env.ddb_idx_name_bucket_pk,
+                               lambda item: env.name_bucket(item[env.ddb_pk]),
+                               (), segments, dry_run)
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    index_keys.main("Backfill the name index key", backfill, lambda env: env.name_buckets > 0,
+                    "DynamoNameBuckets")
+
+
+if __name__ == "__main__":
+    main()
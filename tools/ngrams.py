@@ -0,0 +1,98 @@
+"""
+    Backfill the name n-gram postings {gram, widgetName} of existing widgets
+
+    Uses the same environment variables as the Lambda functions, DynamoNgramName
+    is the postings table and DynamoNgramSize the n-gram length.  Every widget
+    gets the postings of its name; postings are keys only, so writing one that
+    exists is a no-op and the backfill is safe to re-run.  A posting left by a
+    concurrently deleted widget is harmless: the search fetches the widgets it
+    matched and drops the missing ones.
+
+    Migration:
+        1. deploy the postings table with DynamoNgramName set, writers start
+           adding the postings of new widgets, substring filters still scan
+        2. python -m tools.ngrams backfill
+        3. DynamoNgramReads=true, substring filters intersect the postings
+    Changing DynamoNgramSize later is the same procedure into a new table.
+
+    Usage:
+        python -m tools.ngrams backfill [--segments 4] [--dry-run]
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from sys import path
+from typing import ClassVar
+
+path.extend(["pylambda/layers/lambdaDdbEnv/python"])
+
+
+def backfill_segment(env: ClassVar, segment: int, total_segments: int,
+                     dry_run: bool = False) -> dict:
+    """
+    Backfill one scan segment
+    :param env: EnvParams
+    :param segment: segment number
+    :param total_segments: TotalSegments of the scan
+    :param dry_run: only count
+    :return: {scanned, postings}
+    """
+    scan_kwargs = {
+        "ProjectionExpression": "#pk",
+        "ExpressionAttributeNames": {"#pk": env.ddb_pk},
+        "Segment": segment,
+        "TotalSegments": total_segments
+    }
+    counts = {"scanned": 0, "postings": 0}
+    while True:
+        response = env.ddb_table.scan(**scan_kwargs)
+        postings = [{"gram": gram, "widgetName": item[env.ddb_pk]}
+                    for item in response.get("Items", [])
+                    for gram in env.widget_ngrams(item[env.ddb_pk])]
+        counts["scanned"] += len(response.get("Items", []))
+        counts["postings"] += len(postings)
+        if not dry_run:
+            with env.ngram_table.batch_writer() as batch:
+                for posting in postings:
+                    batch.put_item(Item=posting)
+
+        if response.get("LastEvaluatedKey", None) is None:
+            return counts
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def backfill(env: ClassVar, segments: int = 1, dry_run: bool = False) -> dict:
+    """
+    Backfill the whole table with a parallel scan
+    :param env: EnvParams
+    :param segments: scan segments, scanned concurrently
+    :param dry_run: only count
+    :return: {scanned, postings}
+    """
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        results = list(pool.map(lambda segment: backfill_segment(env, segment, segments, dry_run),
+                                range(segments)))
+    return {key: sum(result[key] for result in results) for key in results[0]}
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    parser = ArgumentParser(description="Backfill the name n-gram postings")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    parser.add_argument("--dry-run", action="store_true", help="only count the postings")
+    args = parser.parse_args()
+
+    from lambdaDdbEnvLayer import EnvParams
+    env = EnvParams()
+    if env.ngram_table is None:
+        parser.error("DynamoNgramName is not set")
+
+    counts = backfill(env, args.segments, args.dry_run)
+    print("scanned %(scanned)d, postings %(postings)d" % counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+    Aggregate handler profiles into a top-N hot-spot report
+
+    Reads the <function>/<request id>.pstats and .json files written by the
+    layer's HandlerProfiler (HandlerProfileRate > 0) from a local directory;
+    copy S3 profiles first, e.g. aws s3 sync s3://bucket/prefix profiles.
+    The cProfile stats of every invocation are added together, the memory hot
+    spots of the invocations traced with HandlerProfileMemory are summed per
+    allocation site.
+
+    Usage:
+        python -m tools.profiles <directory> [--function widgetGet] [--top 25]
+                                             [--sort cumulative|tottime|calls]
+                                             [--cold | --warm]
+"""
+from argparse import ArgumentParser
+from glob import glob
+from io import StringIO
+from os.path import exists, join
+from pstats import Stats
+from typing import Any
+import json
+
+
+def load_summaries(directory: str, function: str = "*", cold: Any = None) -> list:
+    """
+    :param directory: sink directory
+    :param function: function name, "*" for all
+    :param cold: True for cold starts only, False for warm invocations, None for both
+    :return: invocation summaries that have their stats file, oldest first
+    """
+    summaries = []
+    for name in glob(join(directory, function, "*.json")):
+        with open(name, "r", encoding="utf-8") as source:
+            summary = json.load(source)
+        summary["stats"] = name[:-len(".json")] + ".pstats"
+        if exists(summary["stats"]) and (cold is None or summary["coldStart"] == cold):
+            summaries.append(summary)
+    return sorted(summaries, key=lambda summary: summary["timestamp"])
+
+
+def percentile(values: list, share: float) -> float:
+    """
+    :param values: sorted values, not empty
+    :param share: percentile as a share, e.g. 0.95
+    :return: nearest-rank percentile
+    """
+    return values[min(len(values) - 1, max(0, int(round(share * len(values))) - 1))]
+
+
+def memory_hot_spots(summaries: list, top: int) -> list:
+    """
+    :param summaries: invocation summaries
+    :param top: allocation sites kept
+    :return: [{site, bytes, count, invocations}], largest total first
+    """
+    sites = {}
+    for summary in summaries:
+        for stat in summary.get("memoryTop", []):
+            site = sites.setdefault(stat["site"], {"site": stat["site"], "bytes": 0,
+                                                   "count": 0, "invocations": 0})
+            site["bytes"] += stat["bytes"]
+            site["count"] += stat["count"]
+            site["invocations"] += 1
+    return sorted(sites.values(), key=lambda site: -site["bytes"])[:top]
+
+
+def report(summaries: list, top: int = 25, sort: str = "cumulative") -> str:
+    """
+    :param summaries: invocation summaries from load_summaries()
+    :param top: functions and allocation sites listed
+    :param sort: pstats sort key of the function list
+    :return: report text
+    """
+    if len(summaries) == 0:
+        return "no profiles\n"
+
+    output = StringIO()
+    durations = sorted(summary["durationMs"] for summary in summaries)
+    cold = [summary for summary in summaries if summary["coldStart"]]
+    output.write("%d invocations (%d cold, %d failed), duration ms p50 %.1f p95 %.1f max %.1f\n"
+                 % (len(summaries), len(cold),
+                    sum(1 for summary in summaries if summary.get("error")),
+                    percentile(durations, 0.5), percentile(durations, 0.95), durations[-1]))
+    init = [summary["initCpuMs"] for summary in cold if summary.get("initCpuMs") is not None]
+    if len(init) > 0:
+        output.write("cold start init CPU ms mean %.1f max %.1f\n"
+                     % (sum(init) / len(init), max(init)))
+
+    stats = Stats(*[summary["stats"] for summary in summaries], stream=output)
+    # One header line per file otherwise
+    stats.files = []
+    stats.sort_stats(sort).print_stats(top)
+
+    spots = memory_hot_spots(summaries, top)
+    if len(spots) > 0:
+        output.write("memory still allocated at return, by site (%d traced invocations)\n"
+                     % sum(1 for summary in summaries if "memoryTop" in summary))
+        for spot in spots:
+            output.write("%12d B %8d blocks %5d inv  %s\n"
+                         % (spot["bytes"], spot["count"], spot["invocations"], spot["site"]))
+    return output.getvalue()
+
+
+def main():
+    """
+    Command line entry point
+    :return: Nothing
+    """
+    parser = ArgumentParser(description="Aggregate handler profiles into a hot-spot report")
+    parser.add_argument("directory", help="profile sink directory")
+    parser.add_argument("--function", default="*", help="function name, default all")
+    parser.add_argument("--top", type=int, default=25, help="entries listed")
+    parser.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "calls"])
+    phase = parser.add_mutually_exclusive_group()
+    phase.add_argument("--cold", action="store_const", const=True, dest="cold",
+                       help="cold starts only")
+    phase.add_argument("--warm", action="store_const", const=False, dest="cold",
+                       help="warm invocations only")
+    args = parser.parse_args()
+
+    print(report(load_summaries(args.directory, args.function, args.cold), args.top, args.sort),
+          end="")
+
+
+if __name__ == "__main__":
+    main()